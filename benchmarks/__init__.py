@@ -0,0 +1,11 @@
+"""Performance benchmarks, run them from the repository root.
+
+python -m benchmarks --json results.json
+python -m benchmarks.parse
+python -m benchmarks.format
+python -m benchmarks.resolve --latency 0.05
+python -m benchmarks.startup
+
+All of them run on the names of ``corpus/corpus.txt`` which is generated from the
+hand written ``corpus/release_names.txt`` by ``python -m benchmarks.generate_corpus``.
+"""
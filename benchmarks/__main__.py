@@ -0,0 +1,13 @@
+"""Run all benchmarks, e.g. to compare releases.
+
+python -m benchmarks --json results.json
+"""
+
+from . import format, memory, parse, resolve
+from .common import run
+
+run(
+    __doc__,
+    [parse.benchmark, format.benchmark, memory.benchmark, resolve.benchmark],
+    [resolve.add_arguments],
+)
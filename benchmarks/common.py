@@ -0,0 +1,89 @@
+"""Helpers shared by benchmarks."""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from collections.abc import Callable, Iterable
+from datetime import datetime, timezone
+from importlib.metadata import version
+from pathlib import Path
+from typing import TypeVar
+
+CORPUS_DIR = Path(__file__).parent / "corpus"
+# Hand written release names, the corpus being generated from them
+SEEDS = CORPUS_DIR / "release_names.txt"
+CORPUS = CORPUS_DIR / "corpus.txt"
+
+T = TypeVar("T")
+
+# Every result is a throughput, higher is better
+Results = dict[str, float]
+Benchmark = Callable[[argparse.Namespace, list[str]], Results]
+
+
+def load_corpus(path: Path = CORPUS) -> list[str]:
+    return [line for line in path.read_text().splitlines() if line.strip()]
+
+
+def throughput(fn: Callable[[T], object], items: list[T], repeat: int) -> float:
+    """Return the best number of items processed per second over ``repeat`` runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - start)
+    return len(items) / best
+
+
+def make_parser(description: str | None) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--corpus", type=Path, default=CORPUS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--json", type=Path, help="Also write results to this file, - for stdout"
+    )
+    return parser
+
+
+def report(args: argparse.Namespace, results: Results) -> None:
+    """Print results, and write them as JSON along with the environment if asked."""
+    if str(args.json) != "-":
+        for name, value in results.items():
+            print(f"{name:>48}: {value:>14,.1f}")
+    if args.json is None:
+        return
+
+    document = {
+        "version": version("media-helper"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "corpus": {"path": str(args.corpus), "size": len(load_corpus(args.corpus))},
+        "results": results,
+    }
+    output = json.dumps(document, indent=2) + "\n"
+    if str(args.json) == "-":
+        sys.stdout.write(output)
+    else:
+        args.json.write_text(output)
+
+
+def run(
+    description: str | None,
+    benchmarks: Iterable[Benchmark],
+    add_arguments: Iterable[Callable[[argparse.ArgumentParser], None]] = (),
+) -> None:
+    """Run given benchmarks from the command line."""
+    parser = make_parser(description)
+    for add in add_arguments:
+        add(parser)
+    args = parser.parse_args()
+
+    names = load_corpus(args.corpus)
+    results: Results = {}
+    for benchmark in benchmarks:
+        results.update(benchmark(args, names))
+    report(args, results)
@@ -0,0 +1,149 @@
+"""Measure how fast media information is formatted into Plex file names.
+
+Names are formatted by compiled naming templates, compared to formatting them by
+hand (``.handwritten``) as the formatter did before templates.
+"""
+
+import argparse
+import time
+
+from media_helper.core.compact import CompactMediaInformation
+from media_helper.core.formatter import PlexMediaFileNameFormatter
+from media_helper.core.model import MediaInformation, MediaSource
+from media_helper.core.template import Media
+
+from .common import Results, run, throughput
+
+
+def formattable(names: list[str]) -> list[MediaInformation]:
+    """Return the media information of given names having a title and a year."""
+    infos = []
+    for name in names:
+        info = MediaInformation.from_filename(name)
+        if info.title and info.year:
+            info.source = info.source or MediaSource(name="tmdb", media_id="27205")
+            infos.append(info)
+    return infos
+
+
+class HandWrittenFormatter:
+    """Plex movie names formatted without templates, the baseline to beat."""
+
+    def format_movie_filename(self, media: Media) -> str:
+        parts = [
+            self._title(media),
+            self._year(media),
+            self._source(media),
+            self._edition(media),
+            f"- {media.split_name}" if media.split_name else "",
+            self._metadata(media),
+        ]
+        return " ".join(p for p in parts if p) + media.file_ext
+
+    def format_movie_dirname(self, media: Media) -> str:
+        parts = [
+            self._title(media),
+            self._year(media),
+            self._source(media),
+            self._edition(media),
+        ]
+        return " ".join(p for p in parts if p)
+
+    def _title(self, media: Media) -> str:
+        if not media.title:
+            raise ValueError("Media has no title")
+        return " ".join(media.title.replace(":", " - ").split())
+
+    def _year(self, media: Media) -> str:
+        if not media.year:
+            raise ValueError("Media has no release year")
+        return f"({media.year[0]})"
+
+    def _source(self, media: Media) -> str:
+        if not media.source:
+            return ""
+        return f"{{{media.source.name}-{media.source.media_id}}}"
+
+    def _edition(self, media: Media) -> str:
+        tags = []
+        if media.directors_cut:
+            tags.append("Director's Cut")
+        if media.international_cut:
+            tags.append("International's Cut")
+        if media.unrated:
+            tags.append("Unrated")
+        if media.remastered:
+            tags.append("Remastered")
+        if media.limited:
+            tags.append("Limited Edition")
+        if media.extended:
+            tags.append("Extended Edition")
+        return f"{{edition-{' '.join(tags)}}}" if tags else ""
+
+    def _metadata(self, media: Media) -> str:
+        quality = [*media.quality, *media.resolution]
+        if media.proper:
+            quality.append("Proper")
+        if media.upscaled:
+            quality.append("Upscaled")
+        if media.widescreen:
+            quality.append("Widescreen")
+        metadata = [
+            " ".join(quality),
+            "3D" if media.is_3d else None,
+            "HDR" if media.hdr else None,
+            " ".join(media.audio),
+            " ".join(media.language),
+            " ".join(media.subtitles),
+            " ".join(media.codec),
+        ]
+        return "".join(f"[{m}]" for m in metadata if m)
+
+
+def batch_throughput(
+    formatter: PlexMediaFileNameFormatter, infos: list[MediaInformation], repeat: int
+) -> float:
+    """Return the best number of movies formatted per second by ``format_many``."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        formatter.format_many(infos)
+        best = min(best, time.perf_counter() - start)
+    return len(infos) / best
+
+
+def benchmark(args: argparse.Namespace, names: list[str]) -> Results:
+    formatter = PlexMediaFileNameFormatter()
+    handwritten = HandWrittenFormatter()
+    infos = formattable(names)
+    compacts = [CompactMediaInformation.from_media_info(info) for info in infos]
+    return {
+        "format.movie_filename": throughput(
+            formatter.format_movie_filename, infos, args.repeat
+        ),
+        "format.movie_filename.handwritten": throughput(
+            handwritten.format_movie_filename, infos, args.repeat
+        ),
+        "format.movie_dirname": throughput(
+            formatter.format_movie_dirname, infos, args.repeat
+        ),
+        "format.movie_dirname.handwritten": throughput(
+            handwritten.format_movie_dirname, infos, args.repeat
+        ),
+        "format.movie_filename.compact": throughput(
+            formatter.format_movie_filename, compacts, args.repeat
+        ),
+        "format.movie_filename.compact.handwritten": throughput(
+            handwritten.format_movie_filename, compacts, args.repeat
+        ),
+        # File and directory names of every movie
+        "format.many": batch_throughput(formatter, infos, args.repeat),
+    }
+
+
+def main() -> None:
+    run(__doc__, [benchmark])
+
+
+if __name__ == "__main__":
+    main()
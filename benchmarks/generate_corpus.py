@@ -0,0 +1,82 @@
+"""Generate the benchmark corpus from the hand written release names.
+
+Every seed release name is declined into many variants mixing the naming habits found
+in the wild (separators, qualities, codecs, languages, editions, split parts, release
+groups, site prefixes...). Generation is deterministic so that the checked in corpus
+only changes along with this script.
+
+python -m benchmarks.generate_corpus
+"""
+
+import argparse
+import random
+import re
+from pathlib import Path
+
+from .common import CORPUS, SEEDS, load_corpus
+
+SEPARATORS = [".", ".", ".", " ", "_"]
+RESOLUTIONS = ["", "480p", "576p", "720p", "1080p", "1080p", "2160p", "4K"]
+QUALITIES = ["BluRay", "BDRip", "BRRip", "WEB-DL", "WEBRip", "WEB", "HDTV", "DVDRip"]
+CODECS = ["x264", "x265", "H264", "H.264", "HEVC", "XviD", "AVC", "10bit.x265"]
+AUDIOS = ["", "", "AC3", "DTS", "DD5.1", "DDP5.1", "AAC2.0", "TrueHD.7.1.Atmos"]
+LANGUAGES = ["", "", "", "FRENCH", "TRUEFRENCH", "MULTi", "MULTI.VFF", "VOSTFR"]
+EDITIONS = ["", "", "", "", "EXTENDED", "REMASTERED", "UNRATED", "Directors.Cut"]
+FLAGS = ["", "", "", "", "", "PROPER", "REPACK", "HDR", "3D", "HDLight", "iNTERNAL"]
+PARTS = ["", "", "", "", "", "", "", "", "CD1", "CD2", "part1", "part2", "DVD1"]
+GROUPS = ["SPARKS", "FGT", "RARBG", "YIFY", "LOST", "ROUGH", "EXTREME", "ULSHD"]
+SITES = ["", "", "", "", "", "", "[ www.Torrent9.to ] ", "[TGx] ", "www.YTS.MX - "]
+EXTENSIONS = [".mkv", ".mkv", ".mkv", ".mp4", ".avi", ".m4v"]
+
+_TITLE_AND_YEAR = re.compile(r"^(?P<title>.+?)[. _(]+(?P<year>(?:19|20)[0-9]{2})\b")
+
+
+def title_and_year(name: str) -> tuple[list[str], str] | None:
+    """Return the title words and the year of given release name, if any."""
+    match = _TITLE_AND_YEAR.match(name)
+    if not match:
+        return None
+    return re.split(r"[. _]+", match["title"].strip(". _")), match["year"]
+
+
+def variant(rng: random.Random, words: list[str], year: str) -> str:
+    """Return a random release name of the movie having given title and year."""
+    sep = rng.choice(SEPARATORS)
+    tags = [
+        rng.choice(EDITIONS),
+        rng.choice(LANGUAGES),
+        rng.choice(RESOLUTIONS),
+        rng.choice(QUALITIES),
+        rng.choice(FLAGS),
+        rng.choice(AUDIOS),
+        rng.choice(CODECS),
+        rng.choice(PARTS),
+    ]
+    name = sep.join([*words, year, *(t.replace(".", sep) for t in tags if t)])
+    return rng.choice(SITES) + name + "-" + rng.choice(GROUPS) + rng.choice(EXTENSIONS)
+
+
+def generate(seeds: list[str], size: int, seed: int = 0) -> list[str]:
+    """Return ``size`` distinct release names including all given seeds."""
+    rng = random.Random(seed)
+    movies = [parsed for name in seeds if (parsed := title_and_year(name))]
+    names = dict.fromkeys(seeds)
+    while len(names) < size:
+        names[variant(rng, *rng.choice(movies))] = None
+    return list(names)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seeds", type=Path, default=SEEDS)
+    parser.add_argument("--output", type=Path, default=CORPUS)
+    parser.add_argument("--size", type=int, default=5000)
+    args = parser.parse_args()
+
+    names = generate(load_corpus(args.seeds), args.size)
+    args.output.write_text("\n".join(names) + "\n")
+    print(f"Wrote {len(names)} names to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Measure how many parsed release names fit in memory."""
+
+import argparse
+import gc
+import tracemalloc
+from collections.abc import Callable
+
+from media_helper.core.compact import CompactMediaInformation
+from media_helper.core.model import MediaInformation
+
+from .common import Results, run, throughput
+
+
+def files_per_mib(build: Callable[[], list[object]]) -> float:
+    """Return how many of the objects built by ``build`` fit in a MiB."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        objects = build()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return len(objects) / (size / 1024**2)
+
+
+def benchmark(args: argparse.Namespace, names: list[str]) -> Results:
+    infos = [MediaInformation.from_filename(name) for name in names]
+    compacts = [CompactMediaInformation.from_media_info(info) for info in infos]
+    return {
+        # Copies rather than parsing again not to account for parsing caches
+        "memory.media_information.files_per_mib": files_per_mib(
+            lambda: [info.model_copy(deep=True) for info in infos]
+        ),
+        "memory.compact.files_per_mib": files_per_mib(
+            lambda: [CompactMediaInformation.from_media_info(i) for i in infos]
+        ),
+        "compact.from_media_info": throughput(
+            CompactMediaInformation.from_media_info, infos, args.repeat
+        ),
+        "compact.to_media_info": throughput(
+            CompactMediaInformation.to_media_info, compacts, args.repeat
+        ),
+    }
+
+
+def main() -> None:
+    run(__doc__, [benchmark])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Measure how fast release names are parsed into media information."""
+
+import argparse
+import re
+
+from media_helper.core.model import MediaInformation, Transformer, TransformerScanner
+
+from .common import Results, run, throughput
+
+# Release tags that could plausibly get their own transformer some day
+EXTRA_TAGS = (
+    "TRUEFRENCH SUBFRENCH DUBBED SUBBED iNTERNAL REPACK READNFO NFOFIX DIRFIX "
+    "LIMITED FESTIVAL STV UNCUT UNRATED DOCU HYBRID OPEN.MATTE IMAX CRITERION REMUX "
+    "BDRip BRRip DVDScr TELESYNC HDCAM WORKPRINT PDTV HDTV DSR SATRip VHSRip "
+    "SCREENER DVD9 DVD5 NTSC PAL SECAM Atmos DTS-X TrueHD FLAC OPUS EAC3 DDP LPCM"
+).split()
+
+
+def legacy_scan(
+    scanner: TransformerScanner, name: str
+) -> tuple[str, list[tuple[re.Match[str], Transformer]]]:
+    """Scan transformers the way it was done before, one pattern after the other."""
+    matched = []
+    for pattern, transformer in scanner._transformers:
+        match = pattern.search(name)
+        if not match:
+            continue
+        name = name.replace(match.group(), "")
+        matched.append((match, transformer))
+    return name, matched
+
+
+def with_extra_transformers(count: int) -> TransformerScanner:
+    """Return a scanner with the registered transformers and ``count`` more."""
+    scanner = TransformerScanner()
+    for pattern, transformer in MediaInformation.transformers._transformers:
+        scanner.register(pattern.pattern, transformer)
+    for tag in EXTRA_TAGS[:count]:
+        scanner.register(re.escape(tag), lambda match, info: None)
+    return scanner
+
+
+def benchmark(args: argparse.Namespace, names: list[str]) -> Results:
+    results = {
+        "parse.from_filename": throughput(
+            MediaInformation.from_filename, names, args.repeat
+        )
+    }
+    for extra in (0, 20, len(EXTRA_TAGS)):
+        scanner = with_extra_transformers(extra)
+        for label, fn in [
+            ("legacy", lambda name: legacy_scan(scanner, name)),
+            ("single_pass", scanner.scan),
+        ]:
+            key = f"parse.scan.{len(scanner)}_transformers.{label}"
+            results[key] = throughput(fn, names, args.repeat)
+    return results
+
+
+def main() -> None:
+    run(__doc__, [benchmark])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Measure how fast movie file names are resolved and formatted end to end.
+
+Movies are searched in a fake TMDB served in-process, answering with a configurable
+latency, which is built from the movies of the names of the corpus.
+"""
+
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+from media_helper.adapters.cache import SqliteMovieCache
+from media_helper.adapters.throttling import TokenBucket
+from media_helper.adapters.tmdb import AsyncTmdbMovieDatabase, TmdbMovieDatabase
+from media_helper.core.model import MediaInformation
+from media_helper.services.movie import MovieService
+from tests.fake_tmdb import FakeTmdbServer, tmdb_movie
+
+from .common import Results, run, throughput
+
+
+def catalog(names: list[str]) -> list[dict[str, Any]]:
+    """Return the TMDB movies of given names."""
+    movies: dict[tuple[str, int], dict[str, Any]] = {}
+    for name in names:
+        info = MediaInformation.from_filename(name)
+        if info.title and info.year and (info.title, info.year[0]) not in movies:
+            movies[info.title, info.year[0]] = tmdb_movie(
+                len(movies) + 1, info.title, f"{info.year[0]}-01-01"
+            )
+    return list(movies.values())
+
+
+@contextmanager
+def movie_service(
+    server: FakeTmdbServer, concurrency: int, cache: SqliteMovieCache | None = None
+) -> Iterator[MovieService]:
+    # Do not let rate limiting hide how fast names are actually resolved
+    options: dict[str, Any] = dict(
+        access_token="benchmark",
+        api_base_url=server.url,
+        cache=cache,
+        rate_limiter=TokenBucket(rate=1e9),
+    )
+    moviedb = TmdbMovieDatabase(**options)
+    async_moviedb = AsyncTmdbMovieDatabase(**options, max_connections=concurrency)
+    try:
+        yield MovieService(moviedb, async_moviedb)
+    finally:
+        moviedb.close()
+        asyncio.run(async_moviedb.aclose())
+
+
+def format_or_error(srv: MovieService, name: str) -> object:
+    try:
+        return srv.format_filename(name)
+    except Exception as error:
+        return error
+
+
+def concurrent_throughput(
+    srv: MovieService, names: list[str], concurrency: int, repeat: int
+) -> float:
+    """Return the best number of names formatted concurrently per second."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        asyncio.run(srv.format_filenames(names, concurrency=concurrency))
+        best = min(best, time.perf_counter() - start)
+    return len(names) / best
+
+
+def benchmark(args: argparse.Namespace, names: list[str]) -> Results:
+    sample = random.Random(0).sample(names, min(args.sample, len(names)))
+    with FakeTmdbServer(catalog(names), latency=args.latency) as server:
+        with movie_service(server, args.concurrency) as srv:
+            results = {
+                "resolve.format_filename": throughput(
+                    lambda name: format_or_error(srv, name), sample, args.repeat
+                ),
+                f"resolve.format_filenames.concurrency_{args.concurrency}": (
+                    concurrent_throughput(srv, sample, args.concurrency, args.repeat)
+                ),
+            }
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = SqliteMovieCache(Path(tmpdir) / "movies.sqlite3")
+            with movie_service(server, args.concurrency, cache) as srv:
+                # Warm the cache up so that only cache hits are measured
+                for name in sample:
+                    format_or_error(srv, name)
+                results["resolve.format_filename.cached"] = throughput(
+                    lambda name: format_or_error(srv, name), sample, args.repeat
+                )
+            cache.close()
+    return results
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    group = parser.add_argument_group("resolve")
+    group.add_argument(
+        "--latency",
+        type=float,
+        default=0.01,
+        help="Seconds taken by the fake TMDB to answer a request",
+    )
+    group.add_argument(
+        "--sample", type=int, default=100, help="Number of names to resolve"
+    )
+    group.add_argument(
+        "--concurrency", type=int, default=8, help="Number of concurrent searches"
+    )
+
+
+def main() -> None:
+    run(__doc__, [benchmark], [add_arguments])
+
+
+if __name__ == "__main__":
+    main()
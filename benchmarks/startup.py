@@ -0,0 +1,70 @@
+"""Measure how long the ``media`` CLI takes to start."""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Commands that should never pay for importing parsing or TMDB related modules
+COMMANDS = [
+    ["--help"],
+    ["movie", "--help"],
+    ["movie", "parse", "Inception.2010.1080p.BluRay.x264.mkv"],
+]
+
+
+def import_times(module: str) -> list[tuple[int, str]]:
+    """Return the cumulative import time (in µs) of every module imported by ``module``."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        times.append((int(cumulative), name.strip()))
+    return times
+
+
+def wall_time(args: list[str], repeat: int) -> float:
+    """Return the best wall time (in seconds) of running the CLI with given args."""
+    # Do not let a configured token hide settings being loaded needlessly
+    env = {k: v for k, v in os.environ.items() if k != "TMDB_ACCESS_TOKEN"}
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "media_helper", *args],
+            stdout=subprocess.DEVNULL,
+            env=env,
+            check=True,
+        )
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    times = import_times("media_helper.cli")
+    total = next(t for t, name in times if name == "media_helper.cli")
+    print(f"import media_helper.cli: {total / 1000:>8.1f} ms")
+    for cumulative, name in sorted(times, reverse=True)[1 : args.top + 1]:
+        print(f"{name:>40}: {cumulative / 1000:>8.1f} ms")
+
+    print()
+    for command in COMMANDS:
+        label = "media " + " ".join(command)
+        print(f"{label[:48]:>48}: {wall_time(command, args.repeat) * 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,20 @@
-from .rich import RichUserInterface
-from .tmdb import TmdbMovieDatabase
+from typing import TYPE_CHECKING, Any
 
-__all__ = ["RichUserInterface", "TmdbMovieDatabase"]
+if TYPE_CHECKING:
+    from .rich import RichUserInterface
+    from .tmdb import AsyncTmdbMovieDatabase, TmdbMovieDatabase
+
+__all__ = ["AsyncTmdbMovieDatabase", "RichUserInterface", "TmdbMovieDatabase"]
+
+
+def __getattr__(name: str) -> Any:
+    # Adapters depend on heavy libraries, only import them once actually used
+    if name == "RichUserInterface":
+        from .rich import RichUserInterface
+
+        return RichUserInterface
+    if name in ("AsyncTmdbMovieDatabase", "TmdbMovieDatabase"):
+        from . import tmdb
+
+        return getattr(tmdb, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
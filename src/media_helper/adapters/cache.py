@@ -0,0 +1,151 @@
+import sqlite3
+import time
+from collections.abc import Iterator
+from datetime import timedelta
+from pathlib import Path
+
+from pydantic import TypeAdapter
+
+from media_helper.core.model import Movie
+
+_MOVIES = TypeAdapter(list[Movie])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+"""
+
+
+class SqliteMovieCache:
+    """Persistent cache of movie database lookups backed by SQLite.
+
+    Entries are lists of movies: a search result, or a single movie fetched by id.
+    Other lookups (e.g. of TV shows) can be cached as raw JSON. Empty lists are
+    cached too (negative caching) but expire sooner. Once the cache holds more than
+    ``max_entries``, least recently used entries are evicted.
+
+    >>> cache = SqliteMovieCache(Path(":memory:"))
+    >>> cache.get("tmdb:search:fr-FR::black swan") is None
+    True
+    >>> cache.set("tmdb:search:fr-FR::black swan", [])
+    >>> cache.get("tmdb:search:fr-FR::black swan")
+    []
+    """
+
+    # Eviction requires scanning the whole table so only do it once in a while
+    EVICT_EVERY = 64
+
+    def __init__(
+        self,
+        path: Path,
+        ttl: timedelta = timedelta(days=30),
+        negative_ttl: timedelta = timedelta(days=1),
+        max_entries: int = 50_000,
+        enabled: bool = True,
+        refresh: bool = False,
+    ) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        # When disabled, the cache is neither read nor written
+        self.enabled = enabled
+        # When refreshing, the cache is written but never read
+        self.refresh = refresh
+        self._db: sqlite3.Connection | None = None
+        self._writes = 0
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        # Connect lazily so that a disabled cache never touches the disk
+        if self._db is None:
+            if str(self.path) != ":memory:":
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(_SCHEMA)
+        return self._db
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._evict()
+            self._db.close()
+            self._db = None
+
+    def get(self, key: str) -> list[Movie] | None:
+        """Return cached movies for given key or ``None`` if there is none."""
+        value = self.get_json(key)
+        return None if value is None else _MOVIES.validate_json(value)
+
+    def set(self, key: str, movies: list[Movie], ttl: timedelta | None = None) -> None:
+        """Cache given movies under given key.
+
+        Unless a ``ttl`` is given, the entry expires after the cache ``ttl`` or after
+        its ``negative_ttl`` when there are no movies.
+        """
+        if ttl is None:
+            ttl = self.ttl if movies else self.negative_ttl
+        self.set_json(key, _MOVIES.dump_json(movies), ttl)
+
+    def get_json(self, key: str) -> bytes | None:
+        """Return the JSON cached under given key or ``None`` if there is none."""
+        if not self.enabled or self.refresh:
+            return None
+
+        now = time.time()
+        row = self._connection.execute(
+            "SELECT value FROM entries WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        self._connection.execute(
+            "UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key)
+        )
+        return bytes(row[0])
+
+    def set_json(self, key: str, value: bytes, ttl: timedelta | None = None) -> None:
+        """Cache given JSON under given key, for other lookups than movies.
+
+        Such keys must not share a prefix with the keys of movies, see :meth:`movies`.
+        """
+        if not self.enabled:
+            return
+
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        self._connection.execute(
+            "INSERT OR REPLACE INTO entries (key, value, expires_at, accessed_at) "
+            "VALUES (?, ?, ?, ?)",
+            (key, value, now + ttl.total_seconds(), now),
+        )
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            self._evict()
+
+    def movies(self, prefix: str = "") -> Iterator[Movie]:
+        """Yield the movies of all live entries whose key starts with given prefix."""
+        rows = self._connection.execute(
+            "SELECT value FROM entries "
+            "WHERE substr(key, 1, length(?1)) = ?1 AND expires_at > ?2",
+            (prefix, time.time()),
+        )
+        for (value,) in rows:
+            yield from _MOVIES.validate_json(value)
+
+    def clear(self) -> None:
+        self._connection.execute("DELETE FROM entries")
+
+    def _evict(self) -> None:
+        db = self._connection
+        db.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+        db.execute(
+            "DELETE FROM entries WHERE key IN ("
+            "SELECT key FROM entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
@@ -0,0 +1,130 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+from collections.abc import Iterator
+from pathlib import Path
+from typing import NamedTuple
+
+# See inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+_EVENT = struct.Struct("iIII")
+
+
+class InotifyEvent(NamedTuple):
+    path: Path
+    mask: int
+
+    @property
+    def is_dir(self) -> bool:
+        return bool(self.mask & IN_ISDIR)
+
+    @property
+    def completed(self) -> bool:
+        """Whether the file has been written or moved in, rather than just created."""
+        return bool(self.mask & (IN_CLOSE_WRITE | IN_MOVED_TO))
+
+    @property
+    def overflowed(self) -> bool:
+        """Whether events have been lost, the kernel queue being full."""
+        return bool(self.mask & IN_Q_OVERFLOW)
+
+
+class InotifyWatcher:
+    """Watch directory trees for files written or moved in, with Linux inotify.
+
+    Only the events telling that a file is complete are watched: a file closed after
+    being written, or moved into a watched directory. Subdirectories are watched as
+    well, including the ones created or moved in later on. The watcher does not
+    block: :meth:`fileno` is meant to be waited for (e.g. by an event loop) before
+    reading available events with :meth:`read`.
+    """
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_ONLYDIR
+
+    def __init__(self) -> None:
+        libc_name = ctypes.util.find_library("c")
+        try:
+            self._libc = ctypes.CDLL(libc_name, use_errno=True)
+            init = self._libc.inotify_init1
+        except (OSError, AttributeError) as error:
+            raise OSError(
+                errno.ENOSYS, "inotify is not available on this system"
+            ) from error
+        self._fd: int = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            self._raise_errno()
+        self._directories: dict[int, Path] = {}
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __enter__(self) -> "InotifyWatcher":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def watch(self, directory: Path) -> None:
+        """Watch given directory and all its subdirectories (hidden ones excepted)."""
+        self._add_watch(directory)
+        for dirpath, dirnames, _ in os.walk(directory):
+            dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+            for name in dirnames:
+                self._add_watch(Path(dirpath, name))
+
+    def read(self) -> Iterator[InotifyEvent]:
+        """Yield the events available so far, without blocking."""
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                yield InotifyEvent(Path(), mask)
+                continue
+            directory = self._directories.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                # The directory has been removed or unmounted
+                del self._directories[wd]
+                continue
+            path = directory / os.fsdecode(name) if name else directory
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                if not path.name.startswith("."):
+                    self.watch(path)
+            yield InotifyEvent(path, mask)
+
+    def _add_watch(self, directory: Path) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), self.MASK)
+        if wd < 0:
+            if ctypes.get_errno() in (errno.ENOENT, errno.ENOTDIR):
+                # Removed meanwhile
+                return
+            self._raise_errno(directory)
+        self._directories[wd] = directory
+
+    def _raise_errno(self, path: Path | None = None) -> None:
+        code = ctypes.get_errno()
+        raise OSError(code, os.strerror(code), None if path is None else str(path))
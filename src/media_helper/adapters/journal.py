@@ -0,0 +1,190 @@
+import json
+import os
+import time
+from collections.abc import Iterator
+from datetime import datetime
+from pathlib import Path
+from types import TracebackType
+from typing import Any
+
+from media_helper.core.library import FileKey
+from media_helper.services.movie import FormattedMediaInformation
+from media_helper.services.rename import RenameOperation, RenameStrategy
+
+
+class RunJournal:
+    """Append-only journal of a rename run, stored as JSON lines.
+
+    It records how files have been resolved and which renames have been applied, so
+    that an interrupted run can be resumed and a run can be undone. Records are
+    written as they come but only synced to disk every ``sync_every`` records or
+    ``sync_interval`` seconds, and when the journal is closed, so that journaling
+    does not slow runs down. A crash thus loses at most the last few records, a
+    partially written record being ignored.
+
+    A run started by some ``command`` tells it first, so that the runs of a command
+    are found among the others.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        sync_every: int = 64,
+        sync_interval: float = 1.0,
+        command: str | None = None,
+    ) -> None:
+        self.path = path
+        self.command = command
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._file: Any = None
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    @classmethod
+    def create(cls, directory: Path, command: str | None = None) -> "RunJournal":
+        """Return the journal of a new run, named after the current time."""
+        run_id = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        return cls(directory / f"{run_id}.jsonl", command=command)
+
+    @classmethod
+    def find(
+        cls, directory: Path, run_id: str | None = None, command: str | None = None
+    ) -> "RunJournal | None":
+        """Return the journal of given run, or of the latest run of given command."""
+        if run_id is not None:
+            path = directory / f"{run_id}.jsonl"
+            return cls(path, command=_started_command(path)) if path.exists() else None
+        for path in sorted(directory.glob("*.jsonl"), reverse=True):
+            started_command = _started_command(path)
+            if command is None or started_command == command:
+                return cls(path, command=started_command)
+        return None
+
+    @property
+    def run_id(self) -> str:
+        return self.path.stem
+
+    def __enter__(self) -> "RunJournal":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def sync(self) -> None:
+        if self._file is not None and self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def start(self, strategy: RenameStrategy, paths: list[Path]) -> None:
+        self._write(
+            "start",
+            command=self.command,
+            strategy=strategy.value,
+            paths=list(map(str, paths)),
+        )
+
+    def resolved(self, source: Path, result: FormattedMediaInformation) -> None:
+        self._write("resolved", source=str(source), result=list(result))
+
+    def renamed(
+        self, operation: RenameOperation, strategy: RenameStrategy, key: FileKey
+    ) -> None:
+        self._write(
+            "renamed",
+            source=str(operation.source),
+            destination=str(operation.destination),
+            strategy=strategy.value,
+            key=list(key),
+        )
+
+    def undone(self, operation: RenameOperation) -> None:
+        self._write(
+            "undone",
+            source=str(operation.source),
+            destination=str(operation.destination),
+        )
+
+    def resolutions(self) -> dict[Path, FormattedMediaInformation]:
+        """Return how files have been resolved, by file."""
+        return {
+            Path(record["source"]): FormattedMediaInformation(*record["result"])
+            for record in self._records("resolved")
+        }
+
+    def renames(self) -> list[tuple[RenameOperation, RenameStrategy, FileKey]]:
+        """Return the renames applied and not undone, in the order they have been."""
+        renames: dict[
+            RenameOperation, tuple[RenameOperation, RenameStrategy, FileKey]
+        ] = {}
+        for record in self._records("renamed", "undone"):
+            operation = RenameOperation(
+                Path(record["source"]), Path(record["destination"])
+            )
+            if record["type"] == "undone":
+                renames.pop(operation, None)
+            else:
+                strategy = RenameStrategy(record["strategy"])
+                renames[operation] = (operation, strategy, FileKey(*record["key"]))
+        return list(renames.values())
+
+    def _records(self, *types: str) -> Iterator[dict[str, Any]]:
+        if self._file is not None:
+            self._file.flush()
+        if not self.path.exists():
+            return
+        with self.path.open(encoding="utf-8") as lines:
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Partially written before a crash
+                    continue
+                if record["type"] in types:
+                    yield record
+
+    def _ends_with_newline(self) -> bool:
+        with self.path.open("rb") as file:
+            if not file.seek(0, os.SEEK_END):
+                return True
+            file.seek(-1, os.SEEK_END)
+            return file.read(1) == b"\n"
+
+    def _write(self, type: str, **values: Any) -> None:
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = self.path.open("a", encoding="utf-8")
+            if not self._ends_with_newline():
+                # Terminate a record partially written before a crash
+                self._file.write("\n")
+        record = {"type": type, "at": time.time(), **values}
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._unsynced += 1
+        if (
+            self._unsynced >= self.sync_every
+            or time.monotonic() - self._synced_at >= self.sync_interval
+        ):
+            self.sync()
+
+
+def _started_command(path: Path) -> str | None:
+    # Told by the first record, runs being started before anything else
+    with path.open(encoding="utf-8") as lines:
+        try:
+            record = json.loads(lines.readline())
+        except json.JSONDecodeError:
+            return None
+    return record.get("command") if record["type"] == "start" else None
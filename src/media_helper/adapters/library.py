@@ -0,0 +1,114 @@
+import sqlite3
+import time
+from collections import defaultdict
+from collections.abc import Iterable
+from pathlib import Path
+
+from media_helper.core.library import FileKey, LibraryEntry
+from media_helper.ports import LibraryIndex
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS roots (
+    path TEXT PRIMARY KEY,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS library (
+    path TEXT PRIMARY KEY,
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    source TEXT,
+    resolution TEXT,
+    quality TEXT,
+    codec TEXT
+);
+CREATE INDEX IF NOT EXISTS library_source ON library (source);
+"""
+
+
+class SqliteLibraryIndex(LibraryIndex):
+    """Index of the files of the organized library, by the media they are tagged with.
+
+    Every file found in the indexed directories (the roots) is indexed, even the
+    ones not tagged with any media, so that updating the index only requires parsing
+    the names of the files added or modified since.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._db: sqlite3.Connection | None = None
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            if str(self.path) != ":memory:":
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(_SCHEMA)
+        return self._db
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def roots(self) -> list[Path]:
+        """Return the directories indexed so far."""
+        rows = self._connection.execute("SELECT path FROM roots ORDER BY path")
+        return [Path(path) for (path,) in rows]
+
+    def files(self) -> dict[Path, FileKey]:
+        """Return the keys of all indexed files, for telling which ones changed."""
+        rows = self._connection.execute(
+            "SELECT path, device, inode, size, mtime_ns FROM library"
+        )
+        return {Path(path): FileKey(*key) for path, *key in rows}
+
+    def update(
+        self,
+        roots: Iterable[Path],
+        entries: Iterable[LibraryEntry],
+        removed: Iterable[Path],
+    ) -> None:
+        """Index given files of given roots, forgetting the ones removed since."""
+        now = time.time()
+        with self._connection as db:
+            db.execute("BEGIN")
+            db.executemany(
+                "INSERT OR REPLACE INTO roots (path, indexed_at) VALUES (?, ?)",
+                ((str(root), now) for root in roots),
+            )
+            db.executemany(
+                "DELETE FROM library WHERE path = ?", ((str(p),) for p in removed)
+            )
+            db.executemany(
+                "INSERT OR REPLACE INTO library "
+                "(path, device, inode, size, mtime_ns, source, resolution, quality, "
+                "codec) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((str(entry.path), *entry.key, *entry[2:]) for entry in entries),
+            )
+
+    def by_source(self) -> dict[str, list[LibraryEntry]]:
+        """Return the indexed files tagged with a media, by media.
+
+        Checking many files against this mapping is much faster than querying the
+        index once per file.
+        """
+        rows = self._connection.execute(
+            "SELECT path, device, inode, size, mtime_ns, source, resolution, "
+            "quality, codec FROM library WHERE source IS NOT NULL ORDER BY path"
+        )
+        entries: defaultdict[str, list[LibraryEntry]] = defaultdict(list)
+        for path, device, inode, size, mtime_ns, source, *quality in rows:
+            entries[source].append(
+                LibraryEntry(
+                    Path(path),
+                    FileKey(device, inode, size, mtime_ns),
+                    source,
+                    *quality,
+                )
+            )
+        return dict(entries)
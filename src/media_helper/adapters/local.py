@@ -0,0 +1,370 @@
+import difflib
+import sqlite3
+import time
+from collections.abc import Iterable
+from datetime import timedelta
+from pathlib import Path
+from typing import ClassVar
+
+from media_helper import profiling
+from media_helper.core.model import Movie
+from media_helper.core.ranking import confident_winner, rank_movies
+from media_helper.core.text import normalize_title
+from media_helper.ports import AsyncMovieDatabase, MovieDatabase
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS movies (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    original_title TEXT NOT NULL,
+    normalized_title TEXT NOT NULL,
+    normalized_original_title TEXT NOT NULL,
+    release_year INTEGER NOT NULL,
+    popularity REAL NOT NULL,
+    vote_average REAL NOT NULL,
+    vote_count INTEGER NOT NULL,
+    link TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS movies_normalized_title
+    ON movies (normalized_title);
+CREATE INDEX IF NOT EXISTS movies_normalized_original_title
+    ON movies (normalized_original_title);
+CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5(
+    normalized_title, normalized_original_title, tokenize='trigram'
+);
+"""
+
+_COLUMNS = (
+    "id, title, original_title, release_year, popularity, vote_average, vote_count, "
+    "link"
+)
+
+
+class LocalMovieDatabase(MovieDatabase):
+    """Movie database stored locally, for resolving movies without reaching TMDB.
+
+    It learns the movies returned by the API (see :meth:`add`), and forgets them
+    ``max_age`` after, until learned again.
+
+    Titles are searched exactly once normalized, then fuzzily through a trigram index
+    when there is no exact match.
+
+    >>> db = LocalMovieDatabase(Path(":memory:"))
+    >>> db.add([Movie(id="44214", title="Black Swan", original_title="Black Swan",
+    ...     release_year=2010, source_name="tmdb", link="", popularity=30.0,
+    ...     vote_average=7.7, vote_count=15000)])
+    >>> db.search("black swan")
+    [Movie(id='44214', title='Black Swan', ...)]
+    >>> db.search("Blak Swan", 2010)
+    [Movie(id='44214', title='Black Swan', ...)]
+    >>> db.search("Black Swan", 2011)
+    []
+    """
+
+    SOURCE: ClassVar[str] = "tmdb"
+    # Minimum similarity of a fuzzily found title with the searched one
+    MIN_SIMILARITY = 0.8
+    # Maximum number of fuzzily found titles compared with the searched one
+    MAX_CANDIDATES = 200
+
+    def __init__(self, path: Path, max_age: timedelta = timedelta(days=30)) -> None:
+        self.path = path
+        self.max_age = max_age
+        self._db: sqlite3.Connection | None = None
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            if str(self.path) != ":memory:":
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(_SCHEMA)
+        return self._db
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __len__(self) -> int:
+        return int(
+            self._connection.execute("SELECT count(*) FROM movies").fetchone()[0]
+        )
+
+    def search(self, query: str, release_year: int | None = None) -> list[Movie]:
+        normalized = normalize_title(query)
+        if not normalized:
+            return []
+        with profiling.span("local.search"):
+            filters, params = self._filters(release_year)
+            rows = self._connection.execute(
+                f"SELECT {_COLUMNS} FROM movies "
+                "WHERE (normalized_title = ? OR normalized_original_title = ?)"
+                f"{filters} ORDER BY popularity DESC",
+                (normalized, normalized, *params),
+            ).fetchall()
+            if not rows:
+                rows = self._fuzzy_search(normalized, filters, params)
+            movies = [self._to_movie(row) for row in rows]
+        profiling.count("local.hit" if movies else "local.miss")
+        return movies
+
+    def get(self, id: str) -> Movie | None:
+        if not id.isdigit():
+            return None
+        filters, params = self._filters(None)
+        row = self._connection.execute(
+            f"SELECT {_COLUMNS} FROM movies WHERE id = ?{filters}", (int(id), *params)
+        ).fetchone()
+        return self._to_movie(row) if row else None
+
+    def find(self, source: str, id: str) -> Movie | None:
+        # The ids of movies in other databases are not learned
+        return None
+
+    def add(self, movies: Iterable[Movie]) -> None:
+        """Add or update given movies, as returned by the API."""
+        now = time.time()
+        # Only keep the last version of every movie
+        rows = {
+            m.id: (
+                int(m.id),
+                m.title,
+                m.original_title,
+                normalize_title(m.title),
+                normalize_title(m.original_title),
+                m.release_year,
+                m.popularity,
+                m.vote_average,
+                m.vote_count,
+                m.link,
+                now,
+            )
+            for m in movies
+            if m.source_name == self.SOURCE and m.id.isdigit()
+        }.values()
+        if not rows:
+            return
+        with self._connection as db:
+            db.execute("BEGIN")
+            db.executemany(
+                "INSERT OR REPLACE INTO movies (id, title, original_title, "
+                "normalized_title, normalized_original_title, release_year, "
+                "popularity, vote_average, vote_count, link, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            db.executemany(
+                "DELETE FROM movies_fts WHERE rowid = ?", ((row[0],) for row in rows)
+            )
+            db.executemany(
+                "INSERT INTO movies_fts "
+                "(rowid, normalized_title, normalized_original_title) "
+                "VALUES (?, ?, ?)",
+                ((row[0], row[3], row[4]) for row in rows),
+            )
+
+    def _fuzzy_search(
+        self, normalized: str, filters: str, params: tuple[float, ...]
+    ) -> list[tuple[object, ...]]:
+        query = _fuzzy_query(normalized)
+        if not query:
+            return []
+        candidates = self._connection.execute(
+            f"SELECT {_COLUMNS}, movies.normalized_title, "
+            "movies.normalized_original_title "
+            "FROM movies_fts JOIN movies ON movies.id = movies_fts.rowid "
+            f"WHERE movies_fts MATCH ?{filters} LIMIT ?",
+            (query, *params, self.MAX_CANDIDATES),
+        ).fetchall()
+
+        scored = []
+        for *row, title, original_title in candidates:
+            similarity = max(
+                difflib.SequenceMatcher(None, normalized, title).ratio(),
+                difflib.SequenceMatcher(None, normalized, original_title).ratio(),
+            )
+            if similarity >= self.MIN_SIMILARITY:
+                scored.append((similarity, row[4], tuple(row)))
+        scored.sort(key=lambda s: s[:2], reverse=True)
+        return [row for *_, row in scored]
+
+    def _filters(self, release_year: int | None) -> tuple[str, tuple[float, ...]]:
+        # Movies learned too long ago are forgotten, as well as other years if given
+        filters = " AND updated_at > ?"
+        params: list[float] = [time.time() - self.max_age.total_seconds()]
+        if release_year is not None:
+            filters += " AND release_year = ?"
+            params.append(release_year)
+        return filters, tuple(params)
+
+    def _to_movie(self, row: tuple[object, ...]) -> Movie:
+        id, title, original_title, release_year, *stats, link = row
+        popularity, vote_average, vote_count = stats
+        return Movie.model_validate(
+            dict(
+                id=str(id),
+                title=title,
+                original_title=original_title,
+                release_year=release_year,
+                source_name=self.SOURCE,
+                link=link,
+                popularity=popularity,
+                vote_average=vote_average,
+                vote_count=vote_count,
+            )
+        )
+
+
+def _fuzzy_query(normalized: str) -> str:
+    """Return the full text query of titles looking like the given normalized one.
+
+    Such titles contain all the words of the given one but one, so that a typo is
+    tolerated, and matching words as substrings is cheap with a trigram index. A single
+    word is cut into two overlapping halves for the same purpose.
+
+    >>> _fuzzy_query("the dark knight")
+    '("dark" AND "knight") OR ("the" AND "knight") OR ("the" AND "dark")'
+    >>> _fuzzy_query("inceptoin")
+    '("ptoin") OR ("incep")'
+    >>> _fuzzy_query("up")
+    ''
+    """
+    terms = [word for word in normalized.split() if len(word) >= 3]
+    if len(terms) == 1:
+        word = terms[0]
+        middle = len(word) // 2
+        terms = [word[: middle + 1], word[middle:]]
+    if len(terms) < 2 or min(map(len, terms)) < 3:
+        return ""
+    return " OR ".join(
+        "(" + " AND ".join(f'"{t}"' for t in terms[:i] + terms[i + 1 :]) + ")"
+        for i in range(len(terms))
+    )
+
+
+class _BaseFallbackMovieDatabase:
+    """Logic shared by the blocking and the asynchronous fallback databases.
+
+    A search is only answered locally when it tells the release year and the local
+    database finds a confident winner (see :func:`confident_winner`): without a year,
+    the local database may only know some of the movies having the searched title.
+    Movies found remotely are learned locally. The local database is neither read
+    nor written when disabled, and only written when refreshing.
+    """
+
+    SOURCE: ClassVar[str] = LocalMovieDatabase.SOURCE
+
+    def __init__(
+        self,
+        local: LocalMovieDatabase,
+        confidence_margin: float = 0.15,
+        enabled: bool = True,
+        refresh: bool = False,
+    ) -> None:
+        self.local = local
+        self.confidence_margin = confidence_margin
+        self.enabled = enabled
+        self.refresh = refresh
+
+    def _search(self, query: str, release_year: int | None) -> list[Movie] | None:
+        if not self.enabled or self.refresh or release_year is None:
+            return None
+        ranked = rank_movies(
+            self.local.search(query, release_year), query, release_year
+        )
+        movie = confident_winner(ranked, self.confidence_margin)
+        profiling.count("local.miss" if movie is None else "local.confident")
+        return None if movie is None else [movie]
+
+    def _get(self, id: str) -> Movie | None:
+        if not self.enabled or self.refresh:
+            return None
+        return self.local.get(id)
+
+    def _learn(self, movies: list[Movie]) -> None:
+        if self.enabled:
+            self.local.add(movies)
+
+
+class FallbackMovieDatabase(_BaseFallbackMovieDatabase, MovieDatabase):
+    """Resolve movies locally when possible, and through a remote database otherwise.
+
+    >>> remote = LocalMovieDatabase(Path(":memory:"))
+    >>> remote.add([Movie(id="44214", title="Black Swan", original_title="Black Swan",
+    ...     release_year=2010, source_name="tmdb", link="", popularity=30.0,
+    ...     vote_average=7.7, vote_count=15000)])
+    >>> moviedb = FallbackMovieDatabase(LocalMovieDatabase(Path(":memory:")), remote)
+    >>> moviedb.search("Black Swan")
+    [Movie(id='44214', title='Black Swan', ...)]
+    >>> moviedb.local.search("Blak Swan", 2010)
+    [Movie(id='44214', title='Black Swan', ...)]
+    """
+
+    def __init__(
+        self,
+        local: LocalMovieDatabase,
+        remote: MovieDatabase,
+        confidence_margin: float = 0.15,
+        enabled: bool = True,
+        refresh: bool = False,
+    ) -> None:
+        super().__init__(local, confidence_margin, enabled, refresh)
+        self.remote = remote
+
+    def search(self, query: str, release_year: int | None = None) -> list[Movie]:
+        movies = self._search(query, release_year)
+        if movies is None:
+            movies = self.remote.search(query, release_year)
+            self._learn(movies)
+        return movies
+
+    def get(self, id: str) -> Movie | None:
+        movie = self._get(id)
+        if movie is None:
+            movie = self.remote.get(id)
+            self._learn([movie] if movie else [])
+        return movie
+
+    def find(self, source: str, id: str) -> Movie | None:
+        # The remote database remembers how ids map to its own ones
+        movie = self.remote.find(source, id)
+        self._learn([movie] if movie else [])
+        return movie
+
+
+class AsyncFallbackMovieDatabase(_BaseFallbackMovieDatabase, AsyncMovieDatabase):
+    """Same as :class:`FallbackMovieDatabase` but with an asynchronous remote."""
+
+    def __init__(
+        self,
+        local: LocalMovieDatabase,
+        remote: AsyncMovieDatabase,
+        confidence_margin: float = 0.15,
+        enabled: bool = True,
+        refresh: bool = False,
+    ) -> None:
+        super().__init__(local, confidence_margin, enabled, refresh)
+        self.remote = remote
+
+    async def search(self, query: str, release_year: int | None = None) -> list[Movie]:
+        movies = self._search(query, release_year)
+        if movies is None:
+            movies = await self.remote.search(query, release_year)
+            self._learn(movies)
+        return movies
+
+    async def get(self, id: str) -> Movie | None:
+        movie = self._get(id)
+        if movie is None:
+            movie = await self.remote.get(id)
+            self._learn([movie] if movie else [])
+        return movie
+
+    async def find(self, source: str, id: str) -> Movie | None:
+        movie = await self.remote.find(source, id)
+        self._learn([movie] if movie else [])
+        return movie
@@ -1,19 +1,29 @@
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Any, Callable, Iterator
 
 from rich.console import Console
+from rich.progress import DownloadColumn, Progress
 from rich.prompt import Confirm, Prompt
 from rich.table import Table
 from rich.text import Text
 from rich.tree import Tree
 
+from .. import profiling
 from ..core.model import Movie
-from ..services.movie import FormattedMediaInformation, MovieService
+from ..ports import (
+    EpisodeNotFoundError,
+    ManyMoviesFoundError,
+    ManyShowsFoundError,
+    MovieNotFoundError,
+    ShowNotFoundError,
+)
+from ..services.movie import FormattedMediaInformation, PlannedRename
+from ..services.rename import DuplicateDestinationError, RenameResult
 
 
 class RichUserInterface:
-    def __init__(self, movie_srv: MovieService) -> None:
-        self.movie_srv = movie_srv
+    def __init__(self) -> None:
         self.console = Console()
         self.confirm = Confirm(console=self.console)
 
@@ -21,15 +31,22 @@ class RichUserInterface:
         self, filepaths: list[Path], skipif: Callable[[Path], str] | None = None
     ) -> Iterator[Path]:
         for index, filepath in enumerate(filepaths):
-            msg = Text(f"[{index + 1}/{len(filepaths)}] ", style="yellow").append(
-                Text(filepath.name)
-            )
-            skip_reason = skipif(filepath) if skipif else False
-            if skip_reason:
-                self.console.print(msg, f"- {skip_reason}")
-            elif self.confirm.ask(msg, default=True):
+            skip_reason = skipif(filepath) if skipif else ""
+            if self.confirm_path(index, len(filepaths), filepath, skip_reason):
                 yield filepath
 
+    def confirm_path(
+        self, index: int, total: int, filepath: Path, skip_reason: str = ""
+    ) -> bool:
+        """Ask whether to process the ``index``-th file, unless it is to be skipped."""
+        msg = Text(f"[{index + 1}/{total}] ", style="yellow").append(
+            Text(filepath.name)
+        )
+        if skip_reason:
+            self.console.print(msg, f"- {skip_reason}")
+            return False
+        return self.confirm.ask(msg, default=True)
+
     def print_media_information(self, media_info: dict[str, Any]) -> None:
         table = Table(title="Media Information")
         table.add_column("", justify="right", no_wrap=True)
@@ -55,7 +72,10 @@ class RichUserInterface:
             Text("->", style="yellow bold"),
             self._get_formatted_media_info_tree(fmedia_info, output_dir=output_dir),
         )
-        return skip or self.confirm.ask("Proceed?", default=True)
+        if skip:
+            return True
+        with profiling.span("ui.prompt"):
+            return self.confirm.ask("Proceed?", default=True)
 
     def print_formatted_media_info(
         self, fmedia_info: FormattedMediaInformation, output_dir: Path | None = None
@@ -74,6 +94,74 @@ class RichUserInterface:
         tree.add(fmedia_info.filename, style=f"link {fmedia_info.link}")
         return tree
 
+    def print_rename_plan(self, plan: list[PlannedRename], strategy: str) -> None:
+        table = Table(title=f"{strategy.capitalize()} {len(plan)} file(s)")
+        table.add_column("#", justify="right", no_wrap=True)
+        table.add_column("Status", no_wrap=True)
+        table.add_column("File")
+        table.add_column("Renamed to / Reason")
+
+        for index, entry in enumerate(plan):
+            operation = entry.operation
+            if operation is None:
+                status, style = self._format_error_status(entry.result)
+                target = Text(str(entry.result), style=style)
+            elif operation.destination == entry.source:
+                status, style = "unchanged", "dim"
+                target = Text("")
+            else:
+                status, style = "ok", "green"
+                target = Text(str(operation.destination.relative_to(entry.output_dir)))
+            table.add_row(
+                str(index + 1), Text(status, style=style), entry.source.name, target
+            )
+
+        self.console.print(table)
+
+    def _format_error_status(self, error: Any) -> tuple[str, str]:
+        if isinstance(error, ManyMoviesFoundError):
+            return f"ambiguous ({len(error.movies)})", "yellow"
+        if isinstance(error, ManyShowsFoundError):
+            return f"ambiguous ({len(error.shows)})", "yellow"
+        if isinstance(
+            error, (MovieNotFoundError, ShowNotFoundError, EpisodeNotFoundError)
+        ):
+            return "not found", "red"
+        if isinstance(error, DuplicateDestinationError):
+            return "duplicate", "yellow"
+        return "error", "bold red"
+
+    @contextmanager
+    def rename_progress(
+        self, total: int, total_bytes: int | None = None
+    ) -> Iterator[tuple[Callable[[RenameResult], None], Callable[[int], None]]]:
+        """Show the progress of renaming ``total`` files, and copying ``total_bytes``.
+
+        Yield the callbacks advancing progress by a rename result and by a number of
+        copied bytes.
+        """
+        columns = [*Progress.get_default_columns(), DownloadColumn()]
+        with Progress(*columns, console=self.console, transient=True) as progress:
+            files = progress.add_task("Renaming", total=total)
+            copied = progress.add_task(
+                "Copying", total=total_bytes, visible=total_bytes is not None
+            )
+            yield (
+                lambda result: progress.advance(files),
+                lambda count: progress.advance(copied, count),
+            )
+
+    def print_rename_results(
+        self, results: list[RenameResult], done: str = "renamed"
+    ) -> None:
+        failed = [r for r in results if r.error]
+        for result in failed:
+            self.error(f"{result.operation.source}: {result.error}")
+        self.console.print(
+            Text(f"{len(results) - len(failed)} file(s) {done}", style="green"),
+            Text(f"{len(failed)} failed", style="red") if failed else "",
+        )
+
     def print_movies(self, msg: Any, movies: list[Movie]) -> None:
         table = Table(title=str(msg))
         table.add_column("ID", justify="right", no_wrap=True)
@@ -97,8 +185,31 @@ class RichUserInterface:
 
         self.console.print(table)
 
+    def print_profile(self, summary: dict[str, Any]) -> None:
+        """Print a profiling summary, on stderr not to mix with command outputs."""
+        table = Table("Stage", "Count", "Total", "p50", "p95", "Max", title="Profile")
+        for stage, stats in summary["stages"].items():
+            table.add_row(
+                stage,
+                str(stats["count"]),
+                *(
+                    f"{stats[column] * 1000:.2f}ms"
+                    for column in ("total", "p50", "p95", "max")
+                ),
+            )
+        console = Console(stderr=True)
+        console.print(table)
+        for name, value in summary["counters"].items():
+            console.print(f"{name}: {value}")
+        if memory := summary.get("memory"):
+            console.print(f"Peak memory: {memory['peak'] / 1024**2:.1f}MiB, top lines:")
+            for stat in memory["top"]:
+                console.print(f"  {stat['size'] / 1024:.1f}KiB {stat['location']}")
+        console.print(f"Elapsed: {summary['elapsed']:.3f}s")
+
     def ask_movie_id(self, default: str | None = None) -> str | None:
-        return Prompt.ask("Enter movie ID", default=default)
+        with profiling.span("ui.prompt"):
+            return Prompt.ask("Enter movie ID", default=default)
 
     def error(self, message: Any) -> None:
         self.console.print(str(message), style="bold red")
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import logging
+from collections.abc import Awaitable, Callable
+from http import HTTPStatus
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+from media_helper.ports import ManyMoviesFoundError, MovieNotFoundError
+from media_helper.services.movie import FormattedMediaInformation, MovieService
+
+Payload = dict[str, Any]
+Handler = Callable[[Payload], Awaitable[Payload]]
+
+
+class BadRequest(Exception):
+    pass
+
+
+class MovieApiServer:
+    """Serve the movie service over HTTP, with JSON requests and responses.
+
+    Meant to be run once and called for every file by other programs (download
+    clients, scripts, ...), rather than starting the CLI for every file: connections
+    to the movie database and caches stay warm between requests. Everything runs in
+    a single event loop, so requests are handled concurrently while waiting for the
+    movie database.
+
+    Routes, taking parameters as a JSON body or as query parameters (GET):
+
+    - ``/parse``: ``filename`` -> ``media_info``
+    - ``/parse/batch``: ``filenames`` -> ``results`` (``media_info`` or ``error``)
+    - ``/format``: ``filename`` and optional ``movie_id`` -> ``filename``,
+      ``dirname`` and ``link``, or an ``error`` (404 when no movie is found, 409
+      along with the candidates when many are)
+    - ``/format/batch``: ``filenames`` -> ``results`` (formatted or ``error``)
+    - ``/health``
+
+    ``parse_srv`` only parses file names, the movie service used for formatting
+    being built by ``get_movie_srv`` on first use.
+    """
+
+    # Maximum size of request bodies, in bytes
+    MAX_BODY_SIZE = 16 * 1024**2
+
+    def __init__(
+        self,
+        parse_srv: MovieService,
+        get_movie_srv: Callable[[], MovieService],
+        concurrency: int = 8,
+    ) -> None:
+        self.parse_srv = parse_srv
+        self.get_movie_srv = get_movie_srv
+        self.concurrency = concurrency
+        self._routes: dict[str, Handler] = {
+            "/health": self._health,
+            "/parse": self._parse,
+            "/parse/batch": self._parse_batch,
+            "/format": self._format,
+            "/format/batch": self._format_batch,
+        }
+        self._logger = logging.getLogger(__name__)
+
+    async def serve_tcp(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def serve_unix(self, path: Path) -> None:
+        path.unlink(missing_ok=True)
+        server = await asyncio.start_unix_server(self._handle_connection, path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            path.unlink(missing_ok=True)
+
+    async def handle(
+        self, method: str, target: str, body: bytes
+    ) -> tuple[int, Payload]:
+        """Handle a request, returning the status and payload of the response."""
+        url = urlsplit(target)
+        handler = self._routes.get(url.path)
+        if handler is None:
+            return HTTPStatus.NOT_FOUND, _error("NotFound", f"No route {url.path}")
+        if method not in ("GET", "POST"):
+            return HTTPStatus.METHOD_NOT_ALLOWED, _error(
+                "MethodNotAllowed", f"{method} is not allowed"
+            )
+        try:
+            params: Payload = {
+                name: values if name == "filenames" else values[-1]
+                for name, values in parse_qs(url.query).items()
+            }
+            if body:
+                decoded = json.loads(body)
+                if not isinstance(decoded, dict):
+                    raise BadRequest("The body must be a JSON object")
+                params.update(decoded)
+            return HTTPStatus.OK, await handler(params)
+        except (BadRequest, ValueError) as error:
+            return HTTPStatus.BAD_REQUEST, _error("BadRequest", str(error))
+        except MovieNotFoundError as error:
+            return HTTPStatus.NOT_FOUND, _error_of(error)
+        except ManyMoviesFoundError as error:
+            return HTTPStatus.CONFLICT, _error_of(error)
+        except Exception as error:
+            self._logger.exception("Failed to handle %s %s", method, target)
+            return HTTPStatus.INTERNAL_SERVER_ERROR, _error_of(error)
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while await self._handle_request(reader, writer):
+                pass
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> bool:
+        """Handle the next request of a connection, return whether to keep it open."""
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return False
+            headers = {}
+            while (line := await reader.readline()).strip():
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            method, target, version = request_line.decode("latin-1").split()
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            # Also raised by readline() for lines longer than the stream limit
+            self._respond(writer, HTTPStatus.BAD_REQUEST, _error("BadRequest", ""))
+            return False
+        if length > self.MAX_BODY_SIZE:
+            self._respond(
+                writer,
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                _error("BadRequest", "Request body too large"),
+            )
+            return False
+
+        body = await reader.readexactly(length)
+        status, payload = await self.handle(method, target, body)
+        keep_alive = (
+            version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        )
+        self._respond(writer, status, payload, keep_alive)
+        await writer.drain()
+        return keep_alive
+
+    def _respond(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        payload: Payload,
+        keep_alive: bool = False,
+    ) -> None:
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode()
+        head = [
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+        ]
+        if not keep_alive:
+            head.append("Connection: close")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+
+    async def _health(self, params: Payload) -> Payload:
+        return {"status": "ok"}
+
+    async def _parse(self, params: Payload) -> Payload:
+        return {"media_info": self.parse_srv.parse_filename(_filename(params))}
+
+    async def _parse_batch(self, params: Payload) -> Payload:
+        results = []
+        for filename in _filenames(params):
+            try:
+                results.append({"media_info": self.parse_srv.parse_filename(filename)})
+            except Exception as error:
+                results.append(_error_of(error))
+        return {"results": results}
+
+    async def _format(self, params: Payload) -> Payload:
+        movie_id = params.get("movie_id")
+        if movie_id is not None and not isinstance(movie_id, str):
+            raise BadRequest("movie_id must be a string")
+        result = await self.get_movie_srv().aformat_filename(
+            _filename(params), movie_id=movie_id
+        )
+        return result._asdict()
+
+    async def _format_batch(self, params: Payload) -> Payload:
+        results = await self.get_movie_srv().format_filenames(
+            _filenames(params), concurrency=self.concurrency
+        )
+        return {
+            "results": [
+                result._asdict()
+                if isinstance(result, FormattedMediaInformation)
+                else _error_of(result)
+                for result in results
+            ]
+        }
+
+
+def _filename(params: Payload) -> str:
+    filename = params.get("filename")
+    if not isinstance(filename, str) or not filename:
+        raise BadRequest("A filename is required")
+    return filename
+
+
+def _filenames(params: Payload) -> list[str]:
+    filenames = params.get("filenames")
+    if not isinstance(filenames, list) or not all(
+        isinstance(f, str) for f in filenames
+    ):
+        raise BadRequest("A list of filenames is required")
+    return filenames
+
+
+def _error(type: str, message: str, **details: Any) -> Payload:
+    return {"error": {"type": type, "message": message, **details}}
+
+
+def _error_of(error: Exception) -> Payload:
+    if isinstance(error, ManyMoviesFoundError):
+        movies = [movie.model_dump(mode="json") for movie in error.movies]
+        return _error(type(error).__name__, str(error), movies=movies)
+    return _error(type(error).__name__, str(error))
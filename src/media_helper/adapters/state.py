@@ -0,0 +1,135 @@
+import sqlite3
+import time
+from collections.abc import Iterable
+from pathlib import Path
+
+from media_helper.core.library import FileKey
+from media_helper.core.model import Movie
+from media_helper.ports import ContentIndex
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    path TEXT NOT NULL,
+    processed_at REAL NOT NULL,
+    PRIMARY KEY (device, inode)
+);
+CREATE TABLE IF NOT EXISTS contents (
+    hash TEXT PRIMARY KEY,
+    movie TEXT NOT NULL,
+    resolved_at REAL NOT NULL
+);
+"""
+
+
+class SqliteStateIndex(ContentIndex):
+    """Remember which files have already been processed, whatever their name.
+
+    Files are identified by their :class:`FileKey` so a file is processed again
+    only once it has been modified. The movie files are about is also remembered by
+    the hash of their content (see :func:`content_hash`), so that a file is
+    recognized even once copied or moved to another device.
+    """
+
+    # Status of files renamed after their movie
+    RENAMED = "renamed"
+    # Status of files needing a human decision, which are not processed yet
+    REVIEW = "review"
+    # Status of files left untouched, e.g. because already tagged with their movie
+    SKIPPED = "skipped"
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._db: sqlite3.Connection | None = None
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            if str(self.path) != ":memory:":
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(_SCHEMA)
+        return self._db
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def processed(self, skipped: bool = True) -> set[FileKey]:
+        """Return the keys of all files processed so far, skipped ones included
+        unless ``skipped`` is false.
+
+        Checking many files against this set is much faster than querying the
+        index once per file.
+        """
+        excluded = (self.REVIEW, self.REVIEW if skipped else self.SKIPPED)
+        rows = self._connection.execute(
+            "SELECT device, inode, size, mtime_ns FROM files "
+            "WHERE status NOT IN (?, ?)",
+            excluded,
+        )
+        return {FileKey(*row) for row in rows}
+
+    def to_review(self) -> list[Path]:
+        """Return the files queued for review, in the order they have been queued."""
+        rows = self._connection.execute(
+            "SELECT path FROM files WHERE status = ? ORDER BY processed_at, path",
+            (self.REVIEW,),
+        )
+        return [Path(path) for (path,) in rows]
+
+    def record(self, files: Iterable[tuple[FileKey, Path]], status: str) -> None:
+        """Record given files as processed with given status."""
+        now = time.time()
+        with self._connection as db:
+            db.execute("BEGIN")
+            db.executemany(
+                "INSERT OR REPLACE INTO files "
+                "(device, inode, size, mtime_ns, status, path, processed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((*key, status, str(path), now) for key, path in files),
+            )
+
+    def forget(self, keys: Iterable[FileKey]) -> None:
+        """Forget given files, so that they are processed again."""
+        with self._connection as db:
+            db.execute("BEGIN")
+            db.executemany(
+                "DELETE FROM files WHERE device = ? AND inode = ?",
+                ((key.device, key.inode) for key in keys),
+            )
+
+    def movies(self, hashes: Iterable[str]) -> dict[str, Movie]:
+        """Return the movies of the files having given content hashes, if known."""
+        hashes = list(hashes)
+        movies: dict[str, Movie] = {}
+        # Stay below the maximum number of parameters of a query
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start : start + 500]
+            rows = self._connection.execute(
+                "SELECT hash, movie FROM contents "
+                f"WHERE hash IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            )
+            movies.update(
+                (hash, Movie.model_validate_json(movie)) for hash, movie in rows
+            )
+        return movies
+
+    def remember(self, movies: Iterable[tuple[str, Movie]]) -> None:
+        """Remember the movies of the files having given content hashes."""
+        now = time.time()
+        with self._connection as db:
+            db.execute("BEGIN")
+            db.executemany(
+                "INSERT OR REPLACE INTO contents (hash, movie, resolved_at) "
+                "VALUES (?, ?, ?)",
+                ((hash, movie.model_dump_json(), now) for hash, movie in movies),
+            )
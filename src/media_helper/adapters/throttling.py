@@ -0,0 +1,142 @@
+import asyncio
+import random
+import threading
+import time
+from collections.abc import Callable
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+
+class TokenBucket:
+    """Rate limiter allowing ``rate`` requests per second with bursts of ``capacity``.
+
+    A single bucket can be shared by threads as well as coroutines: acquiring a token
+    reserves it immediately and returns how long the caller has to wait before using
+    it, so waiting happens outside of the lock.
+
+    >>> bucket = TokenBucket(rate=10, capacity=2, clock=lambda: 0.0)
+    >>> [bucket.reserve() for _ in range(4)]
+    [0.0, 0.0, 0.1, 0.2]
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self._clock = clock
+        self._tokens = float(self.capacity)
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return how many seconds to wait before using it."""
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            # Tokens can go negative, meaning they have been reserved in advance
+            return max(0.0, -self._tokens / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Prevent any token from being handed out for the given duration.
+
+        >>> now = 0.0
+        >>> bucket = TokenBucket(rate=10, capacity=1, clock=lambda: now)
+        >>> now = 5.0
+        >>> bucket.pause(1.0)
+        >>> bucket.reserve()
+        1.1
+        """
+        with self._lock:
+            # Otherwise the time elapsed until now would be credited after the pause
+            self._refill()
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated_at) * self.rate
+        )
+        self._updated_at = now
+
+    def acquire(self) -> None:
+        if delay := self.reserve():
+            time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        if delay := self.reserve():
+            await asyncio.sleep(delay)
+
+
+class RetryPolicy:
+    """Decide whether and when a failed idempotent request must be retried.
+
+    Throttled (429) and transient server errors are retried, as well as transport
+    errors. The ``Retry-After`` header is honored when present, up to
+    ``max_backoff``, otherwise retries are delayed by an exponential backoff with
+    full jitter.
+    """
+
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(
+        self, max_retries: int = 5, backoff: float = 0.5, max_backoff: float = 30.0
+    ) -> None:
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def should_retry(self, response: httpx.Response) -> bool:
+        return response.status_code in self.RETRY_STATUSES
+
+    def delay(self, attempt: int, response: httpx.Response | None = None) -> float:
+        """Return how many seconds to wait before given (zero based) retry attempt."""
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                # Not stalling for as long as a server may ask, e.g. an hour
+                return min(retry_after, self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parse a ``Retry-After`` header value into a number of seconds.
+
+    >>> parse_retry_after("3")
+    3.0
+    >>> parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT")
+    0.0
+    >>> parse_retry_after("soon") is None
+    True
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RequestStats:
+    """Counters of the requests sent by an adapter."""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.throttled = 0
+        self.retried = 0
+
+    def __repr__(self) -> str:
+        return (
+            f"RequestStats(requests={self.requests}, throttled={self.throttled}, "
+            f"retried={self.retried})"
+        )
@@ -1,15 +1,34 @@
+import asyncio
+import itertools
 import logging
-from datetime import date
-from typing import Annotated, Generic, TypeVar
+import time
+from datetime import date, timedelta
+from typing import Annotated, Any, Generic, TypeVar
+from urllib.parse import quote
 
 import httpx
-from pydantic import BaseModel, BeforeValidator
+from pydantic import BaseModel, BeforeValidator, TypeAdapter
 
-from media_helper.core.model import Movie
-from media_helper.ports import MovieDatabase
+from media_helper import profiling
+from media_helper.core.model import Episode, Movie, Season, Show
+from media_helper.ports import AsyncMovieDatabase, AsyncTvDatabase, MovieDatabase
+
+from .cache import SqliteMovieCache
+from .throttling import RequestStats, RetryPolicy, TokenBucket
 
 T = TypeVar("T")
 
+_SHOWS = TypeAdapter(list[Show])
+_SEASONS = TypeAdapter(list[Season])
+_IDS = TypeAdapter(list[str])
+
+# The TMDB id of a movie found by its id in another database never changes, so the
+# mapping is kept far longer than the movie itself
+_IDS_TTL = timedelta(days=365)
+
+# NOTE: some movies and shows can have an empty str as date
+OptionalDate = Annotated[date | None, BeforeValidator(lambda v: v or None)]
+
 
 class TmdbList(BaseModel, Generic[T]):
     page: int
@@ -27,15 +46,46 @@ class TmdbMovie(BaseModel):
     overview: str
     popularity: float
     poster_path: str | None = None
-    # NOTE: some movies can have an empty str has release_date
-    release_date: Annotated[date | None, BeforeValidator(lambda v: v or None)] = None
+    release_date: OptionalDate = None
     title: str
     video: bool
     vote_average: float
     vote_count: int
 
 
-class TmdbMovieDatabase(MovieDatabase):
+class TmdbFindResults(BaseModel):
+    movie_results: list[TmdbMovie]
+
+
+class TmdbShow(BaseModel):
+    id: int
+    name: str
+    original_name: str
+    first_air_date: OptionalDate = None
+    popularity: float
+    vote_average: float
+    vote_count: int
+
+
+class TmdbEpisode(BaseModel):
+    episode_number: int
+    name: str
+
+
+class TmdbSeason(BaseModel):
+    season_number: int
+    episodes: list[TmdbEpisode]
+
+
+class _BaseTmdbMovieDatabase:
+    """Logic shared by the blocking and the asynchronous TMDB adapters.
+
+    Subclasses only have to perform the HTTP requests, everything else (caching,
+    parsing responses, ...) is done here. Requests are rate limited by a token bucket
+    that can be shared with other adapters, and failed requests are retried according
+    to given retry policy.
+    """
+
     SOURCE = "tmdb"
 
     def __init__(
@@ -44,9 +94,17 @@ class TmdbMovieDatabase(MovieDatabase):
         api_base_url: str = "https://api.themoviedb.org",
         web_base_url: str = "https://www.themoviedb.org",
         lang: str = "fr-FR",
+        cache: SqliteMovieCache | None = None,
+        rate_limiter: TokenBucket | None = None,
+        retry_policy: RetryPolicy | None = None,
     ) -> None:
         self.lang = lang
-        self._http = httpx.Client(
+        self.cache = cache
+        # NOTE: TMDB allows around 50 requests per second
+        self.rate_limiter = rate_limiter or TokenBucket(rate=40)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.stats = RequestStats()
+        self._http_options: dict[str, Any] = dict(
             base_url=api_base_url,
             headers={
                 "Authorization": "Bearer " + access_token,
@@ -58,37 +116,195 @@ class TmdbMovieDatabase(MovieDatabase):
         self._cache_by_id: dict[str, Movie] = {}
         self._logger = logging.getLogger(__name__)
 
-    def close(self) -> None:
-        self._http.close()
+    def _retry_delay(
+        self, attempt: int, result: httpx.Response | httpx.TransportError
+    ) -> float | None:
+        """Return how long to wait before retrying a request or ``None`` to give up."""
+        self.stats.requests += 1
+        profiling.count("tmdb.requests")
+        if isinstance(result, httpx.Response):
+            if not self.retry_policy.should_retry(result):
+                return None
+            if result.status_code == 429:
+                self.stats.throttled += 1
+        if attempt >= self.retry_policy.max_retries:
+            return None
 
-    def search(self, query: str, release_year: int | None = None) -> list[Movie]:
-        raw = self._http.get(
-            "/3/search/movie",
-            params={
-                "query": query,
-                "year": release_year,
-                "page": 1,
-            },
+        response = result if isinstance(result, httpx.Response) else None
+        delay = self.retry_policy.delay(attempt, response)
+        if response is not None and response.status_code == 429:
+            # Being throttled concerns every request, not only this one
+            self.rate_limiter.pause(delay)
+        self.stats.retried += 1
+        self._logger.info("Retrying TMDB request in %.2fs (%s)", delay, result)
+        return delay
+
+    def _search_key(self, query: str, release_year: int | None) -> str:
+        return self._cache_key(
+            "search", release_year or "", " ".join(query.casefold().split())
         )
-        raw.raise_for_status()
-        resp = TmdbList[TmdbMovie].model_validate_json(raw.content)
-        movies = [self._parse_movie(movie) for movie in resp.results]
-        return [m for m in movies if m is not None]
 
-    def get(self, movie_id: str) -> Movie | None:
-        if movie_id in self._cache_by_id:
-            return self._cache_by_id[movie_id]
+    def _search_params(self, query: str, release_year: int | None) -> dict[str, Any]:
+        return {"query": query, "year": release_year, "page": 1}
+
+    def _parse_search_response(
+        self, raw: httpx.Response, cache_key: str
+    ) -> list[Movie]:
+        raw.raise_for_status()
+        with profiling.span("tmdb.validate"):
+            resp = TmdbList[TmdbMovie].model_validate_json(raw.content)
+            movies = [self._parse_movie(movie) for movie in resp.results]
+        found = [m for m in movies if m is not None]
+        self._cache_set(cache_key, found)
+        return found
 
-        raw = self._http.get(f"/3/movie/{movie_id}")
+    def _parse_get_response(self, raw: httpx.Response, cache_key: str) -> Movie | None:
         if raw.status_code == 404:
+            self._cache_set(cache_key, [])
             return None
         raw.raise_for_status()
-        movie = TmdbMovie.model_validate(raw.json())
-        return self._parse_movie(movie)
+        with profiling.span("tmdb.validate"):
+            movie = self._parse_movie(TmdbMovie.model_validate(raw.json()))
+        self._cache_set(cache_key, [movie] if movie else [])
+        return movie
+
+    def _cache_key(self, kind: str, *parts: object) -> str:
+        return ":".join([self.SOURCE, kind, self.lang, *map(str, parts)])
+
+    def _cache_get(self, key: str) -> list[Movie] | None:
+        if self.cache is None:
+            return None
+        movies = self.cache.get(key)
+        if movies is not None:
+            profiling.count("tmdb.cache.hit")
+            self._cache_by_id.update((m.id, m) for m in movies)
+        else:
+            profiling.count("tmdb.cache.miss")
+        return movies
+
+    def _cache_set(self, key: str, movies: list[Movie]) -> None:
+        if self.cache is not None:
+            self.cache.set(key, movies)
+
+    def _tv_cache_key(self, kind: str, *parts: object) -> str:
+        # Kept apart from the keys of movies, which are all expected to hold movies
+        return ":".join([f"{self.SOURCE}-tv", kind, self.lang, *map(str, parts)])
+
+    def _json_cache_get(
+        self, key: str, adapter: TypeAdapter[list[T]]
+    ) -> list[T] | None:
+        value = None if self.cache is None else self.cache.get_json(key)
+        if value is None:
+            profiling.count("tmdb.cache.miss")
+            return None
+        profiling.count("tmdb.cache.hit")
+        return adapter.validate_json(value)
+
+    def _json_cache_set(
+        self,
+        key: str,
+        adapter: TypeAdapter[list[T]],
+        values: list[T],
+        ttl: timedelta | None = None,
+    ) -> None:
+        if self.cache is not None:
+            if ttl is None:
+                ttl = self.cache.ttl if values else self.cache.negative_ttl
+            self.cache.set_json(key, adapter.dump_json(values), ttl)
+
+    def _find_key(self, source: str, external_id: str) -> str:
+        # Ids do not depend on the language, and are kept apart from movies
+        return ":".join([f"{self.SOURCE}-ids", source, external_id])
+
+    def _find_request(
+        self, source: str, external_id: str
+    ) -> tuple[str, dict[str, Any]]:
+        url = f"/3/find/{quote(external_id, safe='')}"
+        return url, {"external_source": f"{source}_id"}
+
+    def _parse_find_response(self, raw: httpx.Response, cache_key: str) -> Movie | None:
+        movie = None
+        if raw.status_code != 404:
+            raw.raise_for_status()
+            with profiling.span("tmdb.validate"):
+                resp = TmdbFindResults.model_validate_json(raw.content)
+                movies = [self._parse_movie(m) for m in resp.movie_results]
+            movie = next((m for m in movies if m is not None), None)
+        if movie is None:
+            self._json_cache_set(cache_key, _IDS, [])
+            return None
+        # Cached as if fetched by id, for the mapping to resolve it next time
+        self._cache_set(self._cache_key("movie", movie.id), [movie])
+        self._json_cache_set(cache_key, _IDS, [movie.id], _IDS_TTL)
+        return movie
+
+    def _search_shows_key(self, query: str, first_air_year: int | None) -> str:
+        return self._tv_cache_key(
+            "search", first_air_year or "", " ".join(query.casefold().split())
+        )
+
+    def _parse_search_shows_response(
+        self, raw: httpx.Response, cache_key: str
+    ) -> list[Show]:
+        raw.raise_for_status()
+        with profiling.span("tmdb.validate"):
+            resp = TmdbList[TmdbShow].model_validate_json(raw.content)
+            shows = [self._parse_show(show) for show in resp.results]
+        found = [s for s in shows if s is not None]
+        self._json_cache_set(cache_key, _SHOWS, found)
+        return found
+
+    def _parse_get_show_response(
+        self, raw: httpx.Response, cache_key: str
+    ) -> Show | None:
+        show = None
+        if raw.status_code != 404:
+            raw.raise_for_status()
+            with profiling.span("tmdb.validate"):
+                show = self._parse_show(TmdbShow.model_validate_json(raw.content))
+        self._json_cache_set(cache_key, _SHOWS, [show] if show else [])
+        return show
+
+    def _parse_season_response(
+        self, raw: httpx.Response, cache_key: str, show_id: str
+    ) -> Season | None:
+        season = None
+        if raw.status_code != 404:
+            raw.raise_for_status()
+            with profiling.span("tmdb.validate"):
+                resp = TmdbSeason.model_validate_json(raw.content)
+            season = Season(
+                show_id=show_id,
+                season_number=resp.season_number,
+                episodes=[
+                    Episode(episode_number=e.episode_number, name=e.name)
+                    for e in resp.episodes
+                ],
+            )
+        self._json_cache_set(cache_key, _SEASONS, [season] if season else [])
+        return season
+
+    def _parse_show(self, tmdb_show: TmdbShow) -> Show | None:
+        if not tmdb_show.first_air_date:
+            self._logger.warning(
+                "Skipped show %s because it has no first air date", tmdb_show.id
+            )
+            return None
+        return Show(
+            id=str(tmdb_show.id),
+            title=tmdb_show.name,
+            original_title=tmdb_show.original_name,
+            release_year=tmdb_show.first_air_date.year,
+            source_name=self.SOURCE,
+            link=f"{self.web_base_url}/tv/{tmdb_show.id}?language={self.lang}",
+            popularity=tmdb_show.popularity,
+            vote_average=tmdb_show.vote_average,
+            vote_count=tmdb_show.vote_count,
+        )
 
     def _parse_movie(self, tmdb_movie: TmdbMovie) -> Movie | None:
         if not tmdb_movie.release_date:
-            self._logger.warn(
+            self._logger.warning(
                 "Skipped movie %s because it has no release date", tmdb_movie.id
             )
             return None
@@ -108,3 +324,219 @@ class TmdbMovieDatabase(MovieDatabase):
         self._cache_by_id[movie.id] = movie
 
         return movie
+
+
+class TmdbMovieDatabase(_BaseTmdbMovieDatabase, MovieDatabase):
+    def __init__(
+        self,
+        access_token: str,
+        api_base_url: str = "https://api.themoviedb.org",
+        web_base_url: str = "https://www.themoviedb.org",
+        lang: str = "fr-FR",
+        cache: SqliteMovieCache | None = None,
+        rate_limiter: TokenBucket | None = None,
+        retry_policy: RetryPolicy | None = None,
+    ) -> None:
+        super().__init__(
+            access_token,
+            api_base_url,
+            web_base_url,
+            lang,
+            cache,
+            rate_limiter,
+            retry_policy,
+        )
+        self._http = httpx.Client(**self._http_options)
+
+    def close(self) -> None:
+        self._http.close()
+
+    def _get(self, url: str, params: dict[str, Any] | None = None) -> httpx.Response:
+        for attempt in itertools.count():
+            self.rate_limiter.acquire()
+            try:
+                with profiling.span("tmdb.request"):
+                    raw = self._http.get(url, params=params)
+            except httpx.TransportError as error:
+                if (delay := self._retry_delay(attempt, error)) is None:
+                    raise
+            else:
+                if (delay := self._retry_delay(attempt, raw)) is None:
+                    return raw
+            time.sleep(delay)
+        raise AssertionError("unreachable")
+
+    def search(self, query: str, release_year: int | None = None) -> list[Movie]:
+        with profiling.span("tmdb.search"):
+            cache_key = self._search_key(query, release_year)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
+
+            raw = self._get(
+                "/3/search/movie", params=self._search_params(query, release_year)
+            )
+            return self._parse_search_response(raw, cache_key)
+
+    def get(self, movie_id: str) -> Movie | None:
+        if movie_id in self._cache_by_id:
+            return self._cache_by_id[movie_id]
+
+        with profiling.span("tmdb.get"):
+            cache_key = self._cache_key("movie", movie_id)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached[0] if cached else None
+
+            raw = self._get(f"/3/movie/{movie_id}")
+            return self._parse_get_response(raw, cache_key)
+
+    def find(self, source: str, external_id: str) -> Movie | None:
+        """Return the movie having given id in another database, e.g. imdb.
+
+        The TMDB id of the movie is remembered, so that the movie is fetched by id
+        next time, if not cached already.
+        """
+        with profiling.span("tmdb.find"):
+            cache_key = self._find_key(source, external_id)
+            cached = self._json_cache_get(cache_key, _IDS)
+            if cached is not None:
+                return self.get(cached[0]) if cached else None
+
+            url, params = self._find_request(source, external_id)
+            return self._parse_find_response(self._get(url, params), cache_key)
+
+
+class AsyncTmdbMovieDatabase(
+    _BaseTmdbMovieDatabase, AsyncMovieDatabase, AsyncTvDatabase
+):
+    """Same as :class:`TmdbMovieDatabase` but performing requests asynchronously.
+
+    Concurrent requests share a single pool of at most ``max_connections``. TV shows
+    can be looked up as well, a whole season of episodes at once.
+    """
+
+    def __init__(
+        self,
+        access_token: str,
+        api_base_url: str = "https://api.themoviedb.org",
+        web_base_url: str = "https://www.themoviedb.org",
+        lang: str = "fr-FR",
+        cache: SqliteMovieCache | None = None,
+        rate_limiter: TokenBucket | None = None,
+        retry_policy: RetryPolicy | None = None,
+        max_connections: int = 8,
+    ) -> None:
+        super().__init__(
+            access_token,
+            api_base_url,
+            web_base_url,
+            lang,
+            cache,
+            rate_limiter,
+            retry_policy,
+        )
+        self._http_options["limits"] = httpx.Limits(max_connections=max_connections)
+        self._client: httpx.AsyncClient | None = None
+        self._client_loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def _http(self) -> httpx.AsyncClient:
+        # An async client is bound to the event loop it was first used in, so a new
+        # one is created lazily for every event loop the adapter is used from
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(**self._http_options)
+            self._client_loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _get(
+        self, url: str, params: dict[str, Any] | None = None
+    ) -> httpx.Response:
+        for attempt in itertools.count():
+            await self.rate_limiter.acquire_async()
+            try:
+                with profiling.span("tmdb.request"):
+                    raw = await self._http.get(url, params=params)
+            except httpx.TransportError as error:
+                if (delay := self._retry_delay(attempt, error)) is None:
+                    raise
+            else:
+                if (delay := self._retry_delay(attempt, raw)) is None:
+                    return raw
+            await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
+
+    async def search(self, query: str, release_year: int | None = None) -> list[Movie]:
+        with profiling.span("tmdb.search"):
+            cache_key = self._search_key(query, release_year)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
+
+            raw = await self._get(
+                "/3/search/movie", params=self._search_params(query, release_year)
+            )
+            return self._parse_search_response(raw, cache_key)
+
+    async def get(self, movie_id: str) -> Movie | None:
+        if movie_id in self._cache_by_id:
+            return self._cache_by_id[movie_id]
+
+        with profiling.span("tmdb.get"):
+            cache_key = self._cache_key("movie", movie_id)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached[0] if cached else None
+
+            raw = await self._get(f"/3/movie/{movie_id}")
+            return self._parse_get_response(raw, cache_key)
+
+    async def find(self, source: str, external_id: str) -> Movie | None:
+        with profiling.span("tmdb.find"):
+            cache_key = self._find_key(source, external_id)
+            cached = self._json_cache_get(cache_key, _IDS)
+            if cached is not None:
+                return await self.get(cached[0]) if cached else None
+
+            url, params = self._find_request(source, external_id)
+            raw = await self._get(url, params)
+            return self._parse_find_response(raw, cache_key)
+
+    async def search_shows(
+        self, query: str, first_air_year: int | None = None
+    ) -> list[Show]:
+        with profiling.span("tmdb.tv.search"):
+            cache_key = self._search_shows_key(query, first_air_year)
+            cached = self._json_cache_get(cache_key, _SHOWS)
+            if cached is not None:
+                return cached
+
+            params = {"query": query, "first_air_date_year": first_air_year, "page": 1}
+            raw = await self._get("/3/search/tv", params=params)
+            return self._parse_search_shows_response(raw, cache_key)
+
+    async def get_show(self, show_id: str) -> Show | None:
+        with profiling.span("tmdb.tv.get"):
+            cache_key = self._tv_cache_key("show", show_id)
+            cached = self._json_cache_get(cache_key, _SHOWS)
+            if cached is not None:
+                return cached[0] if cached else None
+
+            raw = await self._get(f"/3/tv/{show_id}")
+            return self._parse_get_show_response(raw, cache_key)
+
+    async def get_season(self, show_id: str, season_number: int) -> Season | None:
+        with profiling.span("tmdb.tv.season"):
+            cache_key = self._tv_cache_key("season", show_id, season_number)
+            cached = self._json_cache_get(cache_key, _SEASONS)
+            if cached is not None:
+                return cached[0] if cached else None
+
+            raw = await self._get(f"/3/tv/{show_id}/season/{season_number}")
+            return self._parse_season_response(raw, cache_key, show_id)
@@ -1,27 +1,209 @@
+"""Build the application services.
+
+Everything is built lazily and modules are imported only once actually needed, so
+that commands only pay for what they use. In particular, nothing requires the TMDB
+access token until the movie database is needed.
+"""
+
+from __future__ import annotations
+
 from functools import lru_cache
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .adapters.cache import SqliteMovieCache
+    from .adapters.library import SqliteLibraryIndex
+    from .adapters.local import LocalMovieDatabase
+    from .adapters.rich import RichUserInterface
+    from .adapters.state import SqliteStateIndex
+    from .adapters.throttling import RetryPolicy, TokenBucket
+    from .adapters.tmdb import AsyncTmdbMovieDatabase
+    from .config import Settings
+    from .core.formatter import PlexMediaFileNameFormatter
+    from .ports import AsyncMovieDatabase, AsyncTvDatabase, MovieDatabase
+    from .services.movie import MovieService
+    from .services.tv import TvService
+
+_settings_overrides: dict[str, Any] = {}
 
-from .adapters.rich import RichUserInterface
-from .adapters.tmdb import TmdbMovieDatabase
-from .config import Settings
-from .ports import MovieDatabase
-from .services.movie import MovieService
+
+def override_settings(**overrides: Any) -> None:
+    """Override settings values, e.g. from command line options."""
+    _settings_overrides.update(overrides)
+    get_settings.cache_clear()
 
 
 @lru_cache
 def get_settings() -> Settings:
-    return Settings()
+    from .config import Settings
+
+    return Settings(**_settings_overrides)
+
+
+@lru_cache
+def get_movie_cache() -> SqliteMovieCache:
+    from .adapters.cache import SqliteMovieCache
+
+    settings = get_settings()
+    return SqliteMovieCache(
+        settings.cache_dir / "movies.sqlite3",
+        ttl=settings.cache_ttl,
+        negative_ttl=settings.cache_negative_ttl,
+        max_entries=settings.cache_max_entries,
+        enabled=settings.cache_enabled,
+        refresh=settings.cache_refresh,
+    )
+
+
+@lru_cache
+def get_tmdb_rate_limiter() -> TokenBucket:
+    from .adapters.throttling import TokenBucket
+
+    return TokenBucket(rate=get_settings().tmdb_rate_limit)
+
+
+def get_tmdb_retry_policy() -> RetryPolicy:
+    from .adapters.throttling import RetryPolicy
+
+    return RetryPolicy(max_retries=get_settings().tmdb_max_retries)
+
+
+@lru_cache
+def get_local_movie_db() -> LocalMovieDatabase:
+    from .adapters.local import LocalMovieDatabase
+
+    settings = get_settings()
+    # Movies are learned again as often as lookups are cached
+    return LocalMovieDatabase(
+        settings.data_dir / "movies.sqlite3", max_age=settings.cache_ttl
+    )
 
 
 @lru_cache
 def get_movie_db() -> MovieDatabase:
-    return TmdbMovieDatabase(
-        access_token=get_settings().tmdb_access_token.get_secret_value()
+    from .adapters.local import FallbackMovieDatabase
+    from .adapters.tmdb import TmdbMovieDatabase
+
+    settings = get_settings()
+    tmdb = TmdbMovieDatabase(
+        access_token=_tmdb_access_token(),
+        cache=get_movie_cache(),
+        rate_limiter=get_tmdb_rate_limiter(),
+        retry_policy=get_tmdb_retry_policy(),
     )
+    if not settings.local_db_enabled:
+        return tmdb
+    return FallbackMovieDatabase(get_local_movie_db(), tmdb, **_fallback_options())
+
+
+@lru_cache
+def get_async_tmdb() -> AsyncTmdbMovieDatabase:
+    from .adapters.tmdb import AsyncTmdbMovieDatabase
+
+    settings = get_settings()
+    return AsyncTmdbMovieDatabase(
+        access_token=_tmdb_access_token(),
+        cache=get_movie_cache(),
+        rate_limiter=get_tmdb_rate_limiter(),
+        retry_policy=get_tmdb_retry_policy(),
+        max_connections=settings.tmdb_concurrency,
+    )
+
+
+@lru_cache
+def get_async_movie_db() -> AsyncMovieDatabase:
+    from .adapters.local import AsyncFallbackMovieDatabase
 
+    tmdb = get_async_tmdb()
+    if not get_settings().local_db_enabled:
+        return tmdb
+    return AsyncFallbackMovieDatabase(get_local_movie_db(), tmdb, **_fallback_options())
 
-def get_movie_service() -> MovieService:
-    return MovieService(get_movie_db())
 
+def _tmdb_access_token() -> str:
+    token = get_settings().tmdb_access_token
+    if token is None:
+        raise RuntimeError(
+            "TMDB_ACCESS_TOKEN must be set, in the environment or a .env file"
+        )
+    return token.get_secret_value()
 
+
+def _fallback_options() -> dict[str, Any]:
+    settings = get_settings()
+    return dict(
+        confidence_margin=settings.match_confidence_margin,
+        enabled=settings.cache_enabled,
+        refresh=settings.cache_refresh,
+    )
+
+
+def get_async_tv_db() -> AsyncTvDatabase:
+    return get_async_tmdb()
+
+
+@lru_cache
+def get_state_index() -> SqliteStateIndex:
+    from .adapters.state import SqliteStateIndex
+
+    return SqliteStateIndex(get_settings().state_dir / "files.sqlite3")
+
+
+@lru_cache
+def get_library_index() -> SqliteLibraryIndex:
+    from .adapters.library import SqliteLibraryIndex
+
+    return SqliteLibraryIndex(get_settings().state_dir / "library.sqlite3")
+
+
+@lru_cache
+def get_formatter() -> PlexMediaFileNameFormatter:
+    from .core.formatter import PlexMediaFileNameFormatter
+
+    settings = get_settings()
+    return PlexMediaFileNameFormatter(
+        movie_filename=settings.movie_filename_template,
+        movie_dirname=settings.movie_dirname_template,
+        episode_filename=settings.episode_filename_template,
+        season_dirname=settings.season_dirname_template,
+    )
+
+
+@lru_cache
+def get_movie_service(parse_only: bool = False) -> MovieService:
+    """Return the movie service.
+
+    A ``parse_only`` service has no movie database so it can only parse file names,
+    but it does not require any settings.
+    """
+    from .services.movie import MovieService
+
+    if parse_only:
+        return MovieService()
+    settings = get_settings()
+    return MovieService(
+        get_movie_db(),
+        get_async_movie_db(),
+        confidence_margin=settings.match_confidence_margin,
+        content_index=get_state_index() if settings.cache_enabled else None,
+        formatter=get_formatter(),
+        trust_sources=settings.trust_sources,
+    )
+
+
+@lru_cache
+def get_tv_service() -> TvService:
+    from .services.tv import TvService
+
+    return TvService(
+        get_async_tv_db(),
+        confidence_margin=get_settings().match_confidence_margin,
+        formatter=get_formatter(),
+    )
+
+
+@lru_cache
 def get_ui() -> RichUserInterface:
-    return RichUserInterface(get_movie_service())
+    from .adapters.rich import RichUserInterface
+
+    return RichUserInterface()
@@ -1,34 +1,232 @@
-from enum import Enum
+from __future__ import annotations
+
+import json
+import os
+import sys
+from collections.abc import Callable, Iterator
 from pathlib import Path
-from typing import Annotated, Union
+from typing import TYPE_CHECKING, Annotated, Any, TypeVar
 
 import typer
 
-from .bootstrap import get_movie_service, get_ui
-from .ports import ManyMoviesFoundError, MovieNotFoundError
+# Only light modules are imported here so that the CLI starts quickly, the heavy
+# ones (parsing, TMDB, rich, ...) being imported by the commands needing them
+from .bootstrap import (
+    get_library_index,
+    get_local_movie_db,
+    get_movie_cache,
+    get_movie_service,
+    get_settings,
+    get_state_index,
+    get_tv_service,
+    get_ui,
+    override_settings,
+)
+from .core.library import FileKey, LibraryEntry
+from .services.library import scan_videos
+from .services.rename import (
+    RenameOperation,
+    RenameResult,
+    RenameStrategy,
+    apply_renames,
+)
+
+if TYPE_CHECKING:
+    from .adapters.inotify import InotifyWatcher
+    from .adapters.journal import RunJournal
+    from .services.movie import FormattedMediaInformation, MovieKey, PlannedRename
+    from .services.watch import PendingFiles
 
-movie_srv = get_movie_service()
-ui = get_ui()
+T = TypeVar("T")
 app = typer.Typer()
 movies_app = typer.Typer(help="Movies related commands")
+db_app = typer.Typer(help="Local movie database related commands")
+tv_app = typer.Typer(help="TV shows related commands")
 
 app.add_typer(movies_app, name="movie")
+movies_app.add_typer(db_app, name="db")
+app.add_typer(tv_app, name="tv")
+
+StrategyOption = Annotated[
+    RenameStrategy,
+    typer.Option(
+        "-s", "--strategy", help="Define how the file will actually be renamed"
+    ),
+]
+OutputDirOption = Annotated[
+    Path | None,
+    typer.Option(
+        "-o",
+        "--output-dir",
+        dir_okay=True,
+        help="Directory where the renamed file will be put. Defaults to its parent folder",
+    ),
+]
+
+
+@movies_app.callback()
+def movies(
+    ctx: typer.Context,
+    no_cache: Annotated[
+        bool,
+        typer.Option(
+            "--no-cache", help="Neither read nor write cached movie database results"
+        ),
+    ] = False,
+    refresh: Annotated[
+        bool,
+        typer.Option(
+            "--refresh",
+            help="Ignore cached movie database results and cache fresh ones instead",
+        ),
+    ] = False,
+    no_local_db: Annotated[
+        bool,
+        typer.Option(
+            "--no-local-db",
+            help="Only search movies in TMDB, not in the local movie database",
+        ),
+    ] = False,
+    profile: Annotated[
+        bool,
+        typer.Option(
+            "--profile",
+            help="Print how long every stage of the command took once it is done",
+        ),
+    ] = False,
+    profile_json: Annotated[
+        Path | None,
+        typer.Option(
+            "--profile-json",
+            dir_okay=False,
+            help="Write the profiling summary as JSON to given file",
+        ),
+    ] = None,
+    cprofile: Annotated[
+        Path | None,
+        typer.Option(
+            "--cprofile",
+            dir_okay=False,
+            help="Dump cProfile statistics to given file, see python -m pstats",
+        ),
+    ] = None,
+    trace_memory: Annotated[
+        bool,
+        typer.Option(
+            "--tracemalloc", help="Report the lines having allocated the most memory"
+        ),
+    ] = False,
+) -> None:
+    # Flags not given leave the settings of the environment (or .env file) alone
+    overrides = {
+        "cache_enabled": False if no_cache else None,
+        "cache_refresh": True if refresh else None,
+        "local_db_enabled": False if no_local_db else None,
+    }
+    override_settings(
+        **{name: value for name, value in overrides.items() if value is not None}
+    )
+    if profile or profile_json or cprofile or trace_memory:
+        _start_profiling(ctx, profile_json, cprofile, trace_memory)
+
+
+def _start_profiling(
+    ctx: typer.Context,
+    profile_json: Path | None,
+    cprofile: Path | None,
+    trace_memory: bool,
+) -> None:
+    """Profile the command, reporting once it is done (even when failing)."""
+    from . import profiling
+
+    profiler = profiling.enable()
+    if cprofile:
+        import cProfile
 
+        cprofiler = cProfile.Profile()
+        cprofiler.enable()
+    if trace_memory:
+        import tracemalloc
 
-class RenameStrategy(str, Enum):
-    HARDLINK = "hardlink"
-    MOVE = "move"
-    NOOP = "noop"
+        tracemalloc.start()
+
+    def report() -> None:
+        summary = profiler.summary()
+        if cprofile:
+            cprofiler.disable()
+            cprofiler.dump_stats(cprofile)
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            summary["memory"] = {
+                "peak": peak,
+                "top": [
+                    {"location": str(stat.traceback), "size": stat.size}
+                    for stat in snapshot.statistics("lineno")[:10]
+                ],
+            }
+        profiling.disable()
+        get_ui().print_profile(summary)
+        if profile_json:
+            profile_json.write_text(json.dumps(summary, indent=2) + "\n")
+
+    ctx.call_on_close(report)
 
 
 @movies_app.command()
 def parse(
-    filename: Annotated[str, typer.Argument(help="File name to parse")],
+    filenames: Annotated[
+        list[str],
+        typer.Argument(
+            help="File name(s) to parse. Directories are walked for files to parse "
+            "and - reads file names from stdin, one per line"
+        ),
+    ],
+    jsonl: Annotated[
+        bool,
+        typer.Option(
+            "--jsonl",
+            help="Output one JSON object per line. Always the case with many files",
+        ),
+    ] = False,
+    workers: Annotated[
+        int | None,
+        typer.Option(
+            "-j",
+            "--workers",
+            min=1,
+            help="Number of processes parsing files. Defaults to the number of CPUs",
+        ),
+    ] = None,
 ) -> None:
-    """Extract and display media information from given file name."""
-    srv = get_movie_service()
-    media_info = srv.parse_filename(filename)
-    ui.print_media_information(media_info)
+    """Extract and display media information from given file name(s)."""
+    srv = get_movie_service(parse_only=True)
+    if len(filenames) == 1 and not jsonl and not _is_walkable(filenames[0]):
+        get_ui().print_media_information(srv.parse_filename(filenames[0]))
+        return
+
+    for result in srv.parse_files(_iter_filenames(filenames), workers=workers):
+        if result.error is not None:
+            line = {"filename": result.path, "error": result.error}
+        else:
+            line = {"filename": result.path, **(result.media_info or {})}
+        sys.stdout.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+
+def _is_walkable(filename: str) -> bool:
+    return filename == "-" or Path(filename).is_dir()
+
+
+def _iter_filenames(filenames: list[str]) -> Iterator[str]:
+    for filename in filenames:
+        if filename == "-":
+            yield from (line.rstrip("\n") for line in sys.stdin if line.strip())
+        elif Path(filename).is_dir():
+            for dirpath, _, names in os.walk(filename):
+                yield from (os.path.join(dirpath, name) for name in names)
+        else:
+            yield filename
 
 
 @movies_app.command()
@@ -36,6 +234,10 @@ def format(
     filepath: Annotated[Path, typer.Argument(help="File name to format")],
 ) -> None:
     """Suggest a clean name for the movie file having given name."""
+    from .ports import ManyMoviesFoundError, MovieNotFoundError
+
+    movie_srv = get_movie_service()
+    ui = get_ui()
     filename = filepath.name
     try:
         fmedia_info = movie_srv.format_filename(filename)
@@ -58,31 +260,71 @@ def rename(
     filepaths: Annotated[
         list[Path],
         typer.Argument(
-            exists=False,
             file_okay=True,
-            dir_okay=False,
+            dir_okay=True,
             resolve_path=True,
-            help="Path(s) to the movie(s) file(s) to rename",
+            help="Path(s) to the movie(s) file(s) to rename, or directories to scan "
+            "for movies",
         ),
     ],
-    strategy: Annotated[
-        RenameStrategy,
+    strategy: StrategyOption = RenameStrategy.MOVE,
+    output_dir: OutputDirOption = None,
+    concurrency: Annotated[
+        int | None,
         typer.Option(
-            "-s", "--strategy", help="Define how the file will actually be renamed"
+            "-j",
+            "--concurrency",
+            min=1,
+            help="Maximum number of movies searched concurrently, or ahead of the "
+            "prompts when interactive",
         ),
-    ] = RenameStrategy.MOVE,
-    output_dir: Annotated[
-        Union[Path | None],
+    ] = None,
+    batch: Annotated[
+        bool,
         typer.Option(
-            "-o",
-            "--output-dir",
-            dir_okay=True,
-            help="Directory where the renamed file will be put. Defaults to its parent folder",
+            "-b",
+            "--batch",
+            help="Resolve all files without prompting then review all renames at once",
         ),
-    ] = None,
-    # TODO: add flag to force parsing files already tagged with a source (imdb/tmdb)
-    # TODO: add a flag to trust and use the source in file names for searching movie info
-    # TODO: add a tag for answering YES to all confirmations automatically
+    ] = False,
+    yes: Annotated[
+        bool,
+        typer.Option(
+            "-y",
+            "--yes",
+            help="Apply all resolved renames without any confirmation. Implies --batch",
+        ),
+    ] = False,
+    min_size: Annotated[
+        int,
+        typer.Option(
+            "--min-size",
+            min=0,
+            help="Ignore video files found in directories smaller than this (in MiB)",
+        ),
+    ] = 0,
+    all_files: Annotated[
+        bool,
+        typer.Option(
+            "--all",
+            help="Also process files already processed (or skipped) by previous runs",
+        ),
+    ] = False,
+    resume: Annotated[
+        bool,
+        typer.Option(
+            "--resume",
+            help="Resume the latest run, reusing how its files have been resolved",
+        ),
+    ] = False,
+    trust_source: Annotated[
+        bool,
+        typer.Option(
+            "--trust-source",
+            help="Resolve files tagged with the tmdb or imdb id of their movie by "
+            "that id, without searching nor prompting",
+        ),
+    ] = False,
 ) -> None:
     """Rename a movie file in a standard way.
 
@@ -108,51 +350,848 @@ def rename(
     ``Movie Title (2024) {tmdb-42423} {edition-Extended Edition} - part1 [extras infos].mkv``
 
     To ensure ouput will feet your needs, start off using the ``--strategy noop`` flag
-    for a dry run.
+    for a dry run. ``hardlink``, ``copy`` and ``reflink`` keep the original file, a
+    reflink being a copy sharing its data (on btrfs, XFS, ...) which is instantaneous
+    and takes no space. Moving a file to another file system copies it.
+
+    With ``--batch``, all files are resolved first without any prompt, then all
+    renames are reviewed and confirmed at once. Files whose movie is ambiguous or
+    could not be found are left untouched. Add ``--yes`` for unattended runs.
+    Otherwise, confirmed renames are applied all at once after the last file, and
+    the next files are searched in the background while the current one is reviewed.
+
+    Files already tagged with their source (e.g. ``{tmdb-42423}`` or
+    ``{imdb-tt1375666}``) are skipped, unless ``--trust-source`` is given to rename
+    them after the movie having that id, e.g. when importing a tagged library.
+
+    Files renamed by a previous run, or skipped because already tagged with their
+    source, are skipped until they are modified unless ``--all`` is given (or
+    ``--trust-source`` for the tagged ones).
+
+    Every run is journaled, so that it can be resumed with ``--resume`` once
+    interrupted, and undone with ``media movie undo``.
     """
-    # TODO: update docstrings
-    for filepath in ui.iterpaths(
-        filepaths,
-        skipif=lambda p: "Already source"
-        if "source" in movie_srv.parse_filename(p.stem)
-        else "",
+    from .adapters.journal import RunJournal
+
+    if trust_source:
+        override_settings(trust_sources=True)
+    ui = get_ui()
+    if resume:
+        journal = RunJournal.find(_runs_dir(), command="movie rename")
+        if journal is None:
+            ui.error("There is no run to resume")
+            raise typer.Exit(1)
+        ui.warn(f"Resuming run {journal.run_id}")
+        # Files may be gone already, renamed by the resumed run
+        renamed = {operation.source for operation, *_ in journal.renames()}
+        filepaths = [path for path in filepaths if path not in renamed]
+    else:
+        journal = RunJournal.create(_runs_dir(), command="movie rename")
+    for path in filepaths:
+        if not path.exists():
+            raise typer.BadParameter(
+                f"Path '{path}' does not exist.", param_hint="'FILEPATHS...'"
+            )
+
+    with journal:
+        _rename_files(
+            filepaths,
+            journal,
+            strategy=strategy,
+            output_dir=output_dir,
+            concurrency=concurrency,
+            batch=batch or yes,
+            yes=yes,
+            min_size=min_size,
+            all_files=all_files,
+        )
+
+
+def _runs_dir() -> Path:
+    return get_settings().state_dir / "runs"
+
+
+def _rename_files(
+    filepaths: list[Path],
+    journal: RunJournal,
+    *,
+    strategy: RenameStrategy,
+    output_dir: Path | None,
+    concurrency: int | None,
+    batch: bool,
+    yes: bool,
+    min_size: int,
+    all_files: bool,
+) -> None:
+    import asyncio
+
+    from .services.movie import PlannedRename
+
+    movie_srv = get_movie_service()
+    ui = get_ui()
+    videos = list(scan_videos(filepaths, min_size=min_size * 1024**2))
+    index = get_state_index()
+    # Files renamed by the resumed run may still be there, e.g. when hard linked
+    renamed = {operation.source for operation, *_ in journal.renames()}
+    videos = [video for video in videos if video.path not in renamed]
+    if not all_files:
+        # Files skipped for being tagged are resolved once sources are trusted
+        processed = index.processed(skipped=not movie_srv.trust_sources)
+        new_videos = [video for video in videos if video.key not in processed]
+        if len(new_videos) < len(videos):
+            ui.warn(
+                f"Skipped {len(videos) - len(new_videos)} already processed file(s)"
+            )
+        videos = new_videos
+    keys = {video.path: video.key for video in videos}
+    filepaths = list(keys)
+
+    skip_reasons = {
+        filepath: "Already source"
+        if not movie_srv.trust_sources
+        and "source" in movie_srv.parse_filename(filepath.stem)
+        else ""
+        for filepath in filepaths
+    }
+    index.record(
+        ((keys[filepath], filepath) for filepath, skip in skip_reasons.items() if skip),
+        index.SKIPPED,
+    )
+    journal.start(strategy, filepaths)
+    resolved = journal.resolutions()
+    plan = [
+        PlannedRename(filepath, output_dir or filepath.parent, resolved[filepath])
+        for filepath in filepaths
+        if not skip_reasons[filepath] and filepath in resolved
+    ]
+    to_resolve = [
+        filepath
+        for filepath in filepaths
+        if not skip_reasons[filepath] and filepath not in resolved
+    ]
+    concurrency = concurrency or get_settings().tmdb_concurrency
+    library = get_library_index().by_source()
+    if not batch:
+        operations: list[RenameOperation] = []
+        try:
+            asyncio.run(
+                _rename_interactively(
+                    filepaths,
+                    plan,
+                    to_resolve,
+                    operations,
+                    strategy=strategy,
+                    output_dir=output_dir,
+                    lookahead=concurrency,
+                    keys=keys,
+                    skip_reasons=skip_reasons,
+                    journal=journal,
+                    library=library,
+                )
+            )
+        finally:
+            # Renames confirmed before quitting or failing are applied all the same
+            if operations and strategy != RenameStrategy.NOOP:
+                _apply_renames(operations, strategy, keys, journal)
+        return
+
+    async def resolve() -> list[PlannedRename]:
+        from contextlib import aclosing
+
+        new_plan = []
+        async with aclosing(
+            movie_srv.iter_renames(to_resolve, output_dir, concurrency)
+        ) as entries:
+            async for entry in entries:
+                # Journaled as soon as resolved, for a resumed run to start from there
+                if not isinstance(entry.result, Exception):
+                    journal.resolved(entry.source, entry.result)
+                new_plan.append(entry)
+        return new_plan
+
+    # Resolve all movies up front and concurrently rather than one after the other
+    with ui.console.status(f"Searching {len(to_resolve)} movie(s)..."):
+        new_plan = asyncio.run(resolve())
+    order = {filepath: i for i, filepath in enumerate(filepaths)}
+    plan = sorted([*plan, *new_plan], key=lambda entry: order[entry.source])
+    _check_library(plan, keys, library)
+    _rename_batch(plan, strategy, keys, journal, yes=yes)
+
+
+def _check_library(
+    plan: list[PlannedRename],
+    keys: dict[Path, FileKey],
+    library: dict[str, list[LibraryEntry]],
+) -> None:
+    """Warn about the files whose movie is already in the library (see ``index``)."""
+    from .services.library_index import LibraryStatus, library_entry, library_status
+
+    if not library:
+        return
+    ui = get_ui()
+    for entry in plan:
+        if isinstance(entry.result, Exception):
+            continue
+        # The formatted name tells both the movie and the quality of the file
+        candidate = library_entry(
+            entry.source, keys[entry.source], entry.result.filename
+        )
+        status, copies = library_status(candidate, library)
+        if status != LibraryStatus.NEW:
+            paths = ", ".join(str(copy.path) for copy in copies)
+            ui.warn(f"{entry.source.name}: {status} of {paths}")
+
+
+def _rename_batch(
+    plan: list[PlannedRename],
+    strategy: RenameStrategy,
+    keys: dict[Path, FileKey],
+    journal: RunJournal,
+    *,
+    yes: bool,
+) -> None:
+    from .services.movie import reject_duplicate_destinations
+
+    ui = get_ui()
+    plan = reject_duplicate_destinations(plan)
+    ui.print_rename_plan(plan, strategy)
+    operations = [
+        operation
+        for entry in plan
+        if (operation := entry.operation) and operation.destination != entry.source
+    ]
+    if not operations or strategy == RenameStrategy.NOOP:
+        return
+    if not yes and not ui.confirm.ask(
+        f"{strategy.capitalize()} {len(operations)} file(s)?", default=True
     ):
-        # TODO: extract this try except block into the UI service directly
-        filename = filepath.name
+        return
+    _apply_renames(operations, strategy, keys, journal)
+
+
+async def _rename_interactively(
+    filepaths: list[Path],
+    plan: list[PlannedRename],
+    to_resolve: list[Path],
+    operations: list[RenameOperation],
+    *,
+    strategy: RenameStrategy,
+    output_dir: Path | None,
+    lookahead: int,
+    keys: dict[Path, FileKey],
+    skip_reasons: dict[Path, str],
+    journal: RunJournal,
+    library: dict[str, list[LibraryEntry]],
+) -> None:
+    """Review files one by one, adding the renames confirmed to ``operations``.
+
+    Renames are added as soon as confirmed, for them to be applied even when the
+    review is interrupted. Files ``to_resolve`` are searched ``lookahead`` files
+    ahead of the one being reviewed, so that the user rarely waits for a search.
+    Prompts are run in threads for searches to go on meanwhile, and searches still
+    running are cancelled when the user quits.
+    """
+    import asyncio
+    from contextlib import aclosing
+
+    from .ports import ManyMoviesFoundError, MovieNotFoundError
+
+    movie_srv = get_movie_service()
+    ui = get_ui()
+    planned = {entry.source: entry for entry in plan}
+    # Movies given by the user, for not asking again for other parts of the movie
+    chosen: dict[MovieKey, str | None] = {}
+
+    def format_file(
+        filepath: Path, movie_id: str | None
+    ) -> FormattedMediaInformation | Exception:
         try:
-            fmedia_info = movie_srv.format_filename(filename)
-        except MovieNotFoundError as not_found:
-            ui.error(not_found)
-            movie_id = ui.ask_movie_id()
-            fmedia_info = movie_srv.format_filename(filename, movie_id=movie_id)
-        except ManyMoviesFoundError as many_found:
-            ui.print_movies(many_found, many_found.movies)
-            movie_id = ui.ask_movie_id(default=many_found.movies[0].id)
-            fmedia_info = movie_srv.format_filename(filename, movie_id=movie_id)
-
-        output_dir = output_dir or filepath.parent
-        output_path = output_dir / fmedia_info.dirname / fmedia_info.filename
-        # TODO: short-circuit if the formatted name is identical as current filepath
-        # TODO: simplify this confirm function
-        if not ui.confirm_rename_media(
-            output_dir,
-            filepath,
-            fmedia_info,
+            return movie_srv.format_file(filepath, movie_id=movie_id)
+        except (MovieNotFoundError, ManyMoviesFoundError) as error:
+            return error
+
+    async with aclosing(
+        movie_srv.iter_renames(to_resolve, output_dir, lookahead)
+    ) as entries:
+        for index, filepath in enumerate(filepaths):
+            skip_reason = skip_reasons[filepath]
+            # Files are searched while the user is asked about them, and even when
+            # not confirmed for the next ones to follow
+            lookup = (
+                None
+                if skip_reason or filepath in planned
+                else asyncio.ensure_future(anext(entries))
+            )
+            try:
+                confirmed = await _ask(
+                    ui.confirm_path, index, len(filepaths), filepath, skip_reason
+                )
+            except BaseException:
+                if lookup is not None:
+                    lookup.cancel()
+                    await asyncio.wait([lookup])
+                raise
+            if skip_reason:
+                continue
+            if lookup is None:
+                entry = planned[filepath]
+            else:
+                entry = await lookup
+                if not isinstance(entry.result, Exception):
+                    journal.resolved(filepath, entry.result)
+                    _check_library([entry], keys, library)
+            if not confirmed:
+                continue
+            result = entry.result
+            if isinstance(result, Exception) and entry.key in chosen:
+                result = format_file(filepath, chosen[entry.key])
+            # Asked again until the movie is found, e.g. when its id is mistyped, or
+            # until nothing is entered for skipping the file
+            while isinstance(result, (MovieNotFoundError, ManyMoviesFoundError)):
+                if isinstance(result, ManyMoviesFoundError):
+                    ui.print_movies(result, result.movies)
+                    movie_id = await _ask(ui.ask_movie_id, default=result.movies[0].id)
+                else:
+                    ui.error(result)
+                    movie_id = await _ask(ui.ask_movie_id)
+                if not movie_id:
+                    break
+                result = format_file(filepath, movie_id)
+                if entry.key is not None and not isinstance(result, Exception):
+                    chosen[entry.key] = movie_id
+            if isinstance(result, (MovieNotFoundError, ManyMoviesFoundError)):
+                ui.warn(f"Skipped {filepath.name}")
+                continue
+            if isinstance(result, Exception):
+                raise result
+            fmedia_info = result
+            if fmedia_info is not entry.result:
+                journal.resolved(filepath, fmedia_info)
+
+            operation = entry._replace(result=fmedia_info).operation
+            assert operation is not None
+            # TODO: short-circuit if the formatted name is identical as current filepath
+            # TODO: simplify this confirm function
+            if await _ask(
+                ui.confirm_rename_media,
+                entry.output_dir,
+                filepath,
+                fmedia_info,
+                strategy,
+                skip=strategy == RenameStrategy.NOOP,
+            ):
+                operations.append(operation)
+
+
+async def _ask(prompt: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking prompt without blocking the event loop.
+
+    The prompt runs in a daemon thread rather than in the default executor, for
+    quitting not to wait for an answer that will never come. Answers not typed in a
+    terminal are there already, the prompt is then run right away.
+    """
+    import asyncio
+    import threading
+
+    if not sys.stdin.isatty():
+        # Besides, a thread reading a pipe would hold it locked when quitting
+        return prompt(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    answer: asyncio.Future[T] = loop.create_future()
+
+    def settle(result: T | None, error: BaseException | None) -> None:
+        if answer.done():
+            return
+        if error is not None:
+            answer.set_exception(error)
+        else:
+            answer.set_result(result)  # type: ignore[arg-type]
+
+    def run() -> None:
+        result, failure = None, None
+        try:
+            result = prompt(*args, **kwargs)
+        except BaseException as error:
+            failure = error
+        try:
+            loop.call_soon_threadsafe(settle, result, failure)
+        except RuntimeError:
+            # The loop is closed, the user having quit meanwhile
+            pass
+
+    threading.Thread(target=run, name="prompt", daemon=True).start()
+    return await answer
+
+
+def _apply_renames(
+    operations: list[RenameOperation],
+    strategy: RenameStrategy,
+    keys: dict[Path, FileKey],
+    journal: RunJournal,
+) -> None:
+    ui = get_ui()
+    total_bytes = None
+    if strategy == RenameStrategy.COPY:
+        total_bytes = sum(keys[op.source].size for op in operations)
+    with ui.rename_progress(len(operations), total_bytes) as (progress, copied):
+
+        def on_result(result: RenameResult) -> None:
+            progress(result)
+            if result.error is None:
+                operation = result.operation
+                journal.renamed(operation, strategy, keys[operation.source])
+
+        results = apply_renames(
+            operations,
             strategy,
-            skip=strategy == RenameStrategy.NOOP,
+            workers=get_settings().rename_workers,
+            progress=on_result,
+            copy_progress=copied,
+        )
+    ui.print_rename_results(results)
+    index = get_state_index()
+    index.record(
+        (
+            (keys[result.operation.source], result.operation.destination)
+            for result in results
+            if result.error is None
+        ),
+        index.RENAMED,
+    )
+    ui.console.print(f"Undo with: media movie undo {journal.run_id}")
+
+
+@movies_app.command()
+def index(
+    paths: Annotated[
+        list[Path] | None,
+        typer.Argument(
+            exists=True,
+            file_okay=False,
+            dir_okay=True,
+            resolve_path=True,
+            help="Directories of the organized library. Defaults to the ones indexed "
+            "so far",
+        ),
+    ] = None,
+    min_size: Annotated[
+        int,
+        typer.Option(
+            "--min-size",
+            min=0,
+            help="Ignore video files smaller than this (in MiB), e.g. samples",
+        ),
+    ] = 0,
+    duplicates: Annotated[
+        bool,
+        typer.Option("--duplicates", help="List the movies having many copies"),
+    ] = False,
+) -> None:
+    """Index the movies of the organized library by their TMDB id.
+
+    Files renamed by ``media movie rename`` are tagged with the id of their movie,
+    e.g. ``{tmdb-27205}``. Once indexed, rename runs warn about files whose movie is
+    already in the library, telling whether they are duplicates or quality
+    upgrades (by resolution, then quality and codec).
+
+    Only the files added or modified since the last run are parsed again, so run
+    it again whenever the library changes.
+    """
+    from .services.library_index import update_library_index
+
+    ui = get_ui()
+    library_index = get_library_index()
+    roots = paths or library_index.roots()
+    if not roots:
+        ui.error("Give the directories of the library to index")
+        raise typer.Exit(1)
+    update = update_library_index(library_index, roots, min_size=min_size * 1024**2)
+    ui.console.print(
+        f"Indexed {update.added + update.updated + update.unchanged} file(s): "
+        f"{update.added} added, {update.updated} updated, {update.removed} removed"
+    )
+    if duplicates:
+        for source, copies in sorted(library_index.by_source().items()):
+            if len(copies) > 1:
+                best = max(copies, key=lambda copy: copy.score)
+                ui.console.print(f"{source}:")
+                for copy in copies:
+                    mark = "*" if copy is best else " "
+                    ui.console.print(f" {mark} {copy.path}", highlight=False)
+
+
+@movies_app.command()
+def undo(
+    run: Annotated[
+        str | None,
+        typer.Argument(help="Run to undo, as printed by rename. The latest by default"),
+    ] = None,
+    yes: Annotated[
+        bool, typer.Option("-y", "--yes", help="Undo without any confirmation")
+    ] = False,
+) -> None:
+    """Undo the renames of a run.
+
+    Moved files are moved back, other renamed files are removed as long as the
+    original file is still there. Files are then processed again by next runs.
+    """
+    from .adapters.journal import RunJournal
+    from .services.rename import undo_renames
+
+    ui = get_ui()
+    journal = RunJournal.find(_runs_dir(), run)
+    if journal is None:
+        ui.error(f"There is no run {run}" if run else "There is no run to undo")
+        raise typer.Exit(1)
+
+    with journal:
+        renames = journal.renames()
+        if not renames:
+            ui.warn(f"Nothing to undo in run {journal.run_id}")
+            return
+        if not yes and not ui.confirm.ask(
+            f"Undo {len(renames)} rename(s) of run {journal.run_id}?", default=True
         ):
+            return
+        keys = {operation: key for operation, _, key in renames}
+        results = undo_renames(
+            (operation, strategy) for operation, strategy, _ in renames
+        )
+        undone = [result.operation for result in results if result.error is None]
+        for operation in undone:
+            journal.undone(operation)
+    get_state_index().forget(keys[operation] for operation in undone)
+    ui.print_rename_results(results, done="restored")
+
+
+@movies_app.command()
+def watch(
+    directories: Annotated[
+        list[Path],
+        typer.Argument(
+            exists=True,
+            file_okay=False,
+            resolve_path=True,
+            help="Directories to watch, along with their subdirectories",
+        ),
+    ],
+    strategy: StrategyOption = RenameStrategy.MOVE,
+    output_dir: OutputDirOption = None,
+    debounce: Annotated[
+        float,
+        typer.Option(
+            "--debounce",
+            min=0,
+            help="Seconds a file must stay unchanged to be considered complete",
+        ),
+    ] = 5.0,
+    min_size: Annotated[
+        int,
+        typer.Option(
+            "--min-size", min=0, help="Ignore video files smaller than this (in MiB)"
+        ),
+    ] = 0,
+) -> None:
+    """Rename movie files as soon as they are complete in given directories.
+
+    Files written or moved into watched directories are renamed without asking
+    anything once they have stopped changing, files whose movie cannot be selected
+    confidently being queued for ``media movie review`` instead. Files already there
+    and not processed yet are renamed at start. Requires Linux (inotify).
+
+    All renames of a session are journaled as a single run, which can be undone.
+    """
+    import asyncio
+
+    from .adapters.inotify import InotifyWatcher
+    from .adapters.journal import RunJournal
+    from .services.watch import PendingFiles
+
+    ui = get_ui()
+    try:
+        watcher = InotifyWatcher()
+    except OSError as error:
+        ui.error(error)
+        raise typer.Exit(1) from error
+
+    pending = PendingFiles(debounce)
+    with watcher, RunJournal.create(_runs_dir(), command="movie watch") as journal:
+        for directory in directories:
+            watcher.watch(directory)
+        videos = list(scan_videos(directories, min_size=min_size * 1024**2))
+        # Files written later are told by the records of their resolution and rename
+        journal.start(strategy, [video.path for video in videos])
+        for video in videos:
+            pending.add(video.path)
+        ui.console.print(f"Watching {', '.join(map(str, directories))}")
+        try:
+            # A single event loop for the whole session so that connections to the
+            # movie database are kept alive between files
+            asyncio.run(
+                _watch(
+                    watcher,
+                    pending,
+                    directories,
+                    journal,
+                    strategy=strategy,
+                    output_dir=output_dir,
+                    min_size=min_size * 1024**2,
+                )
+            )
+        except KeyboardInterrupt:
+            ui.warn(f"Stopped watching, {len(pending)} file(s) were not complete yet")
+
+
+async def _watch(
+    watcher: InotifyWatcher,
+    pending: PendingFiles,
+    directories: list[Path],
+    journal: RunJournal,
+    *,
+    strategy: RenameStrategy,
+    output_dir: Path | None,
+    min_size: int,
+) -> None:
+    import asyncio
+
+    from .services.library import VIDEO_EXTENSIONS
+
+    def on_events() -> None:
+        for event in watcher.read():
+            if event.overflowed:
+                # Events have been lost, look for files again
+                for video in scan_videos(directories, min_size=min_size):
+                    pending.add(video.path)
+            elif event.is_dir:
+                # Directories created then written are notified file by file
+                for video in scan_videos([event.path], min_size=min_size):
+                    pending.add(video.path)
+            elif event.completed and event.path.suffix.lower() in VIDEO_EXTENSIONS:
+                pending.add(event.path)
+
+    loop = asyncio.get_running_loop()
+    loop.add_reader(watcher.fileno(), on_events)
+    try:
+        while True:
+            # Not polling continuously when files are complete right away
+            await asyncio.sleep(min(1.0, max(0.1, pending.debounce / 2)))
+            if ready := pending.ready():
+                await _rename_completed(
+                    ready,
+                    journal,
+                    strategy=strategy,
+                    output_dir=output_dir,
+                    min_size=min_size,
+                )
+    finally:
+        loop.remove_reader(watcher.fileno())
+
+
+async def _rename_completed(
+    filepaths: list[Path],
+    journal: RunJournal,
+    *,
+    strategy: RenameStrategy,
+    output_dir: Path | None,
+    min_size: int,
+) -> None:
+    """Rename given files without asking, queueing ambiguous ones for review."""
+    from .services.movie import reject_duplicate_destinations
+
+    movie_srv = get_movie_service()
+    ui = get_ui()
+    index = get_state_index()
+    processed = index.processed(skipped=not movie_srv.trust_sources)
+    keys = {}
+    for filepath in filepaths:
+        try:
+            key = FileKey.from_stat(filepath.stat())
+        except FileNotFoundError:
+            continue
+        if key not in processed and key.size >= min_size:
+            keys[filepath] = key
+
+    skipped = {
+        filepath
+        for filepath in keys
+        if not movie_srv.trust_sources
+        and "source" in movie_srv.parse_filename(filepath.stem)
+    }
+    index.record(((keys[filepath], filepath) for filepath in skipped), index.SKIPPED)
+    plan = await movie_srv.plan_renames(
+        [filepath for filepath in keys if filepath not in skipped],
+        output_dir=output_dir,
+        concurrency=get_settings().tmdb_concurrency,
+    )
+
+    operations = []
+    to_review = []
+    for entry in reject_duplicate_destinations(plan):
+        if isinstance(entry.result, Exception):
+            ui.warn(f"Queued {entry.source} for review: {entry.result}")
+            to_review.append(entry.source)
             continue
+        journal.resolved(entry.source, entry.result)
+        operation = entry.operation
+        if operation is not None and operation.destination != entry.source:
+            operations.append(operation)
+    index.record(((keys[filepath], filepath) for filepath in to_review), index.REVIEW)
+    if operations and strategy != RenameStrategy.NOOP:
+        # Events are queued by the kernel meanwhile, a rescan following an overflow
+        _apply_renames(operations, strategy, keys, journal)
+
+
+@movies_app.command()
+def review(
+    strategy: StrategyOption = RenameStrategy.MOVE,
+    output_dir: OutputDirOption = None,
+) -> None:
+    """Rename the files that ``media movie watch`` could not resolve by itself."""
+    from .adapters.journal import RunJournal
+
+    ui = get_ui()
+    filepaths = [path for path in get_state_index().to_review() if path.exists()]
+    if not filepaths:
+        ui.warn("There is no file to review")
+        return
+    with RunJournal.create(_runs_dir(), command="movie review") as journal:
+        _rename_files(
+            filepaths,
+            journal,
+            strategy=strategy,
+            output_dir=output_dir,
+            concurrency=None,
+            batch=False,
+            yes=False,
+            min_size=0,
+            all_files=False,
+        )
+
+
+@tv_app.command("rename")
+def rename_episodes(
+    filepaths: Annotated[
+        list[Path],
+        typer.Argument(
+            exists=True,
+            file_okay=True,
+            dir_okay=True,
+            resolve_path=True,
+            help="Path(s) to the episode file(s) to rename, or directories to scan "
+            "for episodes",
+        ),
+    ],
+    strategy: StrategyOption = RenameStrategy.MOVE,
+    output_dir: OutputDirOption = None,
+    concurrency: Annotated[
+        int | None,
+        typer.Option(
+            "-j",
+            "--concurrency",
+            min=1,
+            help="Maximum number of shows and seasons looked up concurrently",
+        ),
+    ] = None,
+    show_id: Annotated[
+        str | None,
+        typer.Option(
+            "--show-id", help="TMDB id of the show all given episodes belong to"
+        ),
+    ] = None,
+    yes: Annotated[
+        bool,
+        typer.Option(
+            "-y", "--yes", help="Apply all resolved renames without any confirmation"
+        ),
+    ] = False,
+) -> None:
+    """Rename TV episode files in a standard way.
+
+    Episode files are grouped by show and by season, so that every show is searched
+    once and every season fetched once from TMDB, whatever the number of episodes.
+    Files are then renamed following the recommended Plex pattern:
+
+    ``Show Title (2010) {tmdb-1234}/Season 01/Show Title (2010) - s01e02 - Episode Title.mkv``
+
+    All renames are reviewed and confirmed at once. Files whose show is ambiguous
+    are left untouched, ``--show-id`` telling which show they belong to.
+    """
+    import asyncio
+
+    from .adapters.journal import RunJournal
+
+    ui = get_ui()
+    keys = {video.path: video.key for video in scan_videos(filepaths)}
+    with ui.console.status(f"Searching {len(keys)} episode(s)..."):
+        plan = asyncio.run(
+            get_tv_service().plan_renames(
+                list(keys),
+                output_dir=output_dir,
+                concurrency=concurrency or get_settings().tmdb_concurrency,
+                show_id=show_id,
+            )
+        )
+    with RunJournal.create(_runs_dir(), command="tv rename") as journal:
+        journal.start(strategy, list(keys))
+        for entry in plan:
+            if not isinstance(entry.result, Exception):
+                journal.resolved(entry.source, entry.result)
+        _rename_batch(plan, strategy, keys, journal, yes=yes)
+
+
+@app.command()
+def serve(
+    host: Annotated[
+        str, typer.Option("--host", help="Address to listen to")
+    ] = "127.0.0.1",
+    port: Annotated[
+        int, typer.Option("-p", "--port", min=0, max=65535, help="Port to listen to")
+    ] = 8765,
+    socket: Annotated[
+        Path | None,
+        typer.Option(
+            "--socket",
+            dir_okay=False,
+            help="Listen to this Unix socket rather than to a TCP port",
+        ),
+    ] = None,
+) -> None:
+    """Serve movie file names parsing and formatting over HTTP, as JSON.
+
+    Calling the service from other programs avoids paying for starting the CLI for
+    every file, and keeps connections and caches warm. For example:
+
+    curl localhost:8765/format -d '{"filename": "Inception.2010.1080p.mkv"}'
+    """
+    import asyncio
+
+    from .adapters.server import MovieApiServer
+
+    server = MovieApiServer(
+        get_movie_service(parse_only=True),
+        get_movie_service,
+        concurrency=get_settings().tmdb_concurrency,
+    )
+    ui = get_ui()
+    if socket is not None:
+        ui.console.print(f"Serving on {socket}")
+        serving = server.serve_unix(socket)
+    else:
+        ui.console.print(f"Serving on http://{host}:{port}")
+        serving = server.serve_tcp(host, port)
+    try:
+        asyncio.run(serving)
+    except KeyboardInterrupt:
+        ui.warn("Stopped serving")
+
 
-        # TODO: not sure if this code should not be in the movie service directly
-        match strategy:
-            case RenameStrategy.HARDLINK:
-                output_path.parent.mkdir(parents=True, exist_ok=True)
-                filepath.hardlink_to(output_path)
-            case RenameStrategy.MOVE:
-                output_path.parent.mkdir(parents=True, exist_ok=True)
-                filepath.rename(output_path)
-            case RenameStrategy.NOOP:
-                pass
+@db_app.command()
+def enrich() -> None:
+    """Add the movies of cached TMDB results to the local movie database."""
+    db = get_local_movie_db()
+    before = len(db)
+    db.add(get_movie_cache().movies("tmdb:"))
+    get_ui().console.print(f"{len(db)} movie(s) known, {len(db) - before} new")
 
 
 if __name__ == "__main__":
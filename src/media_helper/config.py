@@ -1,8 +1,84 @@
-from pydantic import SecretStr
+import os
+from datetime import timedelta
+from pathlib import Path
+from typing import Annotated
+
+from pydantic import AfterValidator, Field, SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from .core.formatter import (
+    EPISODE_FILENAME_TEMPLATE,
+    MOVIE_DIRNAME_TEMPLATE,
+    MOVIE_FILENAME_TEMPLATE,
+    SEASON_DIRNAME_TEMPLATE,
+)
+from .core.template import NamingTemplate
+
+
+def _default_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "media-helper"
+
+
+def _default_state_dir() -> Path:
+    base = os.environ.get("XDG_STATE_HOME") or Path.home() / ".local" / "state"
+    return Path(base) / "media-helper"
+
+
+def _default_data_dir() -> Path:
+    base = os.environ.get("XDG_DATA_HOME") or Path.home() / ".local" / "share"
+    return Path(base) / "media-helper"
+
+
+def _check_template(template: str) -> str:
+    # Compiling tells about any error in the template
+    NamingTemplate(template)
+    return template
+
+
+Template = Annotated[str, AfterValidator(_check_template)]
+
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
-    tmdb_access_token: SecretStr
+    # Only required by the commands looking movies or shows up
+    tmdb_access_token: SecretStr | None = None
+    # Maximum number of concurrent requests sent to TMDB
+    tmdb_concurrency: int = 8
+    # Maximum number of requests per second sent to TMDB
+    tmdb_rate_limit: float = 40.0
+    # Maximum number of retries of throttled or failed TMDB requests
+    tmdb_max_retries: int = 5
+
+    # How much the best movie found must outscore the next one (scores ranging from
+    # 0 to 1) to be selected without asking
+    match_confidence_margin: float = 0.15
+    # Whether files tagged with the id of their movie (e.g. ``{tmdb-27205}`` or
+    # ``{imdb-tt1375666}``) are resolved by that id rather than searched by title
+    trust_sources: bool = False
+
+    # Number of files renamed at the same time, waiting for the file system
+    rename_workers: int = 8
+
+    # Persistent cache of movie database lookups
+    cache_dir: Path = Field(default_factory=_default_cache_dir)
+    cache_ttl: timedelta = timedelta(days=30)
+    cache_negative_ttl: timedelta = timedelta(days=1)
+    cache_max_entries: int = 50_000
+    # Whether to read (unless refreshing) and write the cache
+    cache_enabled: bool = True
+    cache_refresh: bool = False
+
+    # Local movie database, searched before TMDB and enriched by its results
+    data_dir: Path = Field(default_factory=_default_data_dir)
+    local_db_enabled: bool = True
+
+    # Where to remember what has already been done
+    state_dir: Path = Field(default_factory=_default_state_dir)
+
+    # Naming of renamed files, see media_helper.core.template
+    movie_filename_template: Template = MOVIE_FILENAME_TEMPLATE
+    movie_dirname_template: Template = MOVIE_DIRNAME_TEMPLATE
+    episode_filename_template: Template = EPISODE_FILENAME_TEMPLATE
+    season_dirname_template: Template = SEASON_DIRNAME_TEMPLATE
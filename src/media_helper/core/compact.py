@@ -0,0 +1,188 @@
+import sys
+import typing
+from collections.abc import Iterable
+from typing import TYPE_CHECKING, Any
+
+from .model import MediaInformation, MediaSource
+
+# Fields of media information by kind, in declaration order
+_LIST_FIELDS = tuple(
+    name
+    for name, field in MediaInformation.model_fields.items()
+    if typing.get_origin(field.annotation) is list
+)
+_FLAG_FIELDS = tuple(
+    name
+    for name, field in MediaInformation.model_fields.items()
+    if field.annotation is bool
+)
+_FLAG_BITS = {name: 1 << index for index, name in enumerate(_FLAG_FIELDS)}
+
+# List fields taking few distinct values, shared by all compact media information
+# (e.g. ("H.264",)) without the table of shared values growing with every file
+_INTERNED_FIELDS = frozenset(
+    {
+        "audio",
+        "bit_depth",
+        "codec",
+        "filetype",
+        "language",
+        "quality",
+        "resolution",
+        "subtitles",
+    }
+)
+_interned_values: dict[tuple[Any, ...], tuple[Any, ...]] = {}
+
+
+def _intern_values(values: Iterable[Any]) -> tuple[Any, ...]:
+    values = tuple(sys.intern(v) if isinstance(v, str) else v for v in values)
+    return _interned_values.setdefault(values, values)
+
+
+class CompactMediaInformation:
+    """Memory efficient and read-only version of :class:`MediaInformation`.
+
+    Meant for holding the media information of many files at once: instances are
+    slotted, flags are packed into a single integer, empty lists are not stored at
+    all and repeated values (codecs, qualities, languages, ...) are shared between
+    instances. Fields read the same as on :class:`MediaInformation`, except that lists
+    are tuples, so the formatter accepts both.
+
+    >>> info = MediaInformation.from_filename("Inception.2010.REMASTERED.1080p.x264.mkv")
+    >>> compact = CompactMediaInformation.from_media_info(info)
+    >>> compact.title, compact.year, compact.codec, compact.audio
+    ('Inception', (2010,), ('H.264',), ())
+    >>> compact.remastered, compact.hdr
+    (True, False)
+    >>> compact.to_media_info() == info
+    True
+    """
+
+    __slots__ = (
+        "title",
+        "episode_name",
+        "split_name",
+        "file_ext",
+        "source",
+        "_lists",
+        "_flags",
+    )
+
+    title: str | None
+    episode_name: str | None
+    split_name: str | None
+    file_ext: str
+    source: MediaSource | None
+
+    def __init__(
+        self,
+        file_ext: str,
+        title: str | None = None,
+        episode_name: str | None = None,
+        split_name: str | None = None,
+        source: MediaSource | None = None,
+        lists: tuple[tuple[int, tuple[Any, ...]], ...] = (),
+        flags: int = 0,
+    ) -> None:
+        self.file_ext = sys.intern(file_ext)
+        self.title = title
+        self.episode_name = episode_name
+        self.split_name = split_name
+        self.source = source
+        # Non empty list fields only, as (index in _LIST_FIELDS, values) pairs
+        self._lists = lists
+        self._flags = flags
+
+    @classmethod
+    def from_media_info(cls, info: MediaInformation) -> "CompactMediaInformation":
+        values = info.__dict__
+        return cls(
+            values["file_ext"],
+            values["title"],
+            values["episode_name"],
+            values["split_name"],
+            values["source"],
+            tuple(
+                (
+                    index,
+                    _intern_values(values[name])
+                    if name in _INTERNED_FIELDS
+                    else tuple(values[name]),
+                )
+                for index, name in enumerate(_LIST_FIELDS)
+                if values[name]
+            ),
+            sum(bit for name, bit in _FLAG_BITS.items() if values[name]),
+        )
+
+    @classmethod
+    def from_filename(cls, name: str) -> "CompactMediaInformation":
+        return cls.from_media_info(MediaInformation.from_filename(name))
+
+    def to_media_info(self) -> MediaInformation:
+        """Return the equivalent media information, without validating it again."""
+        # Every field is given since computing defaults is slow with pydantic
+        values: dict[str, Any] = {
+            "title": self.title,
+            "episode_name": self.episode_name,
+            "split_name": self.split_name,
+            "file_ext": self.file_ext,
+            "source": self.source,
+        }
+        values.update((name, []) for name in _LIST_FIELDS)
+        values.update((_LIST_FIELDS[index], list(v)) for index, v in self._lists)
+        values.update(
+            (name, bool(self._flags & bit)) for name, bit in _FLAG_BITS.items()
+        )
+        return MediaInformation.model_construct(**values)
+
+    if TYPE_CHECKING:
+        # List fields and flags, see _add_field_properties
+        def __getattr__(self, name: str) -> Any: ...
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, CompactMediaInformation):
+            return NotImplemented
+        return all(
+            getattr(self, slot) == getattr(other, slot) for slot in self.__slots__
+        )
+
+    def __repr__(self) -> str:
+        fields = [f"file_ext={self.file_ext!r}"]
+        fields.extend(
+            f"{name}={getattr(self, name)!r}"
+            for name in ("title", "episode_name", "split_name", "source")
+            if getattr(self, name) is not None
+        )
+        fields.extend(
+            f"{_LIST_FIELDS[index]}={values!r}" for index, values in self._lists
+        )
+        fields.extend(
+            f"{name}=True" for name, bit in _FLAG_BITS.items() if self._flags & bit
+        )
+        return f"{type(self).__name__}({', '.join(fields)})"
+
+
+def _add_field_properties(cls: type[CompactMediaInformation]) -> None:
+    # Properties are much faster to read than attributes computed by __getattr__
+
+    def list_field(index: int) -> property:
+        def get(self: CompactMediaInformation) -> tuple[Any, ...]:
+            for list_index, values in self._lists:
+                if list_index == index:
+                    return values
+            return ()
+
+        return property(get)
+
+    def flag(bit: int) -> property:
+        return property(lambda self: bool(self._flags & bit))
+
+    for index, name in enumerate(_LIST_FIELDS):
+        setattr(cls, name, list_field(index))
+    for name, bit in _FLAG_BITS.items():
+        setattr(cls, name, flag(bit))
+
+
+_add_field_properties(CompactMediaInformation)
@@ -1,82 +1,63 @@
-from media_helper.core.model import MediaInformation
+from collections.abc import Iterable
+
+from .template import Media, NamingTemplate
+
+# Plex naming, see https://support.plex.tv/articles/naming-and-organizing-your-movie-media-files/
+# and https://support.plex.tv/articles/naming-and-organizing-your-tv-show-files/
+MOVIE_FILENAME_TEMPLATE = (
+    "{title} ({year})< {{{source_name}-{source_id}}}>< {{edition-{edition}}}>"
+    "< - {split}>< {metadata}>{ext}"
+)
+MOVIE_DIRNAME_TEMPLATE = (
+    "{title} ({year})< {{{source_name}-{source_id}}}>< {{edition-{edition}}}>"
+)
+EPISODE_FILENAME_TEMPLATE = (
+    "{title} ({year}) - s{season:02}e{episode:02}<-e{last_episode:02}>"
+    "< - {episode_name}>< {metadata}>{ext}"
+)
+SEASON_DIRNAME_TEMPLATE = (
+    "{title} ({year})< {{{source_name}-{source_id}}}>/Season {season:02}"
+)
 
 
 class PlexMediaFileNameFormatter:
-    def format_movie_filename(self, media: MediaInformation) -> str:
-        parts = [
-            self._format_movie_title(media),
-            self._format_movie_release_year(media),
-            self._format_media_source(media),
-            self._format_movie_edition(media),
-            self._format_movie_split_name(media.split_name),
-            self._format_media_metadata(media),
-        ]
-        return " ".join(p for p in parts if p) + media.file_ext
-
-    def format_movie_dirname(self, media: MediaInformation) -> str:
-        parts = [
-            self._format_movie_title(media),
-            self._format_movie_release_year(media),
-            self._format_media_source(media),
-            self._format_movie_edition(media),
-        ]
-        return " ".join(p for p in parts if p)
-
-    def _format_movie_title(self, media: MediaInformation) -> str:
-        if not media.title:
-            raise ValueError("Media has no title")
-        title_parts = media.title.replace(":", " - ").split()
-        return " ".join(title_parts)
-
-    def _format_movie_release_year(self, media: MediaInformation) -> str:
-        if not media.year:
-            raise ValueError("Media has no release year")
-        return f"({media.year[0]})"
-
-    def _format_media_source(self, media: MediaInformation) -> str:
-        if not media.source:
-            return ""
-        return f"{{{media.source.name}-{media.source.media_id}}}"
-
-    def _format_movie_edition(self, media: MediaInformation) -> str:
-        tags = []
-        if media.directors_cut:
-            tags.append("Director's Cut")
-        if media.international_cut:
-            tags.append("International's Cut")
-        if media.unrated:
-            tags.append("Unrated")
-        if media.remastered:
-            tags.append("Remastered")
-        if media.limited:
-            tags.append("Limited Edition")
-        if media.extended:
-            tags.append("Extended Edition")
-
-        tags_str = " ".join(tags)
-        return f"{{edition-{tags_str}}}" if tags else ""
-
-    def _format_movie_split_name(self, split_name: str | None) -> str:
-        return f"- {split_name}" if split_name else ""
-
-    def _format_media_metadata(self, media: MediaInformation) -> str:
-        metadata = [
-            self._format_media_quality(media),
-            "3D" if media.is_3d else None,
-            "HDR" if media.hdr else None,
-            " ".join(media.audio),
-            " ".join(media.language),
-            " ".join(media.subtitles),
-            " ".join(media.codec),
-        ]
-        return "".join(f"[{m}]" for m in metadata if m)
-
-    def _format_media_quality(self, media: MediaInformation) -> str:
-        items = media.quality + media.resolution
-        if media.proper:
-            items.append("Proper")
-        if media.upscaled:
-            items.append("Upscaled")
-        if media.widescreen:
-            items.append("Widescreen")
-        return " ".join(items)
+    """Format the names of media files and of their directories.
+
+    Names follow Plex conventions unless other templates are given (see
+    :mod:`media_helper.core.template`), e.g. ``{title} ({year})< [tmdbid-{source_id}]>``
+    for Jellyfin. Templates are compiled once, when the formatter is built.
+
+    >>> from media_helper.core.model import MediaInformation
+    >>> formatter = PlexMediaFileNameFormatter()
+    >>> media = MediaInformation.from_filename("Inception.2010.EXTENDED.1080p.mkv")
+    >>> formatter.format_movie_filename(media)
+    'Inception (2010) {edition-Extended Edition} [1080p].mkv'
+    >>> media = MediaInformation(title="Show", year=[2010], season=[1], file_ext="")
+    >>> formatter.format_season_dirname(media)
+    'Show (2010)/Season 01'
+    """
+
+    def __init__(
+        self,
+        movie_filename: str = MOVIE_FILENAME_TEMPLATE,
+        movie_dirname: str = MOVIE_DIRNAME_TEMPLATE,
+        episode_filename: str = EPISODE_FILENAME_TEMPLATE,
+        season_dirname: str = SEASON_DIRNAME_TEMPLATE,
+    ) -> None:
+        self.movie_filename = NamingTemplate(movie_filename)
+        self.movie_dirname = NamingTemplate(movie_dirname)
+        # Files holding many episodes are named after the first and last ones
+        self.episode_filename = NamingTemplate(episode_filename)
+        # Directory of a season, within the one of its show
+        self.season_dirname = NamingTemplate(season_dirname)
+
+        # Compiled functions, called directly since formatting is a hot path
+        self.format_movie_filename = self.movie_filename.format
+        self.format_movie_dirname = self.movie_dirname.format
+        self.format_episode_filename = self.episode_filename.format
+        self.format_season_dirname = self.season_dirname.format
+
+    def format_many(self, medias: Iterable[Media]) -> list[tuple[str, str]]:
+        """Format the file and directory names of many movies, in the same order."""
+        filename, dirname = self.format_movie_filename, self.format_movie_dirname
+        return [(filename(media), dirname(media)) for media in medias]
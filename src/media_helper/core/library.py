@@ -0,0 +1,44 @@
+import os
+from pathlib import Path
+from typing import NamedTuple
+
+from .quality import QualityScore
+
+
+class FileKey(NamedTuple):
+    """Identify the content of a file, whatever its name or location.
+
+    A file keeps its key when renamed or hard linked on the same device, and gets a
+    new one as soon as it is modified.
+    """
+
+    device: int
+    inode: int
+    size: int
+    mtime_ns: int
+
+    @classmethod
+    def from_stat(cls, stat: os.stat_result) -> "FileKey":
+        return cls(stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+class LibraryEntry(NamedTuple):
+    """A file of the organized library, as far as its name tells."""
+
+    path: Path
+    key: FileKey
+    # Media the file is tagged with, e.g. "tmdb-27205"
+    source: str | None
+    # Best resolution, quality and codec told by the name
+    resolution: str | None = None
+    quality: str | None = None
+    codec: str | None = None
+
+    @property
+    def score(self) -> QualityScore:
+        return QualityScore.of(
+            *(
+                [value] if value else []
+                for value in (self.resolution, self.quality, self.codec)
+            )
+        )
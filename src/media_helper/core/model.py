@@ -2,16 +2,26 @@ from __future__ import annotations
 
 import re
 from pathlib import Path
-from typing import Callable, ClassVar
+from typing import Any, Callable, ClassVar
 
 import PTN
 from pydantic import BaseModel, Field
 
+# Private modules of the regex engine, only used to speed scans up when available
+try:
+    from re import _constants as sre  # type: ignore[attr-defined]
+    from re import _parser as sre_parse  # type: ignore[attr-defined]
+except ImportError:
+    sre = sre_parse = None
+
+
+class Release(BaseModel):
+    """What movies and TV shows have in common, as found in a movie database."""
 
-class Movie(BaseModel):
     id: str
     title: str
     original_title: str
+    # Year the movie was released, or the show first aired
     release_year: int
     source_name: str
     link: str
@@ -27,11 +37,164 @@ class Movie(BaseModel):
         return " - ".join(parts)
 
 
+class Movie(Release):
+    """A movie, as found in a movie database."""
+
+
+class Show(Release):
+    """A TV show, ranked the same way as a :class:`Movie`."""
+
+
+class Episode(BaseModel):
+    episode_number: int
+    name: str
+
+
+class Season(BaseModel):
+    show_id: str
+    season_number: int
+    episodes: list[Episode]
+
+    def episode(self, number: int) -> Episode | None:
+        return next((e for e in self.episodes if e.episode_number == number), None)
+
+
 Transformer = Callable[[re.Match[str], "MediaInformation"], None]
 
 
+class TransformerScanner:
+    """Find the matches of all registered transformers in a single pass over a name.
+
+    All patterns are compiled into one alternation of named groups, so registering a
+    new transformer does not add another scan of the name. Patterns must not rely on
+    numbered backreferences nor global inline flags since they are embedded into a
+    bigger pattern.
+
+    >>> scanner = TransformerScanner()
+    >>> scanner.register(r"(cd|part)([0-9])", lambda match, info: None)
+    >>> scanner.register(r"VOSTFR", lambda match, info: None)
+    >>> name, matches = scanner.scan("Movie.VOSTFR.part2.VOSTFR.mkv")
+    >>> name
+    'Movie...VOSTFR.mkv'
+    >>> [match.groups() for match, _ in matches]
+    [('part', '2'), ()]
+    """
+
+    def __init__(self) -> None:
+        self._transformers: list[tuple[re.Pattern[str], Transformer]] = []
+        self._scanner: re.Pattern[str] | None = None
+
+    def __len__(self) -> int:
+        return len(self._transformers)
+
+    def register(self, pattern: str, transformer: Transformer) -> None:
+        self._transformers.append((re.compile(pattern), transformer))
+        # The combined pattern is compiled again on next scan
+        self._scanner = None
+
+    def scan(self, name: str) -> tuple[str, list[tuple[re.Match[str], Transformer]]]:
+        """Cut the first match of every transformer out of given name.
+
+        Return the remaining name along with the matches and their transformer, in
+        the order transformers have been registered.
+        """
+        if not self._transformers:
+            return name, []
+        if self._scanner is None:
+            self._scanner = self._compile()
+
+        found: dict[int, re.Match[str]] = {}
+        for combined_match in self._scanner.finditer(name):
+            index = int(combined_match.lastgroup[1:])  # type: ignore[index]
+            if index in found:
+                continue
+            # Match again with the transformer's own pattern for its groups to be
+            # numbered as the transformer expects
+            pattern, _ = self._transformers[index]
+            match = pattern.match(name, combined_match.start())
+            if match:
+                found[index] = match
+        if not found:
+            return name, []
+
+        parts, position = [], 0
+        for start, end in sorted(match.span() for match in found.values()):
+            parts.append(name[position:start])
+            position = end
+        parts.append(name[position:])
+
+        return "".join(parts), [
+            (found[index], self._transformers[index][1]) for index in sorted(found)
+        ]
+
+    def _compile(self) -> re.Pattern[str]:
+        # Each pattern is tagged by an empty group at its end rather than by a group
+        # wrapping it, so that the regex engine can still skip alternatives starting
+        # with a literal that does not match without entering them
+        scanner = "|".join(
+            f"(?:{pattern.pattern})(?P<t{index}>)"
+            for index, (pattern, _) in enumerate(self._transformers)
+        )
+        # It cannot skip positions quickly through an alternation like it does for a
+        # single pattern though, so help it with a lookahead on the characters a
+        # match can start with, as far as the (private) parser of the engine tells
+        if sre_parse is None:
+            return re.compile(scanner)
+        first_chars: set[str] = set()
+        for pattern, _ in self._transformers:
+            try:
+                chars = _first_chars(sre_parse.parse(pattern.pattern, pattern.flags))
+            except (AttributeError, TypeError, ValueError):
+                # Parsed patterns are laid out differently in this version of Python
+                chars = None
+            if chars is None or pattern.flags & re.IGNORECASE:
+                return re.compile(scanner)
+            first_chars |= chars
+        charset = "".join(re.escape(c) for c in sorted(first_chars))
+        return re.compile(f"(?=[{charset}])(?:{scanner})")
+
+
+def _first_chars(parsed: Any) -> set[str] | None:
+    """Return the characters a parsed pattern can start with, ``None`` if unknown.
+
+    >>> sorted(_first_chars(sre_parse.parse(r"(cd|dvd|part)[0-9]")))
+    ['c', 'd', 'p']
+    >>> _first_chars(sre_parse.parse(r"(?i)vostfr|.*")) is None
+    True
+    """
+    if not parsed:
+        return None
+    op, av = parsed[0]
+    if op is sre.LITERAL:
+        return {chr(av)}
+    if op is sre.IN:
+        chars = set()
+        for item_op, item_av in av:
+            if item_op is sre.LITERAL:
+                chars.add(chr(item_av))
+            elif item_op is sre.RANGE and item_av[1] - item_av[0] < 128:
+                chars.update(map(chr, range(item_av[0], item_av[1] + 1)))
+            else:
+                return None
+        return chars
+    if op is sre.SUBPATTERN:
+        _, add_flags, _, subpattern = av
+        return None if add_flags & re.IGNORECASE else _first_chars(subpattern)
+    if op is sre.BRANCH:
+        chars = set()
+        for branch in av[1]:
+            branch_chars = _first_chars(branch)
+            if branch_chars is None:
+                return None
+            chars |= branch_chars
+        return chars
+    if op in (sre.MAX_REPEAT, sre.MIN_REPEAT) and av[0] >= 1:
+        return _first_chars(av[2])
+    return None
+
+
 class MediaInformation(BaseModel):
-    transformers: ClassVar[list[tuple[re.Pattern[str], Transformer]]] = []
+    transformers: ClassVar[TransformerScanner] = TransformerScanner()
 
     # Info that will always be uniques (never lists)
     episode_name: str | None = Field(None, alias="episodeName")
@@ -90,7 +253,7 @@ class MediaInformation(BaseModel):
     @classmethod
     def search(cls, pattern: str) -> Callable[[Transformer], None]:
         def wrapper(fn: Transformer) -> None:
-            cls.transformers.append((re.compile(pattern), fn))
+            cls.transformers.register(pattern, fn)
 
         return wrapper
 
@@ -99,22 +262,15 @@ class MediaInformation(BaseModel):
         """Extract media information from given filename.
 
         Ensure media information properly parse strings
-        >>> MediaInformation.from_str("Deadliest.Catch.S00E66.No.Safe.Passage.720p.AMZN.WEB-DL.DDP2.0.H.264-NTb[TGx]")
+        >>> MediaInformation.from_filename("Deadliest.Catch.S00E66.No.Safe.Passage.720p.AMZN.WEB-DL.DDP2.0.H.264-NTb[TGx]")
         MediaInformation(...)
-        >>> MediaInformation.from_str("Insecure.S04.COMPLETE.720p.AMZN.WEBRip.x264-GalaxyTV")
+        >>> MediaInformation.from_filename("Insecure.S04.COMPLETE.720p.AMZN.WEBRip.x264-GalaxyTV")
         MediaInformation(...)
-        >>> MediaInformation.from_str("Vacancy (2007) 720p Bluray Dual Audio [Hindi + English] ⭐800 MB⭐ DD - 2.0 MSub x264 - Shadow (BonsaiHD)")
+        >>> MediaInformation.from_filename("Vacancy (2007) 720p Bluray Dual Audio [Hindi + English] ⭐800 MB⭐ DD - 2.0 MSub x264 - Shadow (BonsaiHD)")
         MediaInformation(...)
         """
-        matched_transformers: list[tuple[re.Match[str], Transformer]] = []
-        for pattern, transformer in cls.transformers:
-            match = pattern.search(name)
-            if not match:
-                continue
-            # Removed matched content to avoid duplicate matches
-            name = name.replace(match.group(), "")
-            matched_transformers.append((match, transformer))
-
+        # Removed matched content to avoid duplicate matches
+        name, matched_transformers = cls.transformers.scan(name)
         content = PTN.parse(name, standardise=True, coherent_types=True)
         content.update(file_ext=Path(name).suffix)
         info = cls.model_validate(content)
@@ -129,6 +285,12 @@ class MediaInformation(BaseModel):
         self.year = [movie.release_year]
         self.source = MediaSource(name=movie.source_name, media_id=movie.id)
 
+    def update_from_show(self, show: Show, episodes: list[Episode]) -> None:
+        self.title = show.title
+        self.year = [show.release_year]
+        self.source = MediaSource(name=show.source_name, media_id=show.id)
+        self.episode_name = " & ".join(e.name for e in episodes if e.name) or None
+
 
 class MediaSource(BaseModel):
     name: str
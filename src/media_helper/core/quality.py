@@ -0,0 +1,74 @@
+import re
+from collections.abc import Iterable
+from typing import NamedTuple
+
+# Rank of the qualities told by file names (see PTN), the higher the better
+QUALITY_RANKS = {
+    "Cam": 1,
+    "Telesync": 1,
+    "Workprint": 1,
+    "Telecine": 2,
+    "Screener": 2,
+    "PDTV": 3,
+    "DSRip": 3,
+    "TVRip": 3,
+    "VODRip": 3,
+    "Pay-Per-View Rip": 3,
+    "DVD-Rip": 4,
+    "DVD-R": 4,
+    "AHDTV": 5,
+    "HDTV": 5,
+    "HD-Rip": 5,
+    "HDLight": 5,
+    "WEBCap": 5,
+    "WEBRip": 6,
+    "WEB-DL": 7,
+    "Digital Distribution Copy": 7,
+    "BRRip": 7,
+    "BDRip": 7,
+    "HD DVD": 7,
+    "Blu-ray": 8,
+}
+CODEC_RANKS = {"H.264": 1, "H.265": 2}
+# Resolutions not telling their number of lines
+_NAMED_RESOLUTIONS = {"4K": 2160, "5K": 2880, "8K": 4320}
+
+
+class QualityScore(NamedTuple):
+    """Quality of a copy of a media, the greater the better.
+
+    Criteria are compared in order: resolution (in lines), then quality (see
+    :data:`QUALITY_RANKS`) and codec. Unknown values rank lowest.
+    """
+
+    resolution: int
+    quality: int
+    codec: int
+
+    @classmethod
+    def of(
+        cls,
+        resolutions: Iterable[str],
+        qualities: Iterable[str],
+        codecs: Iterable[str],
+    ) -> "QualityScore":
+        """Score a copy of a media from what its name tells.
+
+        >>> QualityScore.of(["1080p"], ["WEB-DL"], ["H.264"])
+        QualityScore(resolution=1080, quality=7, codec=1)
+        >>> QualityScore.of(["4K"], [], []) > QualityScore.of(["1080p"], ["Blu-ray"], [])
+        True
+        """
+        return cls(
+            max(map(resolution_lines, resolutions), default=0),
+            max((QUALITY_RANKS.get(q, 0) for q in qualities), default=0),
+            max((CODEC_RANKS.get(c, 0) for c in codecs), default=0),
+        )
+
+
+def resolution_lines(resolution: str) -> int:
+    """Return the number of lines of given resolution, 0 when unknown."""
+    if resolution in _NAMED_RESOLUTIONS:
+        return _NAMED_RESOLUTIONS[resolution]
+    match = re.fullmatch(r"([0-9]{3,4})[pi]", resolution)
+    return int(match.group(1)) if match else 0
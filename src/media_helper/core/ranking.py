@@ -0,0 +1,100 @@
+import difflib
+import math
+from collections.abc import Iterable
+from typing import Generic, NamedTuple, Protocol, TypeVar
+
+from .text import normalize_title
+
+# How much every criterion weights in the score of a movie, summing up to 1
+TITLE_WEIGHT = 0.6
+YEAR_WEIGHT = 0.2
+POPULARITY_WEIGHT = 0.1
+VOTE_COUNT_WEIGHT = 0.1
+
+
+class Rankable(Protocol):
+    """What ranking needs to know about a movie, or about a show."""
+
+    @property
+    def title(self) -> str: ...
+    @property
+    def original_title(self) -> str: ...
+    @property
+    def release_year(self) -> int: ...
+    @property
+    def popularity(self) -> float: ...
+    @property
+    def vote_count(self) -> int: ...
+
+
+M = TypeVar("M", bound=Rankable)
+
+
+class ScoredMovie(NamedTuple, Generic[M]):
+    movie: M
+    # Between 0 and 1, the higher the more likely the movie is the searched one
+    score: float
+
+
+def title_similarity(title: str, movie: Rankable) -> float:
+    """Return how similar given title is to the title or original title of a movie.
+
+    >>> from media_helper.core.model import Movie
+    >>> movie = Movie(id="194", title="Le Fabuleux Destin d'Amélie Poulain",
+    ...     original_title="Le Fabuleux Destin d'Amélie Poulain", release_year=2001,
+    ...     source_name="tmdb", link="", popularity=1, vote_average=1, vote_count=1)
+    >>> title_similarity("Le Fabuleux Destin d Amelie Poulain", movie)
+    1.0
+    """
+    normalized = normalize_title(title)
+    return max(
+        difflib.SequenceMatcher(None, normalized, normalize_title(t)).ratio()
+        for t in (movie.title, movie.original_title)
+    )
+
+
+def year_similarity(year: int | None, movie: Rankable) -> float:
+    if year is None:
+        # Does not tell movies apart
+        return 0.0
+    if year == movie.release_year:
+        return 1.0
+    # Movies are often released a year apart from one country to another
+    return 0.5 if abs(year - movie.release_year) == 1 else 0.0
+
+
+def rank_movies(
+    movies: Iterable[M], title: str, year: int | None = None
+) -> list[ScoredMovie[M]]:
+    """Score given movies found when searching given title and year, best first.
+
+    Popularity and vote count are only compared between given movies, on a log scale
+    since they span several orders of magnitude.
+    """
+    movies = list(movies)
+    max_popularity = math.log1p(max((m.popularity for m in movies), default=0))
+    max_vote_count = math.log1p(max((m.vote_count for m in movies), default=0))
+
+    def relative(value: float, maximum: float) -> float:
+        return math.log1p(value) / maximum if maximum else 0.0
+
+    scored = [
+        ScoredMovie(
+            movie,
+            TITLE_WEIGHT * title_similarity(title, movie)
+            + YEAR_WEIGHT * year_similarity(year, movie)
+            + POPULARITY_WEIGHT * relative(movie.popularity, max_popularity)
+            + VOTE_COUNT_WEIGHT * relative(movie.vote_count, max_vote_count),
+        )
+        for movie in movies
+    ]
+    return sorted(scored, key=lambda s: s.score, reverse=True)
+
+
+def confident_winner(ranked: list[ScoredMovie[M]], margin: float) -> M | None:
+    """Return the best ranked movie if it beats the next one by at least ``margin``."""
+    if not ranked:
+        return None
+    if len(ranked) == 1 or ranked[0].score - ranked[1].score >= margin:
+        return ranked[0].movie
+    return None
@@ -0,0 +1,228 @@
+"""Naming templates, compiled once into functions formatting media information.
+
+A template is text with fields between braces, e.g. ``{title} ({year}){ext}``, and
+optional sections between angle brackets, e.g. ``< - {split}>``. A section is left
+out when any of its fields is missing, while a missing field out of any section is
+an error. Fields accept a format specification like :meth:`str.format` does (e.g.
+``{season:02}``), and ``{{`` and ``}}`` stand for literal braces. Angle brackets
+need no escaping since they are not allowed in Windows file names anyway.
+
+Available fields are listed in :data:`FIELDS`.
+"""
+
+import re
+import string
+from collections.abc import Callable, Iterable
+from typing import Any
+
+from .compact import CompactMediaInformation
+from .model import MediaInformation
+
+# Compact media information is formatted just the same
+Media = MediaInformation | CompactMediaInformation
+
+
+def _clean(text: str | None) -> str | None:
+    # Colons are not allowed in Windows file names
+    return " ".join(text.replace(":", " - ").split()) if text else None
+
+
+def _joined(values: Iterable[str]) -> str | None:
+    return " ".join(values) or None
+
+
+def _edition(media: Media) -> str | None:
+    tags = []
+    if media.directors_cut:
+        tags.append("Director's Cut")
+    if media.international_cut:
+        tags.append("International's Cut")
+    if media.unrated:
+        tags.append("Unrated")
+    if media.remastered:
+        tags.append("Remastered")
+    if media.limited:
+        tags.append("Limited Edition")
+    if media.extended:
+        tags.append("Extended Edition")
+    return _joined(tags)
+
+
+def _quality(media: Media) -> str | None:
+    items = [*media.quality, *media.resolution]
+    if media.proper:
+        items.append("Proper")
+    if media.upscaled:
+        items.append("Upscaled")
+    if media.widescreen:
+        items.append("Widescreen")
+    return _joined(items)
+
+
+def _metadata(media: Media) -> str | None:
+    metadata = [
+        _quality(media),
+        "3D" if media.is_3d else None,
+        "HDR" if media.hdr else None,
+        " ".join(media.audio),
+        " ".join(media.language),
+        " ".join(media.subtitles),
+        " ".join(media.codec),
+    ]
+    return "".join(f"[{m}]" for m in metadata if m) or None
+
+
+# Fields available in templates, along with the type of their values and the
+# expression getting them from ``media``
+FIELDS: dict[str, tuple[type, str]] = {
+    "title": (str, "_clean(media.title)"),
+    "year": (int, "v[0] if (v := media.year) else None"),
+    "source_name": (str, "source.name if (source := media.source) else None"),
+    "source_id": (str, "source.media_id if (source := media.source) else None"),
+    "edition": (str, "_edition(media)"),
+    "split": (str, "media.split_name"),
+    "quality": (str, "_quality(media)"),
+    "audio": (str, "_joined(media.audio)"),
+    "language": (str, "_joined(media.language)"),
+    "subtitles": (str, "_joined(media.subtitles)"),
+    "codec": (str, "_joined(media.codec)"),
+    "metadata": (str, "_metadata(media)"),
+    "season": (int, "v[0] if (v := media.season) else None"),
+    "episode": (int, "v[0] if (v := media.episode) else None"),
+    # Only for files holding many episodes
+    "last_episode": (int, "e[-1] if len(e := media.episode) > 1 else None"),
+    "episode_name": (str, "_clean(media.episode_name)"),
+    "ext": (str, "media.file_ext"),
+}
+
+# Format specifications allowed, the standard ones without exotic fill characters
+_SPEC = re.compile(r"[\w<>=^+\- #,.%]*")
+
+# Names of fields in error messages, for the ones not telling by themselves
+_DESCRIPTIONS = {"year": "release year"}
+
+
+class NamingTemplate:
+    """A template compiled into a function formatting media information.
+
+    The template is parsed and validated once, unknown fields and invalid format
+    specifications raising a :class:`ValueError`. It is then compiled into the
+    source of a function getting the values of the fields used (every one once) and
+    joining them with a single f-string. Literal text is escaped as string literals,
+    so that only field expressions and format specifications are actual code.
+
+    >>> template = NamingTemplate("{title} ({year})< - {split}>{ext}")
+    >>> template(MediaInformation.from_filename("Inception.2010.cd1.mkv"))
+    'Inception (2010) - cd1.mkv'
+    >>> template(MediaInformation.from_filename("Inception.2010.mkv"))
+    'Inception (2010).mkv'
+    >>> template(MediaInformation.from_filename("Inception.mkv"))
+    Traceback (most recent call last):
+    ...
+    ValueError: Media has no release year
+    >>> NamingTemplate("{title} {tmdb_id}")
+    Traceback (most recent call last):
+    ...
+    ValueError: Unknown field 'tmdb_id' in naming template '{title} {tmdb_id}'
+    """
+
+    __slots__ = ("template", "fields", "format")
+
+    format: Callable[[Media], str]
+
+    def __init__(self, template: str) -> None:
+        self.template = template
+        # Names of the fields used, in order of first use
+        self.fields: list[str] = []
+        # Source of the f-string parts of every section, and the names of its fields
+        sections: list[tuple[list[str], list[str]]] = [([], [])]
+        in_section = False
+        # Fields out of any section
+        required: list[str] = []
+
+        def fail(reason: str) -> ValueError:
+            return ValueError(f"{reason} in naming template {template!r}")
+
+        def add_text(text: str) -> None:
+            if text:
+                escaped = text.replace("{", "{{").replace("}", "}}")
+                sections[-1][0].append("f" + repr(escaped))
+
+        try:
+            parsed = list(string.Formatter().parse(template))
+        except ValueError as error:
+            raise fail(str(error).capitalize()) from None
+        for literal, name, spec, conversion in parsed:
+            text = ""
+            for char in literal:
+                if char not in "<>":
+                    text += char
+                    continue
+                if (char == "<") == in_section:
+                    raise fail(f"Unbalanced {char!r}")
+                add_text(text)
+                text = ""
+                in_section = not in_section
+                sections.append(([], []))
+            add_text(text)
+            if name is None:
+                continue
+            if name not in FIELDS:
+                raise fail(f"Unknown field {name!r}")
+            try:
+                if conversion or not _SPEC.fullmatch(spec or ""):
+                    raise ValueError
+                format(FIELDS[name][0](), spec or "")
+            except ValueError:
+                raise fail(f"Invalid format of field {name!r}") from None
+            if name not in self.fields:
+                self.fields.append(name)
+            parts, names = sections[-1]
+            parts.append(f"f'{{{name}:{spec}}}'" if spec else f"f'{{{name}}}'")
+            (names if in_section else required).append(name)
+        if in_section:
+            raise fail("Unclosed '<'")
+
+        lines = ["def format(media):"]
+        for name in self.fields:
+            lines.append(f"    {name} = {FIELDS[name][1]}")
+        for name in dict.fromkeys(required):
+            lines.append(f"    if {name} is None: raise _missing({name!r})")
+        joined = []
+        for index, (parts, names) in enumerate(sections):
+            if not parts:
+                continue
+            fstring = " ".join(parts)
+            if index % 2 and names:
+                # Optional sections are formatted first, then joined to the rest
+                condition = " and ".join(
+                    f"{n} is not None" for n in dict.fromkeys(names)
+                )
+                lines.append(f'    _s{index} = {fstring} if {condition} else ""')
+                fstring = f"f'{{_s{index}}}'"
+            joined.append(fstring)
+        lines.append(f"    return {' '.join(joined) or repr('')}")
+        namespace: dict[str, Any] = {
+            "_clean": _clean,
+            "_joined": _joined,
+            "_edition": _edition,
+            "_quality": _quality,
+            "_metadata": _metadata,
+            "_missing": _missing,
+        }
+        exec(compile("\n".join(lines), f"<{template}>", "exec"), namespace)
+        self.format = namespace["format"]
+
+    def __call__(self, media: Media) -> str:
+        return self.format(media)
+
+    def format_many(self, medias: Iterable[Media]) -> list[str]:
+        """Format many media information at once, in the same order."""
+        return list(map(self.format, medias))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.template!r})"
+
+
+def _missing(name: str) -> ValueError:
+    return ValueError(f"Media has no {_DESCRIPTIONS.get(name, name)}")
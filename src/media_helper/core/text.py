@@ -0,0 +1,19 @@
+import re
+import unicodedata
+
+_NON_ALPHANUMERIC = re.compile(r"[\W_]+")
+
+
+def normalize_title(title: str) -> str:
+    """Normalize given title for comparing it with other titles.
+
+    Case, accents and punctuation are ignored.
+
+    >>> normalize_title("Le Fabuleux Destin d'Amélie Poulain")
+    'le fabuleux destin d amelie poulain'
+    >>> normalize_title("Spider-Man: No Way Home")
+    'spider man no way home'
+    """
+    decomposed = unicodedata.normalize("NFKD", title)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return _NON_ALPHANUMERIC.sub(" ", stripped.casefold()).strip()
@@ -1,6 +1,9 @@
+from collections.abc import Iterable
+from pathlib import Path
 from typing import ClassVar, Protocol
 
-from media_helper.core.model import Movie
+from media_helper.core.library import FileKey, LibraryEntry
+from media_helper.core.model import Movie, Season, Show
 
 
 class MovieNotFoundError(Exception):
@@ -13,8 +16,65 @@ class ManyMoviesFoundError(Exception):
         self.movies = movies
 
 
+class ShowNotFoundError(Exception):
+    pass
+
+
+class ManyShowsFoundError(Exception):
+    def __init__(self, msg: str, shows: list[Show]) -> None:
+        super().__init__(msg)
+        self.shows = shows
+
+
+class EpisodeNotFoundError(Exception):
+    pass
+
+
 class MovieDatabase(Protocol):
     SOURCE: ClassVar[str]
 
     def search(self, query: str, release_year: int | None = None) -> list[Movie]: ...
     def get(self, id: str) -> Movie | None: ...
+    # Movie having given id in another database, e.g. ``find("imdb", "tt1375666")``
+    def find(self, source: str, id: str) -> Movie | None: ...
+
+
+class AsyncMovieDatabase(Protocol):
+    SOURCE: ClassVar[str]
+
+    async def search(
+        self, query: str, release_year: int | None = None
+    ) -> list[Movie]: ...
+    async def get(self, id: str) -> Movie | None: ...
+    async def find(self, source: str, id: str) -> Movie | None: ...
+
+
+class AsyncTvDatabase(Protocol):
+    SOURCE: ClassVar[str]
+
+    async def search_shows(
+        self, query: str, first_air_year: int | None = None
+    ) -> list[Show]: ...
+    async def get_show(self, id: str) -> Show | None: ...
+    async def get_season(self, show_id: str, season_number: int) -> Season | None: ...
+
+
+class ContentIndex(Protocol):
+    """Remember the movie of files by the hash of their content."""
+
+    def movies(self, hashes: Iterable[str]) -> dict[str, Movie]: ...
+    def remember(self, movies: Iterable[tuple[str, Movie]]) -> None: ...
+
+
+class LibraryIndex(Protocol):
+    """Remember the files of the organized library, by the media they are about."""
+
+    def roots(self) -> list[Path]: ...
+    def files(self) -> dict[Path, FileKey]: ...
+    def update(
+        self,
+        roots: Iterable[Path],
+        entries: Iterable[LibraryEntry],
+        removed: Iterable[Path],
+    ) -> None: ...
+    def by_source(self) -> dict[str, list[LibraryEntry]]: ...
@@ -0,0 +1,121 @@
+"""Lightweight timing of the stages of a run, enabled by ``--profile``.
+
+Code to time is wrapped in :func:`span` blocks named after the stage they belong to
+(e.g. ``tmdb.search``), and noteworthy events are counted with :func:`count` (e.g.
+``tmdb.cache.hit``). Both cost next to nothing until profiling is enabled with
+:func:`enable`, so that they can stay in hot paths.
+
+Spans measure wall time, so the span of an awaited operation includes the time
+spent waiting for it, and spans of concurrent operations overlap. Work done in other
+processes (e.g. parsing many files) is not timed.
+"""
+
+import contextlib
+import math
+import threading
+import time
+from collections import defaultdict
+from types import TracebackType
+from typing import Any
+
+
+class Profiler:
+    """Collect the durations of spans and the values of counters."""
+
+    def __init__(self) -> None:
+        self.started_at = time.perf_counter()
+        self._durations: defaultdict[str, list[float]] = defaultdict(list)
+        self._counters: defaultdict[str, int] = defaultdict(int)
+        # Spans may end in worker threads, e.g. when renaming files
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, duration: float) -> None:
+        with self._lock:
+            self._durations[stage].append(duration)
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += n
+
+    def summary(self) -> dict[str, Any]:
+        """Return the statistics of every stage (in seconds) and the counters.
+
+        >>> profiler = Profiler()
+        >>> for duration in (0.5, 0.25, 1.0, 0.25):
+        ...     profiler.record("parse", duration)
+        >>> profiler.count("tmdb.cache.hit")
+        >>> summary = profiler.summary()
+        >>> summary["stages"]["parse"]
+        {'count': 4, 'total': 2.0, 'p50': 0.25, 'p95': 1.0, 'max': 1.0}
+        >>> summary["counters"]
+        {'tmdb.cache.hit': 1}
+        """
+        with self._lock:
+            durations = {stage: sorted(d) for stage, d in self._durations.items()}
+            counters = dict(sorted(self._counters.items()))
+        return {
+            "elapsed": time.perf_counter() - self.started_at,
+            "stages": {
+                stage: {
+                    "count": len(values),
+                    "total": sum(values),
+                    "p50": _percentile(values, 50),
+                    "p95": _percentile(values, 95),
+                    "max": values[-1],
+                }
+                for stage, values in sorted(durations.items())
+            },
+            "counters": counters,
+        }
+
+
+def _percentile(values: list[float], percent: float) -> float:
+    # Nearest-rank percentile of sorted values
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+class _Span:
+    __slots__ = ("profiler", "stage", "start")
+
+    def __init__(self, profiler: Profiler, stage: str) -> None:
+        self.profiler = profiler
+        self.stage = stage
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.profiler.record(self.stage, time.perf_counter() - self.start)
+
+
+_profiler: Profiler | None = None
+_DISABLED = contextlib.nullcontext()
+
+
+def enable() -> Profiler:
+    """Start profiling, dropping what may have been collected so far."""
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+
+def disable() -> None:
+    global _profiler
+    _profiler = None
+
+
+def span(stage: str) -> contextlib.AbstractContextManager[None]:
+    """Time the enclosed block as part of given stage."""
+    profiler = _profiler
+    return _DISABLED if profiler is None else _Span(profiler, stage)
+
+
+def count(name: str, n: int = 1) -> None:
+    """Increment the counter having given name."""
+    if _profiler is not None:
+        _profiler.count(name, n)
@@ -1,3 +1,15 @@
-from .movie import MovieService
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .movie import MovieService
 
 __all__ = ["MovieService"]
+
+
+def __getattr__(name: str) -> Any:
+    # The movie service depends on heavy libraries, only import it once actually used
+    if name == "MovieService":
+        from .movie import MovieService
+
+        return MovieService
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,113 @@
+import mmap
+import os
+import struct
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import NamedTuple
+
+from ..core.library import FileKey
+
+VIDEO_EXTENSIONS = frozenset(
+    {
+        ".avi",
+        ".divx",
+        ".flv",
+        ".iso",
+        ".m2ts",
+        ".m4v",
+        ".mkv",
+        ".mov",
+        ".mp4",
+        ".mpeg",
+        ".mpg",
+        ".ogm",
+        ".ts",
+        ".webm",
+        ".wmv",
+    }
+)
+
+# Size of the chunks read at both ends of a file for hashing its content
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class VideoFile(NamedTuple):
+    path: Path
+    key: FileKey
+
+
+def scan_videos(
+    paths: Iterable[Path],
+    extensions: Iterable[str] = VIDEO_EXTENSIONS,
+    min_size: int = 0,
+) -> Iterator[VideoFile]:
+    """Yield the video files at given paths, recursively for directories.
+
+    Files found in directories are filtered by (case insensitive) extension and by
+    size while given files are always yielded. Hidden directories are not walked.
+    Only video files are stat-ed, so that walking a big directory tree mostly costs
+    reading directories.
+    """
+    extensions = frozenset(ext.lower() for ext in extensions)
+
+    def has_video_ext(name: str) -> bool:
+        return os.path.splitext(name)[1].lower() in extensions
+
+    for path in paths:
+        if not path.is_dir():
+            yield VideoFile(path, FileKey.from_stat(path.stat()))
+            continue
+
+        directories = [os.fspath(path)]
+        while directories:
+            subdirectories = []
+            with os.scandir(directories.pop()) as entries:
+                for entry in sorted(entries, key=lambda e: e.name):
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith("."):
+                            subdirectories.append(entry.path)
+                    elif entry.is_file() and has_video_ext(entry.name):
+                        stat = entry.stat()
+                        if stat.st_size >= min_size:
+                            yield VideoFile(Path(entry.path), FileKey.from_stat(stat))
+            # Walk subdirectories in alphabetical order
+            directories.extend(reversed(subdirectories))
+
+
+def content_hash(path: Path) -> str:
+    """Return the hash of the content of a file, as computed by OpenSubtitles.
+
+    The hash is the sum of the file size and of the 64 bits (little endian) words of
+    its first and last 64 KiB, so that it only costs reading 128 KiB even for huge
+    files. It is the same for identical files, whatever their name or location.
+    """
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        total = size
+        if size:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for start in (0, max(0, size - HASH_CHUNK_SIZE)):
+                    chunk = data[start : start + HASH_CHUNK_SIZE]
+                    chunk += bytes(-len(chunk) % 8)
+                    total += sum(struct.unpack(f"<{len(chunk) // 8}Q", chunk))
+    return f"{total & 0xFFFF_FFFF_FFFF_FFFF:016x}"
+
+
+def content_hashes(paths: Iterable[Path], workers: int = 8) -> dict[Path, str]:
+    """Return the content hashes of given files, ignoring files that cannot be read.
+
+    Files are read by a pool of ``workers`` threads, since reading them mostly means
+    waiting for the disk.
+    """
+
+    def hash_file(path: Path) -> str | None:
+        try:
+            return content_hash(path)
+        except OSError:
+            return None
+
+    paths = list(paths)
+    with ThreadPoolExecutor(workers) as pool:
+        hashes = pool.map(hash_file, paths)
+        return {path: hash for path, hash in zip(paths, hashes) if hash}
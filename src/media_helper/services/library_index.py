@@ -0,0 +1,91 @@
+from collections.abc import Iterable
+from enum import StrEnum
+from pathlib import Path
+from typing import NamedTuple
+
+from ..core.library import FileKey, LibraryEntry
+from ..core.model import MediaInformation
+from ..core.quality import CODEC_RANKS, QUALITY_RANKS, resolution_lines
+from ..ports import LibraryIndex
+from .library import scan_videos
+
+
+class IndexUpdate(NamedTuple):
+    added: int
+    updated: int
+    removed: int
+    unchanged: int
+
+
+class LibraryStatus(StrEnum):
+    # The media is not in the library yet
+    NEW = "new"
+    # The library has a copy of the media that is at least as good
+    DUPLICATE = "duplicate"
+    # The library only has copies of the media that are not as good
+    UPGRADE = "upgrade"
+
+
+def library_entry(path: Path, key: FileKey, name: str | None = None) -> LibraryEntry:
+    """Return the library entry of a file, from its name or from given ``name``."""
+    media_info = MediaInformation.from_filename(name or path.name)
+    source = media_info.source
+    return LibraryEntry(
+        path,
+        key,
+        f"{source.name}-{source.media_id}" if source else None,
+        max(media_info.resolution, key=resolution_lines, default=None),
+        max(media_info.quality, key=lambda q: QUALITY_RANKS.get(q, 0), default=None),
+        max(media_info.codec, key=lambda c: CODEC_RANKS.get(c, 0), default=None),
+    )
+
+
+def update_library_index(
+    index: LibraryIndex, roots: Iterable[Path], min_size: int = 0
+) -> IndexUpdate:
+    """Index the video files found in given directories.
+
+    Only the names of the files added or modified since the last update are parsed,
+    and the files no longer found in given directories are forgotten.
+    """
+    roots = list(roots)
+    known = index.files()
+    seen = set()
+    entries = []
+    added = 0
+    for video in scan_videos(roots, min_size=min_size):
+        seen.add(video.path)
+        key = known.get(video.path)
+        if key != video.key:
+            entries.append(library_entry(video.path, video.key))
+            added += key is None
+    removed = [
+        path
+        for path in known
+        if path not in seen and any(path.is_relative_to(root) for root in roots)
+    ]
+    index.update(roots, entries, removed)
+    return IndexUpdate(
+        added, len(entries) - added, len(removed), len(seen) - len(entries)
+    )
+
+
+def library_status(
+    entry: LibraryEntry, library: dict[str, list[LibraryEntry]]
+) -> tuple[LibraryStatus, list[LibraryEntry]]:
+    """Tell whether a file brings a new media, a duplicate or an upgrade to the library.
+
+    ``library`` is the mapping returned by :meth:`LibraryIndex.by_source`. The copies
+    of the media already in the library are returned as well, the file itself
+    excepted (e.g. when renaming a file of the library).
+    """
+    copies = [
+        copy
+        for copy in library.get(entry.source or "", [])
+        if copy.path != entry.path and copy.key[:2] != entry.key[:2]
+    ]
+    if not copies:
+        return LibraryStatus.NEW, copies
+    if max(copy.score for copy in copies) >= entry.score:
+        return LibraryStatus.DUPLICATE, copies
+    return LibraryStatus.UPGRADE, copies
@@ -1,14 +1,30 @@
+import asyncio
+import itertools
+import os
+from collections import deque
+from collections.abc import AsyncGenerator, Iterable, Iterator, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
 from typing import Any, NamedTuple
 
+from .. import profiling
 from ..core.formatter import PlexMediaFileNameFormatter
 from ..core.model import (
     MediaInformation,
+    MediaSource,
+    Movie,
 )
+from ..core.ranking import confident_winner, rank_movies
+from ..core.text import normalize_title
 from ..ports import (
+    AsyncMovieDatabase,
+    ContentIndex,
     ManyMoviesFoundError,
     MovieDatabase,
     MovieNotFoundError,
 )
+from .library import content_hash, content_hashes
+from .rename import DuplicateDestinationError, RenameOperation
 
 
 class FormattedMediaInformation(NamedTuple):
@@ -17,49 +33,428 @@ class FormattedMediaInformation(NamedTuple):
     link: str
 
 
+class MovieKey(NamedTuple):
+    """Identify the movie a file is about, as far as its name tells.
+
+    All the parts of a movie split on several files, as well as copies of a movie,
+    share the same key. When trusted, the ``source`` the file is tagged with (e.g.
+    ``tmdb-27205``) tells apart movies having the same title and year.
+    """
+
+    title: str
+    year: int | None
+    source: str | None = None
+
+    @classmethod
+    def from_media_info(
+        cls, media_info: MediaInformation, source: MediaSource | None = None
+    ) -> "MovieKey":
+        year = media_info.year[0] if media_info.year else None
+        return cls(
+            normalize_title(media_info.title or ""),
+            year,
+            f"{source.name}-{source.media_id}" if source else None,
+        )
+
+
+class PlannedRename(NamedTuple):
+    """Outcome of resolving the movie file at ``source``.
+
+    ``result`` is either the formatted media information or the error that prevented
+    formatting it (e.g. :class:`ManyMoviesFoundError` when the movie is ambiguous).
+    Files having the same ``key`` are about the same movie.
+    """
+
+    source: Path
+    output_dir: Path
+    result: FormattedMediaInformation | Exception
+    key: MovieKey | None = None
+
+    @property
+    def operation(self) -> RenameOperation | None:
+        if isinstance(self.result, Exception):
+            return None
+        return RenameOperation(
+            self.source, self.output_dir / self.result.dirname / self.result.filename
+        )
+
+
+def reject_duplicate_destinations(plan: Iterable[PlannedRename]) -> list[PlannedRename]:
+    """Return given plan, failing the files renamed to the same destination as a
+    previous one with :class:`DuplicateDestinationError`, so no file overwrites another.
+    """
+    claimed: dict[Path, Path] = {}
+    checked = []
+    for entry in plan:
+        operation = entry.operation
+        if operation is not None:
+            first = claimed.setdefault(operation.destination, entry.source)
+            if first != entry.source:
+                error = DuplicateDestinationError(f"Same destination as {first.name}")
+                entry = entry._replace(result=error)
+        checked.append(entry)
+    return checked
+
+
+class ParseResult(NamedTuple):
+    path: str
+    media_info: dict[str, Any] | None = None
+    error: str | None = None
+
+
+def _parse_files(paths: list[str]) -> list[ParseResult]:
+    """Parse the names of given files, meant to be run in worker processes."""
+    results = []
+    for path in paths:
+        try:
+            with profiling.span("movie.parse"):
+                media_info = MediaInformation.from_filename(os.path.basename(path))
+        except Exception as error:
+            results.append(ParseResult(path, error=f"{type(error).__name__}: {error}"))
+        else:
+            dump = media_info.model_dump(mode="json", exclude_defaults=True)
+            results.append(ParseResult(path, dump))
+    return results
+
+
+def _chunked(items: Iterable[str], size: int) -> Iterator[list[str]]:
+    iterator = iter(items)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
 class MovieService:
-    def __init__(self, moviedb: MovieDatabase) -> None:
+    def __init__(
+        self,
+        moviedb: MovieDatabase | None = None,
+        async_moviedb: AsyncMovieDatabase | None = None,
+        confidence_margin: float = 0.15,
+        content_index: ContentIndex | None = None,
+        formatter: PlexMediaFileNameFormatter | None = None,
+        trust_sources: bool = False,
+    ) -> None:
         self.moviedb = moviedb
-        self.formatter = PlexMediaFileNameFormatter()
+        self.async_moviedb = async_moviedb
+        # Movies of already resolved files, looked up before any movie database
+        self.content_index = content_index
+        # How much the best movie found must outscore the next one to be selected
+        # without asking, see :func:`rank_movies`
+        self.confidence_margin = confidence_margin
+        self.formatter = formatter or PlexMediaFileNameFormatter()
+        # Whether files tagged with the id of their movie (e.g. ``{imdb-tt1375666}``)
+        # are resolved by that id, without searching nor asking anything
+        self.trust_sources = trust_sources
 
     def parse_filename(self, filename: str) -> dict[str, Any]:
-        media_info = MediaInformation.from_filename(filename)
-        return media_info.model_dump(exclude_defaults=True)
+        with profiling.span("movie.parse"):
+            media_info = MediaInformation.from_filename(filename)
+            return media_info.model_dump(exclude_defaults=True)
+
+    def parse_files(
+        self,
+        paths: Iterable[str],
+        workers: int | None = None,
+        chunksize: int = 256,
+    ) -> Iterator[ParseResult]:
+        """Parse the names of many files using a pool of ``workers`` processes.
+
+        Paths are consumed lazily and sent to workers by chunks, with a bounded number
+        of chunks in flight, so that memory use does not depend on how many paths are
+        given. Results are yielded as soon as they are available, thus not necessarily
+        in the same order as given paths.
+        """
+        workers = workers or os.cpu_count() or 1
+        chunks = _chunked(paths, chunksize)
+        first_chunks = list(itertools.islice(chunks, 2))
+        if workers == 1 or len(first_chunks) < 2:
+            # Not worth paying for starting worker processes
+            for chunk in itertools.chain(first_chunks, chunks):
+                yield from _parse_files(chunk)
+            return
+
+        with ProcessPoolExecutor(workers) as pool:
+            pending: set[Future[list[ParseResult]]] = set()
+            for chunk in itertools.chain(first_chunks, chunks):
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from future.result()
+                pending.add(pool.submit(_parse_files, chunk))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
 
     def format_filename(
         self, filename: str, movie_id: str | None = None
     ) -> FormattedMediaInformation:
         """Format given filename as a movie media using plex naming conventions."""
-        media_info = MediaInformation.from_filename(filename)
+        with profiling.span("movie.resolve"):
+            media_info = self._parse_movie_filename(filename)
+            return self._format(media_info, self._find_movie(media_info, movie_id))
+
+    def format_file(
+        self, filepath: Path, movie_id: str | None = None
+    ) -> FormattedMediaInformation:
+        """Same as :meth:`format_filename` but recognizing the file by its content.
+
+        The movie of a file already known by the content index is not searched again,
+        unless another ``movie_id`` is given, and the movie found is remembered.
+        """
+        if self.content_index is None:
+            return self.format_filename(filepath.name, movie_id)
+        hash = content_hash(filepath)
+        known = None if movie_id else self.content_index.movies([hash]).get(hash)
+        with profiling.span("movie.resolve"):
+            if known is not None:
+                # The movie tells the title even when the name does not
+                media_info = MediaInformation.from_filename(filepath.name)
+                return self._format(media_info, known)
+            media_info = self._parse_movie_filename(filepath.name)
+            movie = self._find_movie(media_info, movie_id)
+        self.content_index.remember([(hash, movie)])
+        return self._format(media_info, movie)
+
+    async def aformat_filename(
+        self, filename: str, movie_id: str | None = None
+    ) -> FormattedMediaInformation:
+        """Same as :meth:`format_filename` but using the asynchronous movie database."""
+        moviedb = self._get_async_moviedb()
+        with profiling.span("movie.resolve"):
+            media_info = self._parse_movie_filename(filename)
+            if movie_id:
+                movie = self._check_movie(movie_id, await moviedb.get(movie_id))
+            else:
+                movie = await self._asearch_movie(media_info)
+            return self._format(media_info, movie)
+
+    async def format_filenames(
+        self, filenames: Iterable[str], concurrency: int = 8
+    ) -> list[FormattedMediaInformation | Exception]:
+        """Format many filenames concurrently.
+
+        Results are returned in the same order as given filenames, the error raised
+        while formatting a filename being returned in place of its result.
+        """
+        results = await self._format_filenames(filenames, concurrency)
+        return [result for result, *_ in results]
+
+    async def _format_filenames(
+        self,
+        filenames: Iterable[str],
+        concurrency: int,
+        known: Sequence[Movie | None] | None = None,
+        lookups: dict[MovieKey, asyncio.Task[Movie]] | None = None,
+    ) -> list[
+        tuple[FormattedMediaInformation | Exception, MovieKey | None, Movie | None]
+    ]:
+        # Files having the same key share a single lookup, so that the parts of a
+        # movie are searched once and either all resolved or all ambiguous. At most
+        # ``concurrency`` lookups are sent to the movie database at the same time.
+        # Files whose movie is already ``known`` are not looked up at all, and
+        # ``lookups`` may be shared by many calls.
+        filenames = list(filenames)
+        known = known or [None] * len(filenames)
+        semaphore = asyncio.Semaphore(concurrency)
+        if lookups is None:
+            lookups = {}
+
+        async def search(media_info: MediaInformation) -> Movie:
+            async with semaphore:
+                return await self._asearch_movie(media_info)
+
+        async def format_one(
+            filename: str, movie: Movie | None
+        ) -> tuple[
+            FormattedMediaInformation | Exception, MovieKey | None, Movie | None
+        ]:
+            key = None
+            try:
+                with profiling.span("movie.resolve"):
+                    if movie is not None:
+                        # The movie tells the title even when the name does not
+                        media_info = MediaInformation.from_filename(filename)
+                        return self._format(media_info, movie), None, movie
+                    media_info = self._parse_movie_filename(filename)
+                    key = MovieKey.from_media_info(
+                        media_info, self._trusted_source(media_info)
+                    )
+                    if key not in lookups:
+                        lookups[key] = asyncio.create_task(search(media_info))
+                    movie = await lookups[key]
+                    return self._format(media_info, movie), key, movie
+            except Exception as error:
+                return error, key, None
+
+        return await asyncio.gather(*map(format_one, filenames, known))
+
+    async def plan_renames(
+        self,
+        filepaths: Iterable[Path],
+        output_dir: Path | None = None,
+        concurrency: int = 8,
+    ) -> list[PlannedRename]:
+        """Resolve the movies of all given files, without renaming anything.
+
+        Renamed files are put in ``output_dir`` or in their parent directory. With a
+        content index, files already resolved are recognized by their content, even
+        renamed or moved, and files resolved meanwhile are remembered.
+        """
+        return await self._plan_renames(filepaths, output_dir, concurrency, {})
+
+    async def iter_renames(
+        self,
+        filepaths: Iterable[Path],
+        output_dir: Path | None = None,
+        lookahead: int = 8,
+    ) -> AsyncGenerator[PlannedRename, None]:
+        """Same as :meth:`plan_renames` but yielding files one by one, in order.
+
+        The ``lookahead`` files following the one yielded last are resolved in the
+        background meanwhile, so that they are usually resolved by the time they are
+        asked for. Lookups still running are cancelled when the iterator is closed.
+        """
+        files = iter(filepaths)
+        lookups: dict[MovieKey, asyncio.Task[Movie]] = {}
+        pending: deque[asyncio.Task[list[PlannedRename]]] = deque()
+
+        def resolve_next() -> None:
+            for filepath in itertools.islice(files, 1):
+                pending.append(
+                    asyncio.create_task(
+                        self._plan_renames([filepath], output_dir, 1, lookups)
+                    )
+                )
+
+        try:
+            for _ in range(lookahead + 1):
+                resolve_next()
+            while pending:
+                [entry] = await pending.popleft()
+                resolve_next()
+                yield entry
+        finally:
+            tasks = [*pending, *lookups.values()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _plan_renames(
+        self,
+        filepaths: Iterable[Path],
+        output_dir: Path | None,
+        concurrency: int,
+        lookups: dict[MovieKey, asyncio.Task[Movie]],
+    ) -> list[PlannedRename]:
+        filepaths = list(filepaths)
+        hashes: dict[Path, str] = {}
+        known: dict[str, Movie] = {}
+        if self.content_index is not None:
+            with profiling.span("content.hash"):
+                hashes = await asyncio.to_thread(content_hashes, filepaths)
+            known = self.content_index.movies(hashes.values())
+        results = await self._format_filenames(
+            [f.name for f in filepaths],
+            concurrency,
+            [known.get(hashes.get(filepath, "")) for filepath in filepaths],
+            lookups,
+        )
+        if self.content_index is not None:
+            self.content_index.remember(
+                (hash, movie)
+                for filepath, (_, _, movie) in zip(filepaths, results)
+                if movie is not None
+                and (hash := hashes.get(filepath))
+                and hash not in known
+            )
+        return [
+            PlannedRename(filepath, output_dir or filepath.parent, result, key)
+            for filepath, (result, key, _) in zip(filepaths, results)
+        ]
+
+    def _get_moviedb(self) -> MovieDatabase:
+        if self.moviedb is None:
+            raise RuntimeError("No movie database has been configured")
+        return self.moviedb
+
+    def _get_async_moviedb(self) -> AsyncMovieDatabase:
+        if self.async_moviedb is None:
+            raise RuntimeError("No asynchronous movie database has been configured")
+        return self.async_moviedb
+
+    def _find_movie(self, media_info: MediaInformation, movie_id: str | None) -> Movie:
+        moviedb = self._get_moviedb()
+        if movie_id:
+            return self._check_movie(movie_id, moviedb.get(movie_id))
+        if (source := self._trusted_source(media_info)) is not None:
+            if source.name == moviedb.SOURCE:
+                movie = moviedb.get(source.media_id)
+            else:
+                movie = moviedb.find(source.name, source.media_id)
+            return self._check_movie(f"{source.name}-{source.media_id}", movie)
+        movies = moviedb.search(
+            media_info.title or "", release_year=self._release_year(media_info)
+        )
+        return self._select_movie(media_info, movies)
+
+    async def _asearch_movie(self, media_info: MediaInformation) -> Movie:
+        moviedb = self._get_async_moviedb()
+        if (source := self._trusted_source(media_info)) is not None:
+            if source.name == moviedb.SOURCE:
+                movie = await moviedb.get(source.media_id)
+            else:
+                movie = await moviedb.find(source.name, source.media_id)
+            return self._check_movie(f"{source.name}-{source.media_id}", movie)
+        movies = await moviedb.search(
+            media_info.title or "", release_year=self._release_year(media_info)
+        )
+        return self._select_movie(media_info, movies)
+
+    def _parse_movie_filename(self, filename: str) -> MediaInformation:
+        with profiling.span("movie.parse"):
+            media_info = MediaInformation.from_filename(filename)
         if not media_info.title:
             raise MovieNotFoundError(
                 "Could not determine movie title from given filename"
             )
+        return media_info
 
-        if movie_id:
-            movie = self.moviedb.get(movie_id)
-            if not movie:
-                raise MovieNotFoundError(
-                    f"There is no movie having id {movie_id} in the database"
-                )
-        else:
-            movies = self.moviedb.search(
-                media_info.title,
-                release_year=media_info.year[0] if media_info.year else None,
+    def _trusted_source(self, media_info: MediaInformation) -> MediaSource | None:
+        return media_info.source if self.trust_sources else None
+
+    def _release_year(self, media_info: MediaInformation) -> int | None:
+        return media_info.year[0] if media_info.year else None
+
+    def _check_movie(self, movie_id: str, movie: Movie | None) -> Movie:
+        if not movie:
+            raise MovieNotFoundError(
+                f"There is no movie having id {movie_id} in the database"
             )
-            if not movies:
-                raise MovieNotFoundError(
-                    f"Could not find any movie matching {media_info.title!r} in the movie database"
-                )
-            if len(movies) > 1:
-                raise ManyMoviesFoundError(
-                    f"Found many movies matching {media_info.title!r}", movies
-                )
-            movie = movies[0]
+        return movie
 
-        media_info.update_from_movie(movie)
-        return FormattedMediaInformation(
-            self.formatter.format_movie_filename(media_info),
-            self.formatter.format_movie_dirname(media_info),
-            movie.link,
+    def _select_movie(self, media_info: MediaInformation, movies: list[Movie]) -> Movie:
+        if not movies:
+            raise MovieNotFoundError(
+                f"Could not find any movie matching {media_info.title!r} in the movie database"
+            )
+        ranked = rank_movies(
+            movies, media_info.title or "", self._release_year(media_info)
         )
+        movie = confident_winner(ranked, self.confidence_margin)
+        if movie is None:
+            raise ManyMoviesFoundError(
+                f"Found many movies matching {media_info.title!r}",
+                [scored.movie for scored in ranked],
+            )
+        return movie
+
+    def _format(
+        self, media_info: MediaInformation, movie: Movie
+    ) -> FormattedMediaInformation:
+        with profiling.span("movie.format"):
+            media_info.update_from_movie(movie)
+            return FormattedMediaInformation(
+                self.formatter.format_movie_filename(media_info),
+                self.formatter.format_movie_dirname(media_info),
+                movie.link,
+            )
@@ -0,0 +1,334 @@
+import contextlib
+import errno
+import os
+import shutil
+import tempfile
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from enum import Enum
+from pathlib import Path
+from typing import NamedTuple
+
+from .. import profiling
+
+# ioctl cloning a file into another one, sharing their data (btrfs, XFS, ...)
+_FICLONE = 0x40049409
+# Errors telling that a way of copying files is not supported, not that it failed
+_UNSUPPORTED = {
+    errno.EBADF,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    errno.EXDEV,
+}
+# Errors telling that a file system does not support hard links
+_NO_HARDLINKS = {errno.EPERM, errno.EOPNOTSUPP, errno.ENOSYS, errno.EMLINK}
+# Size of the chunks files are copied by, between two progress reports
+COPY_CHUNK_SIZE = 64 * 1024**2
+
+
+CopyProgress = Callable[[int], None]
+
+
+class DuplicateDestinationError(Exception):
+    """A file would be renamed to the same destination as another one."""
+
+
+class RenameStrategy(str, Enum):
+    HARDLINK = "hardlink"
+    MOVE = "move"
+    COPY = "copy"
+    REFLINK = "reflink"
+    NOOP = "noop"
+
+
+class RenameOperation(NamedTuple):
+    source: Path
+    destination: Path
+
+
+class RenameResult(NamedTuple):
+    operation: RenameOperation
+    error: OSError | None = None
+
+
+def rename(
+    operation: RenameOperation,
+    strategy: RenameStrategy,
+    copy_progress: CopyProgress | None = None,
+) -> None:
+    """Rename a file following given strategy, creating missing directories.
+
+    Moving a file to another file system copies it then removes it. Copied bytes are
+    reported to ``copy_progress``.
+    """
+    if strategy != RenameStrategy.NOOP:
+        operation.destination.parent.mkdir(parents=True, exist_ok=True)
+    with profiling.span(f"rename.{strategy.value}"):
+        _rename(operation, strategy, copy_progress)
+
+
+def _rename(
+    operation: RenameOperation,
+    strategy: RenameStrategy,
+    copy_progress: CopyProgress | None = None,
+) -> None:
+    source, destination = operation
+    match strategy:
+        case RenameStrategy.HARDLINK:
+            destination.hardlink_to(source)
+        case RenameStrategy.MOVE:
+            try:
+                _move(source, destination)
+            except OSError as error:
+                if error.errno != errno.EXDEV:
+                    raise
+                copy_file(source, destination, progress=copy_progress)
+                # Never remove the only full copy of the data
+                if destination.stat().st_size != source.stat().st_size:
+                    raise OSError(errno.EIO, "Incomplete copy", os.fspath(destination))
+                source.unlink()
+        case RenameStrategy.COPY:
+            copy_file(source, destination, progress=copy_progress)
+        case RenameStrategy.REFLINK:
+            copy_file(source, destination, reflink_only=True)
+        case RenameStrategy.NOOP:
+            pass
+
+
+def _move(source: Path, destination: Path) -> None:
+    # Linking then unlinking never overwrites the destination, unlike renaming
+    if not _link(source, destination):
+        # Only possible to check beforehand on file systems without hard links
+        _check_missing(destination)
+        source.rename(destination)
+        return
+    try:
+        source.unlink()
+    except OSError:
+        destination.unlink()
+        raise
+
+
+def _link(source: Path, destination: Path) -> bool:
+    # Return whether the destination has been linked, False when the file system
+    # does not support hard links
+    try:
+        os.link(source, destination)
+    except OSError as error:
+        if error.errno in _NO_HARDLINKS:
+            return False
+        raise
+    return True
+
+
+def _check_missing(path: Path) -> None:
+    if path.exists():
+        raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), os.fspath(path))
+
+
+def undo_rename(operation: RenameOperation, strategy: RenameStrategy) -> None:
+    """Undo a rename applied following given strategy.
+
+    Fail rather than overwriting the original file or removing the only copy left.
+    The destination directory is removed once empty.
+    """
+    source, destination = operation
+    match strategy:
+        case RenameStrategy.MOVE:
+            _check_missing(source)
+            rename(RenameOperation(destination, source), strategy)
+        case RenameStrategy.HARDLINK | RenameStrategy.COPY | RenameStrategy.REFLINK:
+            if not source.exists():
+                raise FileNotFoundError(
+                    errno.ENOENT, os.strerror(errno.ENOENT), os.fspath(source)
+                )
+            destination.unlink()
+        case RenameStrategy.NOOP:
+            return
+    with contextlib.suppress(OSError):
+        destination.parent.rmdir()
+
+
+def undo_renames(
+    renames: Iterable[tuple[RenameOperation, RenameStrategy]],
+) -> list[RenameResult]:
+    """Undo given renames, the last applied first."""
+    results = []
+    for operation, strategy in reversed(list(renames)):
+        try:
+            undo_rename(operation, strategy)
+        except OSError as error:
+            results.append(RenameResult(operation, error))
+        else:
+            results.append(RenameResult(operation))
+    return results
+
+
+def copy_file(
+    source: Path,
+    destination: Path,
+    reflink_only: bool = False,
+    progress: CopyProgress | None = None,
+) -> None:
+    """Copy a file along with its permissions and times, without overwriting.
+
+    Data is not copied through Python: the copy is a reflink sharing data with the
+    source when the file system supports it, otherwise data is copied by the kernel
+    (unless it cannot, e.g. on other systems than Linux). With ``reflink_only``, the
+    copy fails rather than copying data. The copy is written to a temporary file next
+    to the destination then linked to it, so that the destination never holds a
+    partial copy nor overwrites another file: the copy fails when the source changed
+    size meanwhile.
+    """
+    # Checked again when linking, but better not copy anything for nothing
+    _check_missing(destination)
+    fd, temp = tempfile.mkstemp(
+        prefix=f".{destination.name}.", suffix=".part", dir=destination.parent
+    )
+    try:
+        with open(source, "rb") as src, os.fdopen(fd, "wb") as dst:
+            if not _clone(src.fileno(), dst.fileno()):
+                if reflink_only:
+                    raise OSError(
+                        errno.EOPNOTSUPP,
+                        "File system does not support reflinks",
+                        os.fspath(destination),
+                    )
+                size = os.fstat(src.fileno()).st_size
+                copied = _copy_data(src.fileno(), dst.fileno(), size, progress)
+                if copied != size or os.fstat(src.fileno()).st_size != size:
+                    raise OSError(
+                        errno.EIO,
+                        f"Source changed while copied ({copied} of {size} bytes)",
+                        os.fspath(source),
+                    )
+        shutil.copystat(source, temp)
+        if not _link(Path(temp), destination):
+            _check_missing(destination)
+            os.replace(temp, destination)
+    finally:
+        Path(temp).unlink(missing_ok=True)
+
+
+def _clone(src: int, dst: int) -> bool:
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        fcntl.ioctl(dst, _FICLONE, src)
+    except OSError as error:
+        if error.errno in _UNSUPPORTED:
+            return False
+        raise
+    return True
+
+
+def _copy_data(src: int, dst: int, size: int, progress: CopyProgress | None) -> int:
+    # Return the number of bytes copied, fewer than ``size`` if the source shrank
+    copied = 0
+    methods = (_copy_file_range, _sendfile, _read_write)
+    for copy_chunk in methods:
+        try:
+            while copied < size:
+                count = copy_chunk(
+                    src, dst, copied, min(COPY_CHUNK_SIZE, size - copied)
+                )
+                if not count:
+                    break
+                copied += count
+                if progress:
+                    progress(count)
+        except OSError as error:
+            # Only fall back to the next way of copying before anything was copied
+            if copied or error.errno not in _UNSUPPORTED or copy_chunk is methods[-1]:
+                raise
+            continue
+        # Some file systems (e.g. FUSE or NFS ones) copy nothing without failing
+        if copied or not size or copy_chunk is methods[-1]:
+            return copied
+    raise AssertionError("unreachable")
+
+
+def _copy_file_range(src: int, dst: int, offset: int, count: int) -> int:
+    if not hasattr(os, "copy_file_range"):
+        raise OSError(errno.ENOSYS, "copy_file_range is not available")
+    return os.copy_file_range(src, dst, count, offset, offset)
+
+
+def _sendfile(src: int, dst: int, offset: int, count: int) -> int:
+    # Writes at the current position of the destination, offset only applies to the
+    # source, which is fine as long as this is used since the very first chunk
+    return os.sendfile(dst, src, offset, count)
+
+
+def _read_write(src: int, dst: int, offset: int, count: int) -> int:
+    # Last resort, when the kernel cannot copy files by itself
+    data = os.pread(src, min(count, 1024**2), offset)
+    os.pwrite(dst, data, offset)
+    return len(data)
+
+
+def _mkdir(directory: Path) -> OSError | None:
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+    except OSError as error:
+        return error
+    return None
+
+
+def _apply(
+    operation: RenameOperation,
+    strategy: RenameStrategy,
+    copy_progress: CopyProgress | None,
+) -> RenameResult:
+    try:
+        with profiling.span(f"rename.{strategy.value}"):
+            _rename(operation, strategy, copy_progress)
+    except OSError as error:
+        return RenameResult(operation, error)
+    return RenameResult(operation)
+
+
+def apply_renames(
+    operations: Iterable[RenameOperation],
+    strategy: RenameStrategy,
+    workers: int = 8,
+    progress: Callable[[RenameResult], None] | None = None,
+    copy_progress: CopyProgress | None = None,
+) -> list[RenameResult]:
+    """Apply all given operations, an operation failing does not stop the others.
+
+    Operations are applied by a pool of ``workers`` threads, which mostly wait for
+    the file system, so that file systems with a high latency (e.g. network mounts)
+    handle many of them at once. Every destination directory is created once, before
+    applying operations. Unless doing nothing, ``progress`` is called with the result
+    of every operation as soon as it is applied, and ``copy_progress`` with the number
+    of bytes copied, from worker threads. Results are returned in the same order as
+    operations.
+    """
+    operations = list(operations)
+    if strategy == RenameStrategy.NOOP:
+        return [RenameResult(operation) for operation in operations]
+
+    results_by_index: dict[int, RenameResult] = {}
+    with ThreadPoolExecutor(workers) as pool:
+        directories = list(dict.fromkeys(op.destination.parent for op in operations))
+        mkdir_errors = dict(zip(directories, pool.map(_mkdir, directories)))
+
+        futures = {}
+        for index, operation in enumerate(operations):
+            if error := mkdir_errors[operation.destination.parent]:
+                results_by_index[index] = RenameResult(operation, error)
+                if progress:
+                    progress(results_by_index[index])
+            else:
+                future = pool.submit(_apply, operation, strategy, copy_progress)
+                futures[future] = index
+        for future in as_completed(futures):
+            results_by_index[futures[future]] = future.result()
+            if progress:
+                progress(future.result())
+    return [results_by_index[index] for index in range(len(operations))]
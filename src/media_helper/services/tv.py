@@ -0,0 +1,172 @@
+import asyncio
+from collections.abc import Iterable
+from pathlib import Path
+from typing import NamedTuple
+
+from .. import profiling
+from ..core.formatter import PlexMediaFileNameFormatter
+from ..core.model import MediaInformation, Season, Show
+from ..core.ranking import confident_winner, rank_movies
+from ..core.text import normalize_title
+from ..ports import (
+    AsyncTvDatabase,
+    EpisodeNotFoundError,
+    ManyShowsFoundError,
+    ShowNotFoundError,
+)
+from .movie import FormattedMediaInformation, PlannedRename
+
+
+class ShowKey(NamedTuple):
+    """Identify the show a file is about, as far as its name tells."""
+
+    title: str
+    year: int | None
+
+    @classmethod
+    def from_media_info(cls, media_info: MediaInformation) -> "ShowKey":
+        year = media_info.year[0] if media_info.year else None
+        return cls(normalize_title(media_info.title or ""), year)
+
+
+class TvService:
+    """Resolve and format TV episode files using Plex naming conventions.
+
+    Episodes are looked up by season rather than one by one: files are grouped by
+    show, each show being searched once, then by season, each season being fetched
+    once along with all its episodes.
+    """
+
+    def __init__(
+        self,
+        async_tvdb: AsyncTvDatabase | None = None,
+        confidence_margin: float = 0.15,
+        formatter: PlexMediaFileNameFormatter | None = None,
+    ) -> None:
+        self.async_tvdb = async_tvdb
+        # How much the best show found must outscore the next one to be selected
+        self.confidence_margin = confidence_margin
+        self.formatter = formatter or PlexMediaFileNameFormatter()
+
+    async def plan_renames(
+        self,
+        filepaths: Iterable[Path],
+        output_dir: Path | None = None,
+        concurrency: int = 8,
+        show_id: str | None = None,
+    ) -> list[PlannedRename]:
+        """Resolve the episodes of all given files, without renaming anything.
+
+        Renamed files are put in ``output_dir`` or in their parent directory, within
+        the directories of their show and season. All files are considered episodes
+        of the show having ``show_id`` when given, instead of the one their name
+        tells. At most ``concurrency`` lookups are sent to the database at once.
+        """
+        tvdb = self._get_async_tvdb()
+        semaphore = asyncio.Semaphore(concurrency)
+        shows: dict[ShowKey | None, asyncio.Task[Show]] = {}
+        seasons: dict[tuple[str, int], asyncio.Task[Season]] = {}
+
+        async def find_show(media_info: MediaInformation) -> Show:
+            async with semaphore:
+                if show_id:
+                    return self._check_show(show_id, await tvdb.get_show(show_id))
+                found = await tvdb.search_shows(
+                    media_info.title or "", self._first_air_year(media_info)
+                )
+                return self._select_show(media_info, found)
+
+        async def get_season(show: Show, season_number: int) -> Season:
+            async with semaphore:
+                season = await tvdb.get_season(show.id, season_number)
+            if season is None:
+                raise EpisodeNotFoundError(
+                    f"{show.title} has no season {season_number}"
+                )
+            return season
+
+        async def plan_one(filepath: Path) -> PlannedRename:
+            result: FormattedMediaInformation | Exception
+            try:
+                with profiling.span("tv.resolve"):
+                    media_info = self._parse_episode_filename(filepath.name)
+                    key = None if show_id else ShowKey.from_media_info(media_info)
+                    if key not in shows:
+                        shows[key] = asyncio.create_task(find_show(media_info))
+                    show = await shows[key]
+                    season_key = (show.id, media_info.season[0])
+                    if season_key not in seasons:
+                        seasons[season_key] = asyncio.create_task(
+                            get_season(show, media_info.season[0])
+                        )
+                    season = await seasons[season_key]
+                    result = self._format(media_info, show, season)
+            except Exception as error:
+                result = error
+            return PlannedRename(filepath, output_dir or filepath.parent, result)
+
+        return await asyncio.gather(*map(plan_one, filepaths))
+
+    def _get_async_tvdb(self) -> AsyncTvDatabase:
+        if self.async_tvdb is None:
+            raise RuntimeError("No asynchronous TV database has been configured")
+        return self.async_tvdb
+
+    def _parse_episode_filename(self, filename: str) -> MediaInformation:
+        with profiling.span("tv.parse"):
+            media_info = MediaInformation.from_filename(filename)
+        if not media_info.title:
+            raise ShowNotFoundError(
+                "Could not determine show title from given filename"
+            )
+        if not media_info.season or not media_info.episode:
+            raise EpisodeNotFoundError(
+                "Could not determine season and episode from given filename"
+            )
+        return media_info
+
+    def _first_air_year(self, media_info: MediaInformation) -> int | None:
+        return media_info.year[0] if media_info.year else None
+
+    def _check_show(self, show_id: str, show: Show | None) -> Show:
+        if not show:
+            raise ShowNotFoundError(
+                f"There is no show having id {show_id} in the database"
+            )
+        return show
+
+    def _select_show(self, media_info: MediaInformation, shows: list[Show]) -> Show:
+        if not shows:
+            raise ShowNotFoundError(
+                f"Could not find any show matching {media_info.title!r} in the database"
+            )
+        ranked = rank_movies(
+            shows, media_info.title or "", self._first_air_year(media_info)
+        )
+        show = confident_winner(ranked, self.confidence_margin)
+        if show is None:
+            raise ManyShowsFoundError(
+                f"Found many shows matching {media_info.title!r}",
+                [scored.movie for scored in ranked],
+            )
+        return show
+
+    def _format(
+        self, media_info: MediaInformation, show: Show, season: Season
+    ) -> FormattedMediaInformation:
+        with profiling.span("tv.format"):
+            episodes = []
+            for number in media_info.episode:
+                episode = season.episode(number)
+                if episode is None:
+                    raise EpisodeNotFoundError(
+                        f"{show.title} has no episode {number} in season "
+                        f"{season.season_number}"
+                    )
+                episodes.append(episode)
+            media_info.update_from_show(show, episodes)
+            return FormattedMediaInformation(
+                self.formatter.format_episode_filename(media_info),
+                self.formatter.format_season_dirname(media_info),
+                show.link,
+            )
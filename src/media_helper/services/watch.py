@@ -0,0 +1,70 @@
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import NamedTuple
+
+
+class _Pending(NamedTuple):
+    # When the file was last seen changing
+    changed_at: float
+    # Its size and modification time then, unknown until checked once
+    signature: tuple[int, int] | None
+
+
+class PendingFiles:
+    """Files waiting to be complete before being processed.
+
+    Being notified that a file has been written does not mean it is complete, since
+    downloaders may write files in several sessions. A file is thus only considered
+    complete once it has not changed for ``debounce`` seconds twice in a row: neither
+    an event about it, nor a change of its size or modification time.
+
+    >>> now = 0.0
+    >>> pending = PendingFiles(debounce=5, clock=lambda: now)
+    >>> pending.add(Path(__file__))
+    >>> pending.ready()
+    []
+    >>> now = 5.0
+    >>> pending.ready()  # Checked for the first time
+    []
+    >>> now = 10.0
+    >>> pending.ready() == [Path(__file__)], len(pending)
+    (True, 0)
+    """
+
+    def __init__(
+        self, debounce: float = 5.0, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.debounce = debounce
+        self._clock = clock
+        self._pending: dict[Path, _Pending] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, path: Path) -> None:
+        """Add a file, or postpone it when already pending since it changed again."""
+        self._pending[path] = _Pending(self._clock(), None)
+
+    def ready(self) -> list[Path]:
+        """Return and forget the files that are complete, in the order they came.
+
+        Files that disappeared meanwhile are forgotten as well.
+        """
+        now = self._clock()
+        ready = []
+        for path, pending in list(self._pending.items()):
+            if now - pending.changed_at < self.debounce:
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                del self._pending[path]
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if signature == pending.signature:
+                del self._pending[path]
+                ready.append(path)
+            else:
+                self._pending[path] = _Pending(now, signature)
+        return ready
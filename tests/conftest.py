@@ -1,7 +1,37 @@
+from collections.abc import Iterator
+
 import pytest
 from media_helper.config import Settings
 
+from .fake_tmdb import FakeTmdbServer, tmdb_movie, tmdb_show
+
 
 @pytest.fixture(scope="session")
 def settings() -> Settings:
     return Settings()
+
+
+@pytest.fixture
+def fake_tmdb() -> Iterator[FakeTmdbServer]:
+    with FakeTmdbServer(
+        [
+            tmdb_movie(27205, "Inception", "2010-07-15", imdb_id="tt1375666"),
+            tmdb_movie(44214, "Black Swan", "2010-12-01"),
+        ],
+        shows=[
+            tmdb_show(
+                1396,
+                "Breaking Bad",
+                "2008-01-20",
+                seasons={
+                    1: [
+                        "Pilot",
+                        "Cat's in the Bag...",
+                        "...And the Bag's in the River",
+                    ],
+                    2: ["Seven Thirty-Seven", "Grilled"],
+                },
+            )
+        ],
+    ) as server:
+        yield server
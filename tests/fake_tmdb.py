@@ -0,0 +1,191 @@
+"""In-process HTTP server mimicking the TMDB endpoints used by the adapters."""
+
+import json
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+
+def tmdb_movie(id: int, title: str, release_date: str, **kwargs: Any) -> dict[str, Any]:
+    """Build a movie as returned by the TMDB API."""
+    movie = dict(
+        adult=False,
+        id=id,
+        original_language="en",
+        original_title=title,
+        overview="",
+        popularity=10.0,
+        release_date=release_date,
+        title=title,
+        video=False,
+        vote_average=7.0,
+        vote_count=100,
+    )
+    movie.update(kwargs)
+    return movie
+
+
+def tmdb_show(
+    id: int,
+    name: str,
+    first_air_date: str,
+    seasons: dict[int, list[str]] | None = None,
+    **kwargs: Any,
+) -> dict[str, Any]:
+    """Build a TV show as returned by the TMDB API, with the names of its episodes
+    by season."""
+    show = dict(
+        id=id,
+        name=name,
+        original_language="en",
+        original_name=name,
+        overview="",
+        popularity=10.0,
+        first_air_date=first_air_date,
+        vote_average=7.0,
+        vote_count=100,
+        seasons=seasons or {},
+    )
+    show.update(kwargs)
+    return show
+
+
+class FakeTmdbServer:
+    """Serve given movies like TMDB does, with an optional latency per request.
+
+    Failures can be scheduled with :meth:`fail_next` for testing how clients handle
+    throttling and server errors.
+    """
+
+    def __init__(
+        self,
+        movies: Iterable[dict[str, Any]] = (),
+        latency: float = 0.0,
+        shows: Iterable[dict[str, Any]] = (),
+    ) -> None:
+        self.movies = {m["id"]: m for m in movies}
+        self.shows = {s["id"]: s for s in shows}
+        self.latency = latency
+        self.requests: list[str] = []
+        self._failures: deque[tuple[int, dict[str, str]]] = deque()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def __enter__(self) -> "FakeTmdbServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def fail_next(
+        self, status: int, times: int = 1, headers: dict[str, str] | None = None
+    ) -> None:
+        """Answer the next ``times`` requests with given status and headers."""
+        with self._lock:
+            self._failures.extend([(status, headers or {})] * times)
+
+    def handle(
+        self, path: str, query: dict[str, str]
+    ) -> tuple[int, Any, dict[str, str]]:
+        """Return the status, payload and headers of the response to given request."""
+        with self._lock:
+            self.requests.append(path)
+            if self._failures:
+                status, headers = self._failures.popleft()
+                return status, {"status_code": 25, "status_message": "Failure"}, headers
+
+        if path == "/3/search/movie":
+            needle = query.get("query", "").casefold()
+            year = query.get("year")
+            results = [
+                m
+                for m in self.movies.values()
+                if needle in m["title"].casefold()
+                and (not year or m["release_date"].startswith(year))
+            ]
+            return (
+                200,
+                dict(
+                    page=1, results=results, total_pages=1, total_results=len(results)
+                ),
+                {},
+            )
+        if path.startswith("/3/movie/"):
+            movie_id = path.removeprefix("/3/movie/")
+            if movie_id.isdigit() and int(movie_id) in self.movies:
+                return 200, self.movies[int(movie_id)], {}
+        if path.startswith("/3/find/"):
+            external_id = path.removeprefix("/3/find/")
+            key = query.get("external_source", "")
+            results = [m for m in self.movies.values() if m.get(key) == external_id]
+            return 200, dict(movie_results=results, tv_results=[]), {}
+        if path == "/3/search/tv":
+            needle = query.get("query", "").casefold()
+            year = query.get("first_air_date_year")
+            results = [
+                s
+                for s in self.shows.values()
+                if needle in s["name"].casefold()
+                and (not year or s["first_air_date"].startswith(year))
+            ]
+            return (
+                200,
+                dict(
+                    page=1, results=results, total_pages=1, total_results=len(results)
+                ),
+                {},
+            )
+        if path.startswith("/3/tv/"):
+            show_id, _, season = path.removeprefix("/3/tv/").partition("/season/")
+            show = self.shows.get(int(show_id)) if show_id.isdigit() else None
+            if show is not None and not season:
+                return 200, show, {}
+            if show is not None and season.isdigit():
+                names = show["seasons"].get(int(season))
+                if names is not None:
+                    episodes = [
+                        dict(
+                            episode_number=number, season_number=int(season), name=name
+                        )
+                        for number, name in enumerate(names, 1)
+                    ]
+                    return 200, dict(season_number=int(season), episodes=episodes), {}
+        return 404, {"status_code": 34, "status_message": "Not found"}, {}
+
+    def _make_handler(self) -> type[BaseHTTPRequestHandler]:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if fake.latency:
+                    time.sleep(fake.latency)
+                url = urlsplit(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                status, payload, headers = fake.handle(url.path, query)
+
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        return Handler
@@ -0,0 +1,86 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+# Modules only needed by some commands, that must not slow down starting the CLI
+HEAVY_MODULES = [
+    "PTN",
+    "httpx",
+    "pydantic",
+    "rich",
+    "media_helper.config",
+    "media_helper.services.movie",
+]
+
+
+def run_python(
+    *args: str, env: dict[str, str] | None = None, check: bool = True
+) -> subprocess.CompletedProcess[str]:
+    env = {
+        **{k: v for k, v in os.environ.items() if k != "TMDB_ACCESS_TOKEN"},
+        **(env or {}),
+    }
+    return subprocess.run(
+        [sys.executable, *args], capture_output=True, text=True, env=env, check=check
+    )
+
+
+def test_cli_import_is_light() -> None:
+    result = run_python(
+        "-c",
+        "import sys, media_helper.cli; "
+        f"print(*[m for m in {HEAVY_MODULES!r} if m in sys.modules])",
+    )
+    assert result.stdout.split() == []
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--help"],
+        ["movie", "--help"],
+        ["movie", "rename", "--help"],
+        ["movie", "parse", "Inception.2010.1080p.BluRay.x264.mkv"],
+    ],
+)
+def test_cli_does_not_require_tmdb_token(args: list[str]) -> None:
+    result = run_python("-m", "media_helper", *args)
+    assert result.stdout
+
+
+@pytest.mark.parametrize(
+    "args, returncode",
+    [
+        (["movie", "review"], 0),
+        (["movie", "undo"], 1),
+        (["movie", "index"], 1),
+    ],
+)
+def test_commands_not_looking_movies_up_do_not_require_tmdb_token(
+    tmp_path: Path, args: list[str], returncode: int
+) -> None:
+    env = {f"XDG_{name}_HOME": str(tmp_path / name) for name in ["CACHE", "STATE"]}
+    result = run_python("-m", "media_helper", *args, env=env, check=False)
+    assert result.returncode == returncode, result.stderr
+    assert "Error" not in result.stderr
+
+
+def test_only_given_flags_override_settings(monkeypatch: pytest.MonkeyPatch) -> None:
+    from typer.testing import CliRunner
+
+    from media_helper import bootstrap, cli
+
+    monkeypatch.setenv("CACHE_ENABLED", "false")
+    monkeypatch.setattr(bootstrap, "_settings_overrides", {})
+    result = CliRunner().invoke(
+        cli.app, ["movie", "--refresh", "parse", "Inception.2010.mkv"]
+    )
+    settings = bootstrap.get_settings()
+    bootstrap.get_settings.cache_clear()
+
+    assert result.exit_code == 0, result.output
+    assert (settings.cache_enabled, settings.cache_refresh) == (False, True)
+    assert settings.local_db_enabled
@@ -1,13 +1,29 @@
 from collections.abc import Iterator
+from typing import Any
 
+import asyncio
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import httpx
 import pytest
-from media_helper.adapters.tmdb import TmdbMovieDatabase
+from media_helper.adapters.cache import SqliteMovieCache
+from media_helper.adapters.throttling import RetryPolicy, TokenBucket
+from media_helper.adapters.tmdb import AsyncTmdbMovieDatabase, TmdbMovieDatabase
 from media_helper.config import Settings
 from media_helper.core.model import Movie
+from media_helper.ports import EpisodeNotFoundError, MovieNotFoundError
+from media_helper.services.movie import MovieService
+from media_helper.services.tv import TvService
+
+from .fake_tmdb import FakeTmdbServer
 
 
 @pytest.fixture
 def sut(settings: Settings) -> Iterator[TmdbMovieDatabase]:
+    if settings.tmdb_access_token is None:
+        pytest.skip("TMDB_ACCESS_TOKEN is not set")
     client = TmdbMovieDatabase(
         access_token=settings.tmdb_access_token.get_secret_value()
     )
@@ -36,3 +52,154 @@ def test_search_movie(sut: TmdbMovieDatabase) -> None:
 
     # NOTE: not so much we can test here...
     assert movies
+
+
+@pytest.fixture
+def stubbed_sut(fake_tmdb: FakeTmdbServer) -> Iterator[TmdbMovieDatabase]:
+    client = TmdbMovieDatabase(
+        access_token="token",
+        api_base_url=fake_tmdb.url,
+        retry_policy=RetryPolicy(max_retries=3, backoff=0.01),
+    )
+    yield client
+    client.close()
+
+
+def test_throttled_requests_are_retried_after_retry_after_delay(
+    stubbed_sut: TmdbMovieDatabase, fake_tmdb: FakeTmdbServer
+) -> None:
+    fake_tmdb.fail_next(429, times=2, headers={"Retry-After": "0.1"})
+
+    start = time.monotonic()
+    movies = stubbed_sut.search("Inception")
+
+    assert time.monotonic() - start >= 0.2
+    assert [m.id for m in movies] == ["27205"]
+    assert stubbed_sut.stats.throttled == 2
+    assert stubbed_sut.stats.retried == 2
+    assert stubbed_sut.stats.requests == 3
+
+
+def test_retry_after_delays_are_capped() -> None:
+    policy = RetryPolicy(max_backoff=30.0)
+    response = httpx.Response(429, headers={"Retry-After": "3600"})
+
+    assert policy.delay(0, response) == 30.0
+
+
+def test_server_errors_are_retried_until_giving_up(
+    stubbed_sut: TmdbMovieDatabase, fake_tmdb: FakeTmdbServer
+) -> None:
+    fake_tmdb.fail_next(503, times=4)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        stubbed_sut.get("27205")
+
+    assert stubbed_sut.stats.retried == 3
+    assert len(fake_tmdb.requests) == 4
+
+
+def test_requests_are_rate_limited(fake_tmdb: FakeTmdbServer) -> None:
+    sut = AsyncTmdbMovieDatabase(
+        access_token="token",
+        api_base_url=fake_tmdb.url,
+        rate_limiter=TokenBucket(rate=20, capacity=1),
+    )
+
+    async def search_all() -> None:
+        await asyncio.gather(*(sut.search(f"movie {i}") for i in range(5)))
+        await sut.aclose()
+
+    start = time.monotonic()
+    asyncio.run(search_all())
+
+    assert time.monotonic() - start >= 0.2
+    assert len(fake_tmdb.requests) == 5
+
+
+def test_episodes_are_resolved_with_one_fetch_per_season(
+    fake_tmdb: FakeTmdbServer, tmp_path: Path
+) -> None:
+    tvdb = AsyncTmdbMovieDatabase(
+        access_token="token",
+        api_base_url=fake_tmdb.url,
+        cache=SqliteMovieCache(tmp_path / "cache.sqlite3"),
+    )
+    srv = TvService(tvdb)
+    filepaths = [
+        *(Path(f"/dl/Breaking.Bad.S01E0{n}.720p.mkv") for n in (1, 2, 3)),
+        Path("/dl/breaking bad s02e01e02.mkv"),
+        Path("/dl/Breaking.Bad.S03E01.mkv"),
+    ]
+
+    async def plan_renames() -> list[Any]:
+        plan = await srv.plan_renames(filepaths, output_dir=Path("/tv"))
+        await tvdb.aclose()
+        return plan
+
+    plan = asyncio.run(plan_renames())
+
+    show_dir = Path("/tv/Breaking Bad (2008) {tmdb-1396}")
+    assert [entry.operation and entry.operation.destination for entry in plan] == [
+        show_dir / "Season 01/Breaking Bad (2008) - s01e01 - Pilot [720p].mkv",
+        show_dir
+        / "Season 01/Breaking Bad (2008) - s01e02 - Cat's in the Bag... [720p].mkv",
+        show_dir
+        / "Season 01/Breaking Bad (2008) - s01e03 - ...And the Bag's in the River [720p].mkv",
+        show_dir
+        / "Season 02/Breaking Bad (2008) - s02e01-e02 - Seven Thirty-Seven & Grilled.mkv",
+        None,
+    ]
+    assert isinstance(plan[-1].result, EpisodeNotFoundError)
+    assert sorted(fake_tmdb.requests) == [
+        "/3/search/tv",
+        "/3/tv/1396/season/1",
+        "/3/tv/1396/season/2",
+        "/3/tv/1396/season/3",
+    ]
+
+    # Seasons are cached, missing ones included
+    fake_tmdb.requests.clear()
+    assert [entry.result for entry in asyncio.run(plan_renames())][:-1] == [
+        entry.result for entry in plan
+    ][:-1]
+    assert fake_tmdb.requests == []
+
+
+def test_files_tagged_with_their_movie_are_resolved_by_id(
+    fake_tmdb: FakeTmdbServer, tmp_path: Path
+) -> None:
+    def service() -> MovieService:
+        moviedb = TmdbMovieDatabase(
+            access_token="token",
+            api_base_url=fake_tmdb.url,
+            cache=SqliteMovieCache(tmp_path / "cache.sqlite3"),
+        )
+        return MovieService(moviedb, trust_sources=True)
+
+    srv = service()
+    assert srv.format_filename("Origin.{imdb-tt1375666}.mkv").filename == (
+        "Inception (2010) {tmdb-27205}.mkv"
+    )
+    assert srv.format_filename("Swan.{tmdb-44214}.1080p.mkv").filename == (
+        "Black Swan (2010) {tmdb-44214} [1080p].mkv"
+    )
+    with pytest.raises(MovieNotFoundError):
+        srv.format_filename("Unknown.{imdb-tt0000000}.mkv")
+    assert fake_tmdb.requests == [
+        "/3/find/tt1375666",
+        "/3/movie/44214",
+        "/3/find/tt0000000",
+    ]
+
+    # The imdb id is mapped to the TMDB one, which outlives the cached movie, and
+    # unknown ids are cached as well
+    cache = SqliteMovieCache(tmp_path / "cache.sqlite3")
+    cache.set("tmdb:movie:fr-FR:27205", [], ttl=timedelta(0))
+    fake_tmdb.requests.clear()
+    srv = service()
+    srv.format_filename("Inception.{imdb-tt1375666}.mkv")
+    srv.format_filename("Inception.{imdb-tt1375666}.cd2.mkv")
+    with pytest.raises(MovieNotFoundError):
+        srv.format_filename("Unknown.{imdb-tt0000000}.mkv")
+    assert fake_tmdb.requests == ["/3/movie/27205"]
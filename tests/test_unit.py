@@ -0,0 +1,813 @@
+import asyncio
+import errno
+import json
+import os
+import select
+import sys
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, ClassVar
+
+import pytest
+
+from media_helper import profiling
+from media_helper.adapters.cache import SqliteMovieCache
+from media_helper.adapters.journal import RunJournal
+from media_helper.adapters.local import FallbackMovieDatabase, LocalMovieDatabase
+from media_helper.adapters.state import SqliteStateIndex
+from media_helper.core import compact as compact_module
+from media_helper.core import model
+from media_helper.core.compact import CompactMediaInformation
+from media_helper.core.formatter import PlexMediaFileNameFormatter
+from media_helper.core.library import FileKey
+from media_helper.core.model import MediaInformation, MediaSource, Movie
+from media_helper.ports import ManyMoviesFoundError, MovieNotFoundError
+from media_helper.services.library import content_hash, scan_videos
+from media_helper.services.movie import (
+    FormattedMediaInformation,
+    MovieKey,
+    MovieService,
+    PlannedRename,
+    reject_duplicate_destinations,
+)
+from media_helper.services import rename
+from media_helper.services.rename import (
+    DuplicateDestinationError,
+    RenameOperation,
+    RenameStrategy,
+    apply_renames,
+    undo_renames,
+)
+
+
+def make_movie(id: str = "42", title: str = "Black Swan", **kwargs: object) -> Movie:
+    values: dict[str, object] = dict(
+        id=id,
+        title=title,
+        original_title=title,
+        release_year=2010,
+        source_name="tmdb",
+        link=f"https://www.themoviedb.org/movie/{id}",
+        popularity=10.0,
+        vote_average=7.5,
+        vote_count=1000,
+    )
+    values.update(kwargs)
+    return Movie.model_validate(values)
+
+
+def test_cache_persists_movies_across_instances(tmp_path: Path) -> None:
+    cache = SqliteMovieCache(tmp_path / "cache.sqlite3")
+    cache.set("key", [make_movie()])
+    cache.close()
+
+    assert SqliteMovieCache(tmp_path / "cache.sqlite3").get("key") == [make_movie()]
+
+
+def test_cache_entries_expire(tmp_path: Path) -> None:
+    cache = SqliteMovieCache(tmp_path / "cache.sqlite3", negative_ttl=timedelta(0))
+    cache.set("missing", [])
+    cache.set("expired", [make_movie()], ttl=timedelta(seconds=-1))
+
+    assert cache.get("missing") is None
+    assert cache.get("expired") is None
+
+
+def test_cache_evicts_least_recently_used_entries(tmp_path: Path) -> None:
+    cache = SqliteMovieCache(tmp_path / "cache.sqlite3", max_entries=2)
+    cache.set("a", [])
+    cache.set("b", [])
+    cache.get("a")
+    cache.set("c", [])
+    cache.close()
+
+    cache = SqliteMovieCache(tmp_path / "cache.sqlite3")
+    assert cache.get("a") == []
+    assert cache.get("b") is None
+    assert cache.get("c") == []
+
+
+def test_cache_can_be_disabled_or_refreshed(tmp_path: Path) -> None:
+    cache = SqliteMovieCache(tmp_path / "cache.sqlite3")
+    cache.set("key", [])
+
+    cache.refresh = True
+    assert cache.get("key") is None
+    cache.set("key", [make_movie()])
+
+    cache.refresh, cache.enabled = False, False
+    assert cache.get("key") is None
+
+    cache.enabled = True
+    assert cache.get("key") == [make_movie()]
+
+
+class FakeMovieDatabase:
+    SOURCE: ClassVar[str] = "tmdb"
+
+    def __init__(self, *movies: Movie) -> None:
+        self.movies = {m.id: m for m in movies}
+        self.searches: list[tuple[str, int | None]] = []
+        # Ids of movies in other databases, by database and id
+        self.external_ids: dict[tuple[str, str], str] = {}
+
+    def search(self, query: str, release_year: int | None = None) -> list[Movie]:
+        self.searches.append((query, release_year))
+        return [
+            m
+            for m in self.movies.values()
+            if query.casefold() in m.title.casefold()
+            and release_year in (None, m.release_year)
+        ]
+
+    def get(self, id: str) -> Movie | None:
+        return self.movies.get(id)
+
+    def find(self, source: str, id: str) -> Movie | None:
+        return self.movies.get(self.external_ids.get((source, id), ""))
+
+
+class FakeAsyncMovieDatabase:
+    SOURCE: ClassVar[str] = "tmdb"
+
+    def __init__(self, moviedb: FakeMovieDatabase) -> None:
+        self.moviedb = moviedb
+        self.running = self.max_running = 0
+
+    async def search(self, query: str, release_year: int | None = None) -> list[Movie]:
+        self.running += 1
+        self.max_running = max(self.running, self.max_running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return self.moviedb.search(query, release_year)
+
+    async def get(self, id: str) -> Movie | None:
+        return self.moviedb.get(id)
+
+    async def find(self, source: str, id: str) -> Movie | None:
+        return self.moviedb.find(source, id)
+
+
+def test_format_filenames_resolves_concurrently_and_returns_errors() -> None:
+    moviedb = FakeMovieDatabase(
+        make_movie("1", "Black Swan"),
+        make_movie("2", "Alien"),
+        make_movie("3", "Aliens", release_year=1986),
+    )
+    async_moviedb = FakeAsyncMovieDatabase(moviedb)
+    srv = MovieService(moviedb, async_moviedb)
+
+    results = asyncio.run(
+        srv.format_filenames(
+            ["Black.Swan.2010.1080p.mkv", "Alien.mkv", "Unknown.2001.mkv"] * 3,
+            concurrency=2,
+        )
+    )
+
+    assert async_moviedb.max_running == 2
+    assert results[0] == (
+        "Black Swan (2010) {tmdb-1} [1080p].mkv",
+        "Black Swan (2010) {tmdb-1}",
+        "https://www.themoviedb.org/movie/1",
+    )
+    assert isinstance(results[1], ManyMoviesFoundError)
+    assert isinstance(results[2], MovieNotFoundError)
+    assert results[3] == results[6] == results[0]
+
+
+def test_planned_renames_are_applied_in_one_pass(tmp_path: Path) -> None:
+    moviedb = FakeMovieDatabase(make_movie("1", "Black Swan"))
+    srv = MovieService(moviedb, FakeAsyncMovieDatabase(moviedb))
+    (tmp_path / "Black.Swan.2010.mkv").touch()
+    (tmp_path / "Unknown.mkv").touch()
+
+    plan = asyncio.run(
+        srv.plan_renames(
+            [tmp_path / "Black.Swan.2010.mkv", tmp_path / "Unknown.mkv"],
+            output_dir=tmp_path / "movies",
+        )
+    )
+    operations = [entry.operation for entry in plan if entry.operation]
+    results = apply_renames(operations, RenameStrategy.MOVE)
+
+    assert isinstance(plan[1].result, MovieNotFoundError)
+    assert [r.error for r in results] == [None]
+    assert sorted(p.relative_to(tmp_path).as_posix() for p in tmp_path.rglob("*")) == [
+        "Unknown.mkv",
+        "movies",
+        "movies/Black Swan (2010) {tmdb-1}",
+        "movies/Black Swan (2010) {tmdb-1}/Black Swan (2010) {tmdb-1}.mkv",
+    ]
+
+
+def test_files_tagged_with_different_movies_are_looked_up_apart(
+    tmp_path: Path,
+) -> None:
+    moviedb = FakeMovieDatabase(make_movie("1", "Hamlet"), make_movie("2", "Hamlet"))
+    srv = MovieService(moviedb, FakeAsyncMovieDatabase(moviedb), trust_sources=True)
+    sources = [
+        tmp_path / "Hamlet.2010.{tmdb-1}.mkv",
+        tmp_path / "Hamlet.2010.{tmdb-2}.mkv",
+    ]
+
+    plan = asyncio.run(srv.plan_renames(sources))
+
+    assert [entry.result.filename for entry in plan] == [  # type: ignore[union-attr]
+        "Hamlet (2010) {tmdb-1}.mkv",
+        "Hamlet (2010) {tmdb-2}.mkv",
+    ]
+    assert plan[0].key != plan[1].key
+
+
+def test_files_renamed_to_the_same_destination_never_overwrite(
+    tmp_path: Path,
+) -> None:
+    moviedb = FakeMovieDatabase(make_movie("1", "Black Swan"))
+    srv = MovieService(moviedb, FakeAsyncMovieDatabase(moviedb))
+    sources = [tmp_path / "Black.Swan.2010.mkv", tmp_path / "Black Swan (2010).mkv"]
+    for source in sources:
+        source.write_text(source.name)
+
+    plan = asyncio.run(srv.plan_renames(sources, output_dir=tmp_path / "movies"))
+    checked = reject_duplicate_destinations(plan)
+    results = apply_renames(
+        [entry.operation for entry in plan if entry.operation], RenameStrategy.MOVE
+    )
+
+    assert checked[0] == plan[0]
+    assert isinstance(checked[1].result, DuplicateDestinationError)
+    # Both are applied at once, either may be renamed first
+    assert sorted(result.error is None for result in results) == [False, True]
+    assert any(isinstance(result.error, FileExistsError) for result in results)
+    assert sorted(p.read_text() for p in tmp_path.rglob("*.mkv")) == sorted(
+        source.name for source in sources
+    )
+
+
+def test_parse_files_across_processes_yields_every_file() -> None:
+    srv = MovieService(FakeMovieDatabase())
+    paths = [f"/movies/Movie.{year}.1080p.mkv" for year in range(1990, 2000)]
+
+    results = list(srv.parse_files(iter(paths), workers=2, chunksize=3))
+
+    assert sorted(r.path for r in results) == paths
+    assert all(r.error is None for r in results)
+    assert {r.media_info["year"][0] for r in results if r.media_info} == set(
+        range(1990, 2000)
+    )
+
+
+def test_names_are_scanned_without_the_private_regex_parser(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    name = "Movie.VOSTFR.part2.{tmdb-27205}.mkv"
+    scanner = model.TransformerScanner()
+    for pattern, transformer in MediaInformation.transformers._transformers:
+        scanner.register(pattern.pattern, transformer)
+    expected = scanner.scan(name)
+
+    monkeypatch.setattr(model, "sre_parse", None)
+    # Registering a pattern never matching compiles the scanner again
+    scanner.register(r"(?!)", lambda match, info: None)
+
+    remaining, matches = scanner.scan(name)
+    assert scanner._scanner is not None and scanner._scanner.pattern[:3] != "(?="
+    assert remaining == expected[0]
+    assert [match.group() for match, _ in matches] == [
+        match.group() for match, _ in expected[1]
+    ]
+
+
+def test_scanned_videos_are_recognized_once_processed_even_renamed(
+    tmp_path: Path,
+) -> None:
+    (tmp_path / "movies" / ".hidden").mkdir(parents=True)
+    (tmp_path / "movies" / "Movie.2001.MKV").write_bytes(b"movie")
+    (tmp_path / "movies" / "Movie.2001.nfo").write_bytes(b"info")
+    (tmp_path / "movies" / "Sample.mkv").write_bytes(b"")
+    (tmp_path / "movies" / ".hidden" / "Hidden.mkv").write_bytes(b"hidden")
+    index = SqliteStateIndex(tmp_path / "state.sqlite3")
+
+    [video] = scan_videos([tmp_path / "movies"], min_size=1)
+    index.record([(video.key, video.path)], index.RENAMED)
+    video.path.rename(tmp_path / "Movie (2001).mkv")
+
+    [renamed] = scan_videos([tmp_path], min_size=1)
+    assert renamed.key in index.processed()
+    (tmp_path / "Movie (2001).mkv").write_bytes(b"modified movie")
+    [modified] = scan_videos([tmp_path], min_size=1)
+    assert modified.key not in index.processed()
+
+    # Files queued for review are not processed yet
+    index.record([(modified.key, modified.path)], index.REVIEW)
+    assert modified.key not in index.processed()
+    assert index.to_review() == [modified.path]
+
+    # Skipped files can be processed again, e.g. once their source is trusted
+    index.record([(modified.key, modified.path)], index.SKIPPED)
+    assert modified.key in index.processed()
+    assert modified.key not in index.processed(skipped=False)
+
+
+def test_library_index_tells_duplicates_and_upgrades(tmp_path: Path) -> None:
+    from media_helper.adapters.library import SqliteLibraryIndex
+    from media_helper.services.library_index import (
+        IndexUpdate,
+        LibraryStatus,
+        library_entry,
+        library_status,
+        update_library_index,
+    )
+
+    library = tmp_path / "library"
+    inception = library / "Inception (2010) {tmdb-27205}"
+    inception.mkdir(parents=True)
+    (inception / "Inception (2010) {tmdb-27205} [720p WEBRip][H.264].mkv").write_bytes(
+        b"inception"
+    )
+    (library / "Untagged.mkv").write_bytes(b"untagged")
+    index = SqliteLibraryIndex(tmp_path / "library.sqlite3")
+
+    assert update_library_index(index, [library]) == IndexUpdate(2, 0, 0, 0)
+    (library / "Untagged.mkv").unlink()
+    assert update_library_index(index, index.roots()) == IndexUpdate(0, 0, 1, 1)
+
+    def status(name: str) -> LibraryStatus:
+        download = tmp_path / name
+        download.write_bytes(b"download")
+        [video] = scan_videos([download])
+        return library_status(library_entry(video.path, video.key), index.by_source())[
+            0
+        ]
+
+    assert status("Inception (2010) {tmdb-27205} [1080p BluRay].mkv") == (
+        LibraryStatus.UPGRADE
+    )
+    assert status("Inception (2010) {tmdb-27205} [720p HDTV].mkv") == (
+        LibraryStatus.DUPLICATE
+    )
+    assert status("Black Swan (2010) {tmdb-44214}.mkv") == LibraryStatus.NEW
+    # Files of the library are not duplicates of themselves
+    [owned] = index.by_source()["tmdb-27205"]
+    assert library_status(owned, index.by_source())[0] == LibraryStatus.NEW
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="inotify is Linux only")
+def test_watched_files_are_notified_once_written_or_moved_in(tmp_path: Path) -> None:
+    from media_helper.adapters.inotify import InotifyWatcher
+
+    (tmp_path / "downloads").mkdir()
+    with InotifyWatcher() as watcher:
+        watcher.watch(tmp_path / "downloads")
+        (tmp_path / "downloads" / "new").mkdir()
+        select.select([watcher], [], [], 1)
+        assert [e.path.name for e in watcher.read() if e.is_dir] == ["new"]
+
+        (tmp_path / "downloads" / "new" / "written.mkv").write_bytes(b"movie")
+        (tmp_path / "moved.mkv").write_bytes(b"movie")
+        (tmp_path / "moved.mkv").rename(tmp_path / "downloads" / "moved.mkv")
+        select.select([watcher], [], [], 1)
+        events = [event for event in watcher.read() if event.completed]
+
+    assert [event.path for event in events] == [
+        tmp_path / "downloads" / "new" / "written.mkv",
+        tmp_path / "downloads" / "moved.mkv",
+    ]
+
+
+def test_local_database_answers_confident_searches_of_known_years(
+    tmp_path: Path,
+) -> None:
+    local = LocalMovieDatabase(tmp_path / "movies.sqlite3")
+    remote = FakeMovieDatabase(
+        make_movie("5", "Dune", release_year=2021),
+        make_movie("6", "Dune", release_year=1984),
+    )
+    srv = MovieService(FallbackMovieDatabase(local, remote))
+
+    assert srv.format_filename("Dune.2021.mkv").filename == "Dune (2021) {tmdb-5}.mkv"
+    assert srv.format_filename("Dune.2021.1080p.mkv").filename == (
+        "Dune (2021) {tmdb-5} [1080p].mkv"
+    )
+    assert remote.searches == [("Dune", 2021)]
+    # Knowing one Dune locally must not make it the only one
+    with pytest.raises(ManyMoviesFoundError):
+        srv.format_filename("Dune.mkv")
+    assert remote.searches == [("Dune", 2021), ("Dune", None)]
+    # Both are known by now
+    moviedb = FallbackMovieDatabase(local, remote)
+    assert [m.id for m in moviedb.search("dune", 1984)] == ["6"]
+    with pytest.raises(MovieNotFoundError):
+        srv.format_filename("Unknown.2010.mkv")
+    assert len(remote.searches) == 3
+
+    # Movies are forgotten, refreshed and not used at all once disabled
+    for moviedb in [
+        FallbackMovieDatabase(
+            LocalMovieDatabase(local.path, max_age=timedelta(0)), remote
+        ),
+        FallbackMovieDatabase(local, remote, refresh=True),
+        FallbackMovieDatabase(local, remote, enabled=False),
+    ]:
+        remote.searches.clear()
+        moviedb.search("Dune", 1984)
+        assert remote.searches == [("Dune", 1984)]
+
+
+def test_confident_best_movie_is_selected_without_asking() -> None:
+    moviedb = FakeMovieDatabase(
+        make_movie("1", "Alien", release_year=1979),
+        make_movie("2", "Aliens", release_year=1986),
+        make_movie("3", "Alien Resurrection", release_year=1997),
+        make_movie("4", "Dune", release_year=1984, popularity=20.0, vote_count=3000),
+        make_movie("5", "Dune", release_year=2021, popularity=25.0, vote_count=9000),
+    )
+    srv = MovieService(moviedb)
+
+    assert "{tmdb-1}" in srv.format_filename("Alien.1979.mkv").filename
+    assert "{tmdb-4}" in srv.format_filename("Dune.1984.mkv").filename
+    # Same title, no year to tell them apart: the most popular first but asked
+    with pytest.raises(ManyMoviesFoundError) as many_found:
+        srv.format_filename("Dune.mkv")
+    assert [m.id for m in many_found.value.movies] == ["5", "4"]
+
+
+def test_files_of_a_same_movie_are_looked_up_once() -> None:
+    moviedb = FakeMovieDatabase(
+        make_movie("1", "Black Swan"),
+        make_movie("2", "Alien"),
+        make_movie("3", "Aliens", release_year=1986),
+    )
+    srv = MovieService(moviedb, FakeAsyncMovieDatabase(moviedb))
+    filepaths = [
+        Path("Black.Swan.2010.cd1.mkv"),
+        Path("Black.Swan.2010.cd2.mkv"),
+        Path("black swan (2010) copy.avi"),
+        Path("Alien.part1.mkv"),
+        Path("Alien.part2.mkv"),
+    ]
+
+    plan = asyncio.run(srv.plan_renames(filepaths, output_dir=Path("/movies")))
+
+    assert sorted(moviedb.searches) == [("Alien", None), ("Black Swan", 2010)]
+    assert [entry.key for entry in plan] == [MovieKey("black swan", 2010)] * 3 + [
+        MovieKey("alien", None)
+    ] * 2
+    assert [
+        str(entry.operation and entry.operation.destination) for entry in plan[:2]
+    ] == [
+        "/movies/Black Swan (2010) {tmdb-1}/Black Swan (2010) {tmdb-1} - cd1.mkv",
+        "/movies/Black Swan (2010) {tmdb-1}/Black Swan (2010) {tmdb-1} - cd2.mkv",
+    ]
+    # One ambiguity for all parts
+    assert plan[3].result is plan[4].result
+    assert isinstance(plan[3].result, ManyMoviesFoundError)
+
+
+def test_renames_are_resolved_ahead_and_cancelled_once_closed() -> None:
+    titles = ["Alpha", "Bravo", "Charlie", "Delta", "Echo"]
+    moviedb = FakeMovieDatabase(
+        *(make_movie(str(i), title) for i, title in enumerate(titles))
+    )
+    async_moviedb = FakeAsyncMovieDatabase(moviedb)
+    srv = MovieService(moviedb, async_moviedb)
+    filepaths = [
+        Path("Alpha.2010.cd1.mkv"),
+        Path("Alpha.2010.cd2.mkv"),
+        *(Path(f"{title}.2010.mkv") for title in titles[1:]),
+    ]
+
+    async def review() -> list[PlannedRename]:
+        entries = srv.iter_renames(filepaths, lookahead=2)
+        reviewed = [await anext(entries)]
+        # The user takes time to review the first file
+        await asyncio.sleep(0.05)
+        reviewed.append(await anext(entries))
+        await entries.aclose()
+        return reviewed
+
+    reviewed = asyncio.run(review())
+
+    assert [entry.source for entry in reviewed] == filepaths[:2]
+    assert reviewed[1].key == reviewed[0].key == MovieKey("alpha", 2010)
+    # Charlie was searched while Alpha was reviewed, Delta was cancelled on closing
+    # and both parts of Alpha shared a single search
+    assert sorted(moviedb.searches) == [
+        ("Alpha", 2010),
+        ("Bravo", 2010),
+        ("Charlie", 2010),
+    ]
+    assert async_moviedb.max_running == 2
+
+
+def test_content_hash_only_depends_on_size_and_both_ends(tmp_path: Path) -> None:
+    head, middle, tail = os.urandom(64 * 1024), os.urandom(1000), os.urandom(64 * 1024)
+    (tmp_path / "a.mkv").write_bytes(head + middle + tail)
+    (tmp_path / "b.mkv").write_bytes(head + os.urandom(1000) + tail)
+    (tmp_path / "c.mkv").write_bytes(head + middle + tail[:-1] + b"x")
+    (tmp_path / "empty.mkv").write_bytes(b"")
+    (tmp_path / "small.mkv").write_bytes(b"\x01")
+
+    a, b, c = (content_hash(tmp_path / f"{n}.mkv") for n in "abc")
+    assert a == b != c
+    assert content_hash(tmp_path / "empty.mkv") == "0000000000000000"
+    # Size (1) plus both ends, which are the same single byte
+    assert content_hash(tmp_path / "small.mkv") == "0000000000000003"
+
+
+def test_files_are_recognized_by_content_once_renamed(tmp_path: Path) -> None:
+    moviedb = FakeMovieDatabase(make_movie("1", "Black Swan"))
+    srv = MovieService(
+        moviedb,
+        FakeAsyncMovieDatabase(moviedb),
+        content_index=SqliteStateIndex(Path(":memory:")),
+    )
+    filepath = tmp_path / "Black.Swan.2010.1080p.mkv"
+    filepath.write_bytes(os.urandom(1000))
+    asyncio.run(srv.plan_renames([filepath]))
+    renamed = filepath.rename(tmp_path / "bs-1080p.mkv")
+
+    (entry,) = asyncio.run(srv.plan_renames([renamed]))
+
+    assert moviedb.searches == [("Black Swan", 2010)]
+    assert entry.operation is not None
+    assert entry.operation.destination.name == "Black Swan (2010) {tmdb-1} [1080p].mkv"
+    assert srv.format_file(renamed).filename == entry.operation.destination.name
+    assert moviedb.searches == [("Black Swan", 2010)]
+
+
+def test_renames_are_applied_in_parallel_reporting_every_result(
+    tmp_path: Path,
+) -> None:
+    (tmp_path / "not a directory").touch()
+    operations = []
+    for i in range(20):
+        (tmp_path / f"{i}.mkv").touch()
+        operations.append(
+            RenameOperation(
+                tmp_path / f"{i}.mkv", tmp_path / f"Movie {i % 3}" / f"{i}.mkv"
+            )
+        )
+    operations += [
+        RenameOperation(tmp_path / "missing.mkv", tmp_path / "Movie 0" / "missing.mkv"),
+        RenameOperation(tmp_path / "0.mkv", tmp_path / "not a directory" / "0.mkv"),
+    ]
+    progress: list[object] = []
+
+    results = apply_renames(
+        operations, RenameStrategy.HARDLINK, workers=4, progress=progress.append
+    )
+
+    assert [result.operation for result in results] == operations
+    assert sorted(map(id, progress)) == sorted(map(id, results))
+    assert [type(result.error) for result in results[-2:]] == [
+        FileNotFoundError,
+        FileExistsError,
+    ]
+    assert all(result.error is None for result in results[:-2])
+    assert len(list(tmp_path.glob("Movie */*.mkv"))) == 20
+
+
+def test_files_are_copied_by_chunks_atomically(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(rename, "COPY_CHUNK_SIZE", 1000)
+    source = tmp_path / "movie.mkv"
+    source.write_bytes(os.urandom(4500))
+    os.utime(source, (0, 1_000_000))
+    destination = tmp_path / "Movie" / "Movie.mkv"
+    copied: list[int] = []
+
+    rename.rename(
+        RenameOperation(source, destination), RenameStrategy.COPY, copied.append
+    )
+
+    assert destination.read_bytes() == source.read_bytes()
+    assert destination.stat().st_mtime == 1_000_000
+    # Unless the file has been cloned rather than copied
+    assert copied in ([], [1000] * 4 + [500])
+    assert [p.name for p in destination.parent.iterdir()] == ["Movie.mkv"]
+    with pytest.raises(FileExistsError):
+        rename.copy_file(source, destination)
+
+
+def test_files_moved_to_another_file_system_are_copied(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def move_across_devices(source: Path, destination: Path) -> None:
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+    monkeypatch.setattr(rename, "_move", move_across_devices)
+    source = tmp_path / "movie.mkv"
+    source.write_bytes(b"movie")
+    destination = tmp_path / "Movie" / "Movie.mkv"
+
+    rename.rename(RenameOperation(source, destination), RenameStrategy.MOVE)
+
+    assert destination.read_bytes() == b"movie"
+    assert not source.exists()
+
+
+@pytest.mark.parametrize("failure", ["unsupported", "shrunk"])
+def test_failed_copies_never_lose_data(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, failure: str
+) -> None:
+    def unsupported(*args: object) -> int:
+        raise OSError(errno.ENOSYS, os.strerror(errno.ENOSYS))
+
+    def move_across_devices(source: Path, destination: Path) -> None:
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+    monkeypatch.setattr(rename, "_clone", lambda src, dst: False)
+    if failure == "unsupported":
+        for method in ["_copy_file_range", "_sendfile", "_read_write"]:
+            monkeypatch.setattr(rename, method, unsupported)
+    else:
+        # The source ends sooner than expected once a few bytes are copied
+        monkeypatch.setattr(
+            rename,
+            "_copy_file_range",
+            lambda src, dst, offset, count: 0 if offset else os.pwrite(dst, b"mo", 0),
+        )
+    monkeypatch.setattr(rename, "_move", move_across_devices)
+    source = tmp_path / "movie.mkv"
+    source.write_bytes(b"movie")
+    destination = tmp_path / "Movie" / "Movie.mkv"
+
+    with pytest.raises(OSError):
+        rename.rename(RenameOperation(source, destination), RenameStrategy.MOVE)
+
+    assert source.read_bytes() == b"movie"
+    assert list(destination.parent.iterdir()) == []
+
+
+def test_copies_fall_back_when_copying_nothing_without_failing(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(rename, "_clone", lambda src, dst: False)
+    monkeypatch.setattr(rename, "_copy_file_range", lambda *args: 0)
+    source = tmp_path / "movie.mkv"
+    source.write_bytes(b"movie")
+
+    rename.copy_file(source, tmp_path / "copy.mkv")
+
+    assert (tmp_path / "copy.mkv").read_bytes() == b"movie"
+
+
+def test_interrupted_runs_are_resumed_then_undone(tmp_path: Path) -> None:
+    sources = [tmp_path / "a.mkv", tmp_path / "b.mkv"]
+    for source in sources:
+        source.write_bytes(b"movie")
+    operations = [
+        RenameOperation(source, tmp_path / "Movie" / source.name) for source in sources
+    ]
+    resolution = FormattedMediaInformation("Movie", "Movie", "Movie.mkv")
+
+    with RunJournal.create(tmp_path / "runs", command="movie rename") as journal:
+        journal.start(RenameStrategy.MOVE, sources)
+        journal.resolved(sources[0], resolution)
+        for operation in operations:
+            rename.rename(operation, RenameStrategy.MOVE)
+            journal.renamed(operation, RenameStrategy.MOVE, FileKey(1, 2, 5, 0))
+    with journal.path.open("a") as file:
+        file.write('{"type": "renamed", "sou')
+
+    # Runs of other commands are not resumed
+    with RunJournal.create(tmp_path / "runs", command="tv rename") as other:
+        other.start(RenameStrategy.MOVE, [])
+    with RunJournal.create(tmp_path / "runs") as watched:
+        watched.resolved(sources[1], resolution)
+
+    resumed = RunJournal.find(tmp_path / "runs", command="movie rename")
+    assert resumed is not None and resumed.run_id == journal.run_id
+    assert resumed.resolutions() == {sources[0]: resolution}
+    renames = resumed.renames()
+    assert [operation for operation, *_ in renames] == operations
+
+    results = undo_renames((operation, strategy) for operation, strategy, _ in renames)
+    assert all(result.error is None for result in results)
+    with resumed:
+        for result in results:
+            resumed.undone(result.operation)
+    assert all(source.read_bytes() == b"movie" for source in sources)
+    assert not (tmp_path / "Movie").exists()
+    assert RunJournal(resumed.path).renames() == []
+
+
+def test_profiling_times_stages_only_once_enabled() -> None:
+    moviedb = FakeMovieDatabase(make_movie("1", "Black Swan"))
+    srv = MovieService(moviedb, FakeAsyncMovieDatabase(moviedb))
+    srv.format_filename("Black.Swan.2010.mkv")
+
+    profiler = profiling.enable()
+    try:
+        srv.format_filename("Black.Swan.2010.mkv")
+        asyncio.run(srv.format_filenames(["Black.Swan.2010.mkv", "Alien.mkv"]))
+        profiling.count("test")
+    finally:
+        profiling.disable()
+    srv.format_filename("Black.Swan.2010.mkv")
+
+    summary = profiler.summary()
+    assert {stage: stats["count"] for stage, stats in summary["stages"].items()} == {
+        "movie.format": 2,
+        "movie.parse": 3,
+        "movie.resolve": 3,
+    }
+    assert summary["counters"] == {"test": 1}
+
+
+def test_compact_media_information_is_formatted_and_shared() -> None:
+    formatter = PlexMediaFileNameFormatter()
+    names = [
+        "Inception.2010.PROPER.1080p.BluRay.x264-GROUP.cd1.mkv",
+        "Blade.Runner.1982.Directors.Cut.UNRATED.720p.HDR.x264.FRENCH.mkv",
+    ]
+    for name in names:
+        info = MediaInformation.from_filename(name)
+        info.source = MediaSource(name="tmdb", media_id="1")
+        compact = CompactMediaInformation.from_media_info(info)
+
+        assert compact.to_media_info() == info
+        assert formatter.format_movie_filename(compact) == (
+            formatter.format_movie_filename(info)
+        )
+        assert formatter.format_movie_dirname(compact) == (
+            formatter.format_movie_dirname(info)
+        )
+
+    first, second = (CompactMediaInformation.from_filename(name) for name in names)
+    assert first.codec is second.codec
+    assert first.subtitles == ()
+    # Values specific to a file are not kept for sharing
+    assert first.encoder not in compact_module._interned_values
+
+
+def test_naming_templates_are_configured_and_validated_once() -> None:
+    from pydantic import ValidationError
+
+    from media_helper.config import Settings
+
+    settings = Settings(
+        tmdb_access_token="token",
+        movie_filename_template="{title} ({year})< [tmdbid-{source_id}]>< - {split}>{ext}",
+    )
+    formatter = PlexMediaFileNameFormatter(
+        movie_filename=settings.movie_filename_template
+    )
+    infos = [
+        MediaInformation.from_filename(name)
+        for name in ("Inception.2010.1080p.cd1.mkv", "Black.Swan.2010.mkv")
+    ]
+    infos[0].source = MediaSource(name="tmdb", media_id="27205")
+
+    assert formatter.format_many(infos) == [
+        ("Inception (2010) [tmdbid-27205] - cd1.mkv", "Inception (2010) {tmdb-27205}"),
+        ("Black Swan (2010).mkv", "Black Swan (2010)"),
+    ]
+    for template in ("{title} {imdb}", "{title} <{year}", "{season:q}"):
+        with pytest.raises(ValidationError):
+            Settings(tmdb_access_token="token", movie_dirname_template=template)
+
+
+def test_movie_api_parses_and_formats_file_names() -> None:
+    from media_helper.adapters.server import MovieApiServer
+
+    moviedb = FakeMovieDatabase(
+        make_movie("1", "Black Swan"),
+        make_movie("2", "Alien"),
+        make_movie("3", "Alien"),
+    )
+    srv = MovieService(moviedb, FakeAsyncMovieDatabase(moviedb))
+    server = MovieApiServer(MovieService(), lambda: srv)
+
+    async def call(target: str, body: object = None) -> tuple[int, dict[str, object]]:
+        data = json.dumps(body).encode() if body is not None else b""
+        return await server.handle("POST" if data else "GET", target, data)
+
+    async def scenario() -> list[tuple[int, Any]]:
+        return [
+            await call("/parse?filename=Black.Swan.2010.mkv"),
+            await call("/format", {"filename": "Black.Swan.2010.mkv"}),
+            await call("/format", {"filename": "Alien.mkv"}),
+            await call("/format/batch", {"filenames": ["Black.Swan.2010.mkv", "Up"]}),
+            await call("/format", {"filenames": "not a filename"}),
+        ]
+
+    parsed, formatted, ambiguous, batch, bad = asyncio.run(scenario())
+
+    assert parsed == (
+        200,
+        {"media_info": MovieService().parse_filename("Black.Swan.2010.mkv")},
+    )
+    assert formatted[0] == 200
+    assert formatted[1]["filename"] == "Black Swan (2010) {tmdb-1}.mkv"
+    assert ambiguous[0] == 409
+    assert ambiguous[1]["error"]["type"] == "ManyMoviesFoundError"
+    assert len(ambiguous[1]["error"]["movies"]) == 2
+    assert batch[0] == 200
+    assert [r.get("error", {}).get("type") for r in batch[1]["results"]] == [
+        None,
+        "MovieNotFoundError",
+    ]
+    assert bad[0] == 400